@@ -75,11 +75,13 @@ class AK8963:
         output=OUTPUT_16_BIT,
         offset=(0, 0, 0),
         scale=(1, 1, 1),
+        matrix=None,
     ):
         self.i2c = i2c
         self.address = address
         self._offset = offset
         self._scale = scale
+        self._matrix = matrix
 
         if 0x48 != self.whoami:
             raise RuntimeError("AK8963 not found in I2C bus.")
@@ -130,10 +132,17 @@ class AK8963:
         xyz[1] -= self._offset[1]
         xyz[2] -= self._offset[2]
 
-        # Apply soft iron ie. scale bias from calibration
-        xyz[0] *= self._scale[0]
-        xyz[1] *= self._scale[1]
-        xyz[2] *= self._scale[2]
+        # Apply soft iron ie. scale bias or full matrix from calibration
+        m = self._matrix
+        if m is not None:
+            x, y, z = xyz
+            xyz[0] = m[0] * x + m[1] * y + m[2] * z
+            xyz[1] = m[3] * x + m[4] * y + m[5] * z
+            xyz[2] = m[6] * x + m[7] * y + m[8] * z
+        else:
+            xyz[0] *= self._scale[0]
+            xyz[1] *= self._scale[1]
+            xyz[2] *= self._scale[2]
 
         return tuple(xyz)
 
@@ -141,6 +150,33 @@ class AK8963:
     def adjustement(self):
         return self._adjustement
 
+    @property
+    def offset(self):
+        """Hard iron offset (uT), as estimated by calibrate()."""
+        return self._offset
+
+    @offset.setter
+    def offset(self, value):
+        self._offset = tuple(value)
+
+    @property
+    def scale(self):
+        """Soft iron scale factors, as estimated by calibrate()."""
+        return self._scale
+
+    @scale.setter
+    def scale(self, value):
+        self._scale = tuple(value)
+
+    @property
+    def matrix(self):
+        """Row-major 3x3 soft iron matrix, replaces scale when set."""
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, value):
+        self._matrix = None if value is None else tuple(value)
+
     @property
     def whoami(self):
         """Value of the whoami register."""
@@ -149,6 +185,7 @@ class AK8963:
     def calibrate(self, count=256, delay=200):
         self._offset = (0, 0, 0)
         self._scale = (1, 1, 1)
+        self._matrix = None
 
         reading = self.magnetic
         minx = maxx = reading[0]
@@ -21,9 +21,18 @@ try:
 except ImportError:
     import time
 
+from array import array
 from math import sqrt, atan2, asin, degrees, radians
 from deltat import DeltaT
 
+try:
+    import micropython
+except ImportError:                         # CPython: native emitter is a no-op
+    class micropython:
+        @staticmethod
+        def native(f):
+            return f
+
 class Fusion(object):
     '''
     Class provides sensor fusion allowing heading, pitch and roll to be extracted. This uses the Madgwick algorithm.
@@ -209,3 +218,370 @@ class Fusion(object):
         self.pitch = degrees(-asin(2.0 * (self.q[1] * self.q[3] - self.q[0] * self.q[2])))
         self.roll = degrees(atan2(2.0 * (self.q[0] * self.q[1] + self.q[2] * self.q[3]),
             self.q[0] * self.q[0] - self.q[1] * self.q[1] - self.q[2] * self.q[2] + self.q[3] * self.q[3]))
+
+
+class FusionFast(Fusion):
+    '''
+    Drop-in Fusion with the same results and no per-update allocation of tuples or
+    generators: the quaternion lives in a preallocated array and is updated in place.
+    Compiled with the native code emitter on MicroPython.
+    '''
+    def __init__(self, timediff=None):
+        super().__init__(timediff)
+        self.q = array('d', self.q)
+
+    @micropython.native
+    def update_nomag(self, accel, gyro, ts=None):    # 3-tuples (x, y, z) for accel, gyro
+        ax = accel[0]                       # Units G (but later normalised)
+        ay = accel[1]
+        az = accel[2]
+        gx = radians(gyro[0])               # Units deg/s
+        gy = radians(gyro[1])
+        gz = radians(gyro[2])
+        q = self.q
+        q1 = q[0]                           # short name local variable for readability
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        # Auxiliary variables to avoid repeated arithmetic
+        _2q1 = 2 * q1
+        _2q2 = 2 * q2
+        _2q3 = 2 * q3
+        _2q4 = 2 * q4
+        _4q1 = 4 * q1
+        _4q2 = 4 * q2
+        _4q3 = 4 * q3
+        _8q2 = 8 * q2
+        _8q3 = 8 * q3
+        q1q1 = q1 * q1
+        q2q2 = q2 * q2
+        q3q3 = q3 * q3
+        q4q4 = q4 * q4
+
+        # Normalise accelerometer measurement
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if (norm == 0):
+            return # handle NaN
+        norm = 1 / norm        # use reciprocal for division
+        ax *= norm
+        ay *= norm
+        az *= norm
+
+        # Gradient decent algorithm corrective step
+        s1 = _4q1 * q3q3 + _2q3 * ax + _4q1 * q2q2 - _2q2 * ay
+        s2 = _4q2 * q4q4 - _2q4 * ax + 4 * q1q1 * q2 - _2q1 * ay - _4q2 + _8q2 * q2q2 + _8q2 * q3q3 + _4q2 * az
+        s3 = 4 * q1q1 * q3 + _2q1 * ax + _4q3 * q4q4 - _2q4 * ay - _4q3 + _8q3 * q2q2 + _8q3 * q3q3 + _4q3 * az
+        s4 = 4 * q2q2 * q4 - _2q2 * ax + 4 * q3q3 * q4 - _2q3 * ay
+        norm = 1 / sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)    # normalise step magnitude
+        s1 *= norm
+        s2 *= norm
+        s3 *= norm
+        s4 *= norm
+
+        # Compute rate of change of quaternion
+        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
+        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
+        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
+        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
+
+        # Integrate to yield quaternion
+        deltat = self.deltat(ts)
+        q1 += qDot1 * deltat
+        q2 += qDot2 * deltat
+        q3 += qDot3 * deltat
+        q4 += qDot4 * deltat
+        norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        q1 *= norm
+        q2 *= norm
+        q3 *= norm
+        q4 *= norm
+        q[0] = q1                           # quaternion updated in place
+        q[1] = q2
+        q[2] = q3
+        q[3] = q4
+        self.heading = 0
+        self.pitch = degrees(-asin(2.0 * (q2 * q4 - q1 * q3)))
+        self.roll = degrees(atan2(2.0 * (q1 * q2 + q3 * q4), q1 * q1 - q2 * q2 - q3 * q3 + q4 * q4))
+
+    @micropython.native
+    def update(self, accel, gyro, mag, ts=None):     # 3-tuples (x, y, z) for accel, gyro and mag data
+        magbias = self.magbias
+        mx = mag[0] - magbias[0]            # Units irrelevant (normalised)
+        my = mag[1] - magbias[1]
+        mz = mag[2] - magbias[2]
+        ax = accel[0]                       # Units irrelevant (normalised)
+        ay = accel[1]
+        az = accel[2]
+        gx = radians(gyro[0])               # Units deg/s
+        gy = radians(gyro[1])
+        gz = radians(gyro[2])
+        q = self.q
+        q1 = q[0]                           # short name local variable for readability
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        # Auxiliary variables to avoid repeated arithmetic
+        _2q1 = 2 * q1
+        _2q2 = 2 * q2
+        _2q3 = 2 * q3
+        _2q4 = 2 * q4
+        _2q1q3 = 2 * q1 * q3
+        _2q3q4 = 2 * q3 * q4
+        q1q1 = q1 * q1
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q1q4 = q1 * q4
+        q2q2 = q2 * q2
+        q2q3 = q2 * q3
+        q2q4 = q2 * q4
+        q3q3 = q3 * q3
+        q3q4 = q3 * q4
+        q4q4 = q4 * q4
+
+        # Normalise accelerometer measurement
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if (norm == 0):
+            return # handle NaN
+        norm = 1 / norm                     # use reciprocal for division
+        ax *= norm
+        ay *= norm
+        az *= norm
+
+        # Normalise magnetometer measurement
+        norm = sqrt(mx * mx + my * my + mz * mz)
+        if (norm == 0):
+            return                          # handle NaN
+        norm = 1 / norm                     # use reciprocal for division
+        mx *= norm
+        my *= norm
+        mz *= norm
+
+        # Reference direction of Earth's magnetic field
+        _2q1mx = 2 * q1 * mx
+        _2q1my = 2 * q1 * my
+        _2q1mz = 2 * q1 * mz
+        _2q2mx = 2 * q2 * mx
+        hx = mx * q1q1 - _2q1my * q4 + _2q1mz * q3 + mx * q2q2 + _2q2 * my * q3 + _2q2 * mz * q4 - mx * q3q3 - mx * q4q4
+        hy = _2q1mx * q4 + my * q1q1 - _2q1mz * q2 + _2q2mx * q3 - my * q2q2 + my * q3q3 + _2q3 * mz * q4 - my * q4q4
+        _2bx = sqrt(hx * hx + hy * hy)
+        _2bz = -_2q1mx * q3 + _2q1my * q2 + mz * q1q1 + _2q2mx * q4 - mz * q2q2 + _2q3 * my * q4 - mz * q3q3 + mz * q4q4
+        _4bx = 2 * _2bx
+        _4bz = 2 * _2bz
+
+        # Gradient descent algorithm corrective step
+        s1 = (-_2q3 * (2 * q2q4 - _2q1q3 - ax) + _2q2 * (2 * q1q2 + _2q3q4 - ay) - _2bz * q3 * (_2bx * (0.5 - q3q3 - q4q4)
+             + _2bz * (q2q4 - q1q3) - mx) + (-_2bx * q4 + _2bz * q2) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my)
+             + _2bx * q3 * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
+
+        s2 = (_2q4 * (2 * q2q4 - _2q1q3 - ax) + _2q1 * (2 * q1q2 + _2q3q4 - ay) - 4 * q2 * (1 - 2 * q2q2 - 2 * q3q3 - az)
+             + _2bz * q4 * (_2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx) + (_2bx * q3 + _2bz * q1) * (_2bx * (q2q3 - q1q4)
+             + _2bz * (q1q2 + q3q4) - my) + (_2bx * q4 - _4bz * q2) * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
+
+        s3 = (-_2q1 * (2 * q2q4 - _2q1q3 - ax) + _2q4 * (2 * q1q2 + _2q3q4 - ay) - 4 * q3 * (1 - 2 * q2q2 - 2 * q3q3 - az)
+             + (-_4bx * q3 - _2bz * q1) * (_2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx)
+             + (_2bx * q2 + _2bz * q4) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my)
+             + (_2bx * q1 - _4bz * q3) * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
+
+        s4 = (_2q2 * (2 * q2q4 - _2q1q3 - ax) + _2q3 * (2 * q1q2 + _2q3q4 - ay) + (-_4bx * q4 + _2bz * q2) * (_2bx * (0.5 - q3q3 - q4q4)
+              + _2bz * (q2q4 - q1q3) - mx) + (-_2bx * q1 + _2bz * q3) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my)
+              + _2bx * q2 * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
+
+        norm = 1 / sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)    # normalise step magnitude
+        s1 *= norm
+        s2 *= norm
+        s3 *= norm
+        s4 *= norm
+
+        # Compute rate of change of quaternion
+        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
+        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
+        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
+        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
+
+        # Integrate to yield quaternion
+        deltat = self.deltat(ts)
+        q1 += qDot1 * deltat
+        q2 += qDot2 * deltat
+        q3 += qDot3 * deltat
+        q4 += qDot4 * deltat
+        norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        q1 *= norm
+        q2 *= norm
+        q3 *= norm
+        q4 *= norm
+        q[0] = q1                           # quaternion updated in place
+        q[1] = q2
+        q[2] = q3
+        q[3] = q4
+        self.heading = self.declination + degrees(atan2(2.0 * (q2 * q3 + q1 * q4), q1 * q1 + q2 * q2 - q3 * q3 - q4 * q4))
+        self.pitch = degrees(-asin(2.0 * (q2 * q4 - q1 * q3)))
+        self.roll = degrees(atan2(2.0 * (q1 * q2 + q3 * q4), q1 * q1 - q2 * q2 - q3 * q3 + q4 * q4))
+
+
+class Mahony(Fusion):
+    '''
+    Mahony complementary filter with proportional and integral feedback, a cheaper
+    alternative to the Madgwick gradient descent with the same update interface.
+    kp sets the convergence rate towards the accelerometer/magnetometer, ki the rate
+    at which gyro bias is integrated out (0 disables the integral term).
+    Source https://x-io.co.uk/open-source-imu-and-ahrs-algorithms/
+    '''
+    def __init__(self, timediff=None, kp=0.5, ki=0.05):
+        super().__init__(timediff)
+        self.q = array('d', self.q)
+        self.kp = kp
+        self.ki = ki
+        self.integral = array('d', (0.0, 0.0, 0.0))  # integral error terms scaled by ki
+
+    @micropython.native
+    def _feedback(self, gx, gy, gz, ex, ey, ez, ts):    # apply feedback, integrate and normalise
+        deltat = self.deltat(ts)
+        integral = self.integral
+        ki = self.ki
+        if ki > 0:
+            integral[0] += ki * ex * deltat
+            integral[1] += ki * ey * deltat
+            integral[2] += ki * ez * deltat
+            gx += integral[0]
+            gy += integral[1]
+            gz += integral[2]
+        else:
+            integral[0] = 0.0
+            integral[1] = 0.0
+            integral[2] = 0.0
+
+        # Proportional feedback
+        kp = self.kp
+        gx += kp * ex
+        gy += kp * ey
+        gz += kp * ez
+
+        # Integrate rate of change of quaternion
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        half_dt = 0.5 * deltat
+        gx *= half_dt
+        gy *= half_dt
+        gz *= half_dt
+        q1 += -q2 * gx - q3 * gy - q4 * gz
+        q2 += q[0] * gx + q3 * gz - q4 * gy
+        q3 += q[0] * gy - q[1] * gz + q4 * gx
+        q4 += q[0] * gz + q[1] * gy - q[2] * gx
+        norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        q1 *= norm
+        q2 *= norm
+        q3 *= norm
+        q4 *= norm
+        q[0] = q1
+        q[1] = q2
+        q[2] = q3
+        q[3] = q4
+        self.pitch = degrees(-asin(2.0 * (q2 * q4 - q1 * q3)))
+        self.roll = degrees(atan2(2.0 * (q1 * q2 + q3 * q4), q1 * q1 - q2 * q2 - q3 * q3 + q4 * q4))
+
+    @micropython.native
+    def update_nomag(self, accel, gyro, ts=None):    # 3-tuples (x, y, z) for accel, gyro
+        ax = accel[0]                       # Units G (but later normalised)
+        ay = accel[1]
+        az = accel[2]
+        gx = radians(gyro[0])               # Units deg/s
+        gy = radians(gyro[1])
+        gz = radians(gyro[2])
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+
+        # Normalise accelerometer measurement
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if (norm == 0):
+            return # handle NaN
+        norm = 1 / norm
+        ax *= norm
+        ay *= norm
+        az *= norm
+
+        # Estimated direction of gravity
+        vx = 2 * (q2 * q4 - q1 * q3)
+        vy = 2 * (q1 * q2 + q3 * q4)
+        vz = q1 * q1 - q2 * q2 - q3 * q3 + q4 * q4
+
+        # Error is cross product between estimated and measured direction of gravity
+        self._feedback(gx, gy, gz, ay * vz - az * vy, az * vx - ax * vz, ax * vy - ay * vx, ts)
+        self.heading = 0
+
+    @micropython.native
+    def update(self, accel, gyro, mag, ts=None):     # 3-tuples (x, y, z) for accel, gyro and mag data
+        magbias = self.magbias
+        mx = mag[0] - magbias[0]            # Units irrelevant (normalised)
+        my = mag[1] - magbias[1]
+        mz = mag[2] - magbias[2]
+        ax = accel[0]                       # Units irrelevant (normalised)
+        ay = accel[1]
+        az = accel[2]
+        gx = radians(gyro[0])               # Units deg/s
+        gy = radians(gyro[1])
+        gz = radians(gyro[2])
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        q1q1 = q1 * q1
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q1q4 = q1 * q4
+        q2q2 = q2 * q2
+        q2q3 = q2 * q3
+        q2q4 = q2 * q4
+        q3q3 = q3 * q3
+        q3q4 = q3 * q4
+        q4q4 = q4 * q4
+
+        # Normalise accelerometer measurement
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if (norm == 0):
+            return # handle NaN
+        norm = 1 / norm
+        ax *= norm
+        ay *= norm
+        az *= norm
+
+        # Normalise magnetometer measurement
+        norm = sqrt(mx * mx + my * my + mz * mz)
+        if (norm == 0):
+            return # handle NaN
+        norm = 1 / norm
+        mx *= norm
+        my *= norm
+        mz *= norm
+
+        # Reference direction of Earth's magnetic field
+        hx = 2 * (mx * (0.5 - q3q3 - q4q4) + my * (q2q3 - q1q4) + mz * (q2q4 + q1q3))
+        hy = 2 * (mx * (q2q3 + q1q4) + my * (0.5 - q2q2 - q4q4) + mz * (q3q4 - q1q2))
+        bx = sqrt(hx * hx + hy * hy)
+        bz = 2 * (mx * (q2q4 - q1q3) + my * (q3q4 + q1q2) + mz * (0.5 - q2q2 - q3q3))
+
+        # Estimated direction of gravity and magnetic field
+        vx = q2q4 - q1q3
+        vy = q1q2 + q3q4
+        vz = q1q1 - 0.5 + q4q4
+        wx = bx * (0.5 - q3q3 - q4q4) + bz * (q2q4 - q1q3)
+        wy = bx * (q2q3 - q1q4) + bz * (q1q2 + q3q4)
+        wz = bx * (q1q3 + q2q4) + bz * (0.5 - q2q2 - q3q3)
+
+        # Error is sum of cross product between estimated and measured direction of fields
+        ex = 2 * ((ay * vz - az * vy) + (my * wz - mz * wy))
+        ey = 2 * ((az * vx - ax * vz) + (mz * wx - mx * wz))
+        ez = 2 * ((ax * vy - ay * vx) + (mx * wy - my * wx))
+
+        self._feedback(gx, gy, gz, ex, ey, ez, ts)
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        self.heading = self.declination + degrees(atan2(2.0 * (q2 * q3 + q1 * q4), q1 * q1 + q2 * q2 - q3 * q3 - q4 * q4))
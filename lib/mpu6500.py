@@ -35,6 +35,8 @@ from micropython import const
 
 # pylint: enable=import-error
 
+_SMPLRT_DIV = const(0x19)
+_CONFIG = const(0x1A)
 _GYRO_CONFIG = const(0x1B)
 _ACCEL_CONFIG = const(0x1C)
 _ACCEL_CONFIG2 = const(0x1D)
@@ -56,6 +58,24 @@ _WHO_AM_I = const(0x75)
 
 _PWR_MGMT_1 = const(0x6B)
 
+_FIFO_EN = const(0x23)
+_INT_ENABLE = const(0x38)
+_INT_STATUS = const(0x3A)
+_USER_CTRL = const(0x6A)
+_FIFO_COUNTH = const(0x72)
+_FIFO_R_W = const(0x74)
+
+_CONFIG_FIFO_MODE_STOP = const(0b01000000)  # Drop new samples when full
+_CONFIG_DLPF_184HZ = const(0b00000001)  # 1 kHz internal rate, enables SMPLRT_DIV
+_FIFO_EN_GYRO_ACCEL = const(0b01111000)  # GYRO_XOUT, _YOUT, _ZOUT, ACCEL
+_USER_CTRL_FIFO_EN = const(0b01000000)
+_USER_CTRL_FIFO_RST = const(0b00000100)
+_INT_STATUS_FIFO_OFLOW = const(0b00010000)
+_INT_ENABLE_RAW_RDY = const(0b00000001)
+
+FIFO_FRAME_LEN = const(12)  # Accel (6) + gyro (6), big endian
+FIFO_SIZE = const(512)
+
 # _ACCEL_FS_MASK = const(0b00011000)
 ACCEL_FS_SEL_2G = const(0b00000000)
 ACCEL_FS_SEL_4G = const(0b00001000)
@@ -164,6 +184,56 @@ class MPU6500:
         """Value of the whoami register."""
         return self._register_char(_WHO_AM_I)
 
+    def fifo_enable(self, rate=100):
+        """
+        Sample accel and gyro at `rate` Hz (4 to 1000) into the FIFO, see
+        FIFO_FRAME_LEN for the frame layout. Returns the actual sample rate.
+        """
+        self._register_char(_CONFIG, _CONFIG_FIFO_MODE_STOP | _CONFIG_DLPF_184HZ)
+        rate = self._sample_rate(rate)
+        self._register_char(_FIFO_EN, _FIFO_EN_GYRO_ACCEL)
+        self.fifo_reset()
+        return rate
+
+    def data_ready_enable(self, rate=100):
+        """
+        Pulse the INT pin (active high, 50us) every time a new sample is
+        available, `rate` Hz (4 to 1000). Returns the actual sample rate.
+        """
+        char = self._register_char(_CONFIG) & _CONFIG_FIFO_MODE_STOP
+        self._register_char(_CONFIG, char | _CONFIG_DLPF_184HZ)
+        rate = self._sample_rate(rate)
+        self._register_char(_INT_ENABLE, _INT_ENABLE_RAW_RDY)
+        return rate
+
+    def data_ready_disable(self):
+        self._register_char(_INT_ENABLE, 0)
+
+    def fifo_disable(self):
+        self._register_char(_FIFO_EN, 0)
+        char = self._register_char(_USER_CTRL)
+        self._register_char(_USER_CTRL, char & ~_USER_CTRL_FIFO_EN)
+
+    def fifo_reset(self):
+        char = self._register_char(_USER_CTRL) & ~_USER_CTRL_FIFO_EN
+        self._register_char(_USER_CTRL, char | _USER_CTRL_FIFO_RST)
+        self._register_char(_USER_CTRL, char | _USER_CTRL_FIFO_EN)
+        self._register_char(_INT_STATUS)  # Clear a pending overflow
+
+    @property
+    def fifo_count(self):
+        """Number of bytes queued in the FIFO."""
+        return self._register_short(_FIFO_COUNTH) & 0x1FFF
+
+    @property
+    def fifo_overflow(self):
+        """True if the FIFO filled up since the last INT_STATUS read."""
+        return bool(self._register_char(_INT_STATUS) & _INT_STATUS_FIFO_OFLOW)
+
+    def fifo_read_into(self, buf):
+        """Pop len(buf) bytes from the FIFO in one transaction."""
+        self.i2c.readfrom_mem_into(self.address, _FIFO_R_W, buf)
+
     def calibrate(self, count=256, delay=0):
         ox, oy, oz = (0.0, 0.0, 0.0)
         self._gyro_offset = (0.0, 0.0, 0.0)
@@ -200,6 +270,12 @@ class MPU6500:
         ustruct.pack_into("<b", buf, 0, value)
         return self.i2c.writeto_mem(self.address, register, buf)
 
+    def _sample_rate(self, rate):
+        # Only effective with the DLPF enabled (1 kHz internal rate)
+        divider = max(0, min(255, round(1000 / rate) - 1))
+        self._register_char(_SMPLRT_DIV, divider)
+        return 1000 / (1 + divider)
+
     def _accel_fs(self, value):
         self._register_char(_ACCEL_CONFIG, value)
 
@@ -39,6 +39,25 @@ _I2C_BYPASS_MASK = const(0b00000010)
 _I2C_BYPASS_EN = const(0b00000010)
 _I2C_BYPASS_DIS = const(0b00000000)
 
+# Used for reading the AK8963 through the MPU6500 I2C master (slave 0)
+_I2C_MST_CTRL = const(0x24)
+_I2C_MST_CLK_400KHZ = const(0b00001101)
+_I2C_SLV0_ADDR = const(0x25)
+_I2C_SLV0_REG = const(0x26)
+_I2C_SLV0_CTRL = const(0x27)
+_I2C_SLV0_EN = const(0b10000000)
+_I2C_READ = const(0b10000000)
+_USER_CTRL = const(0x6A)
+_I2C_MST_EN = const(0b00100000)
+_ACCEL_XOUT_H = const(0x3B)
+_EXT_SENS_DATA_00 = const(0x49)
+_AK8963_HXL = const(0x03)
+_AK8963_DATA_LEN = const(7)  # HXL to HZH plus ST2, reading ST2 unlatches data
+
+# Accel (6) + temperature (2) + gyro (6) + EXT_SENS_DATA_00..06 (7)
+BURST_LEN = const(21)
+EXT_SENS_LEN = const(7)
+
 
 class MPU9250:
     """Class which provides interface to MPU9250 9-axis motion tracking device."""
@@ -60,6 +79,8 @@ class MPU9250:
         else:
             self.ak8963 = ak8963
 
+        self.passthrough = False
+
     @property
     def acceleration(self):
         """
@@ -96,6 +117,62 @@ class MPU9250:
     def whoami(self):
         return self.mpu6500.whoami
 
+    def enable_passthrough(self):
+        """
+        Let the MPU6500 I2C master copy the AK8963 readings into its
+        EXT_SENS_DATA registers, so that a single burst starting at
+        ACCEL_XOUT_H returns all nine axes (see read_burst_into). The AK8963
+        cannot be accessed directly until disable_passthrough() is called.
+        """
+        mpu6500 = self.mpu6500
+
+        char = mpu6500._register_char(_INT_PIN_CFG)
+        char &= ~_I2C_BYPASS_MASK  # clear I2C bits
+        char |= _I2C_BYPASS_DIS
+        mpu6500._register_char(_INT_PIN_CFG, char)
+
+        mpu6500._register_char(_I2C_MST_CTRL, _I2C_MST_CLK_400KHZ)
+        mpu6500._register_char(_I2C_SLV0_ADDR, _I2C_READ | self.ak8963.address)
+        mpu6500._register_char(_I2C_SLV0_REG, _AK8963_HXL)
+        mpu6500._register_char(_I2C_SLV0_CTRL, _I2C_SLV0_EN | _AK8963_DATA_LEN)
+
+        char = mpu6500._register_char(_USER_CTRL)
+        mpu6500._register_char(_USER_CTRL, char | _I2C_MST_EN)
+
+        self.passthrough = True
+
+    def disable_passthrough(self):
+        """Restore direct access to the AK8963 through the I2C bypass."""
+        mpu6500 = self.mpu6500
+
+        mpu6500._register_char(_I2C_SLV0_CTRL, 0)
+        char = mpu6500._register_char(_USER_CTRL)
+        mpu6500._register_char(_USER_CTRL, char & ~_I2C_MST_EN)
+
+        char = mpu6500._register_char(_INT_PIN_CFG)
+        char &= ~_I2C_BYPASS_MASK  # clear I2C bits
+        char |= _I2C_BYPASS_EN
+        mpu6500._register_char(_INT_PIN_CFG, char)
+
+        self.passthrough = False
+
+    def read_burst_into(self, buf):
+        """
+        Raw accel, temperature and gyro (big endian) followed by the AK8963
+        HXL..HZH (little endian) and ST2 registers, in one I2C transaction.
+        Requires enable_passthrough() and a buffer of BURST_LEN bytes.
+        """
+        self.mpu6500.i2c.readfrom_mem_into(self.mpu6500.address, _ACCEL_XOUT_H, buf)
+
+    def read_magnetic_into(self, buf):
+        """
+        Raw AK8963 HXL..HZH (little endian) and ST2 registers as last copied
+        by the I2C master. Requires enable_passthrough() and EXT_SENS_LEN bytes.
+        """
+        self.mpu6500.i2c.readfrom_mem_into(
+            self.mpu6500.address, _EXT_SENS_DATA_00, buf
+        )
+
     def __enter__(self):
         return self
 
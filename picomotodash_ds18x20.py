@@ -4,62 +4,332 @@
 
 __author__ = "Salvatore La Bua"
 
+from array import array
 from ds18x20 import DS18X20 as DS
 from machine import Pin
 from onewire import OneWire, OneWireError
-from utime import sleep_ms
+from ubinascii import hexlify
+from utime import sleep_ms, ticks_add, ticks_diff, ticks_ms, ticks_us
 
 
 ds_pin = Pin(1)  # 1-Wire temperature sensors
 DS_RESOLUTION = 11
+DS_PERIOD_MS = 0  # Sampling period, 0 converts again as soon as read
+RESCAN_MS = 5000  # Hot-plug scan period, read errors trigger an earlier one
+CONVERSION_MARGIN_MS = 1  # A conversion started late in its ticks_ms() tick
+
+NO_READING = float("nan")  # Sensor not read successfully yet
+
+_CONVERT_T = 0x44
+
+# Configuration register per resolution
+_CONFIG = {
+    9: b"\x00\x00\x1f",
+    10: b"\x00\x00\x3f",
+    11: b"\x00\x00\x5f",
+    12: b"\x00\x00\x7f",
+}
+
+# Per-ROM state, see add_sensor()
+_RESOLUTION = 0
+_PERIOD = 1
+_DUE = 2  # ticks_ms() of the next conversion
+_START = 3  # ticks_ms() of the running conversion
+_CONVERTING = 4
+_LEN = 5
+
+
+def rom_id(rom):
+    # Key used by profiles, e.g. "28ff641e8216c3a1"
+    return hexlify(rom).decode()
+
+
+def conversion_ms(resolution):
+    # 750 ms at 12 bits, halved for every bit less: 93.75 ms at 9 bits is
+    # rounded up, plus the ticks_ms() granularity of the start time
+    shift = 12 - resolution
+    return ((750 + (1 << shift) - 1) >> shift) + CONVERSION_MARGIN_MS
 
 
 class DS18X20:
+    """DS18x20 sensors on one 1-Wire bus, sampled without blocking.
+
+    profiles maps rom_id() to (resolution, period_ms), for instance a coolant
+    sensor at (12, 2000) and the ambient one at (9, 10000). Other sensors use
+    resolution and period_ms. Every sensor converts on its own schedule, so
+    conversions overlap and the bus is only used to start and read them.
+    """
 
-    def __init__(self, pin=ds_pin, resolution=DS_RESOLUTION):
+    def __init__(
+        self,
+        pin=ds_pin,
+        resolution=DS_RESOLUTION,
+        rescan_ms=RESCAN_MS,
+        period_ms=DS_PERIOD_MS,
+        profiles=None,
+    ):
 
         self.pin = pin
         self.resolution = resolution
+        self.period_ms = period_ms
+        self.profiles = profiles if profiles is not None else {}
+
+        # Bus scans, the resolution is written once to every new ROM
+        self.rescan_ms = rescan_ms
+        self.rescan_needed = False
+        self.sensors = {}  # bytes(rom): per-ROM state, see _RESOLUTION...
+        self.last_scan = ticks_ms()
+        self.scans = 0
+        self.scan_us = 0  # Duration of the last scan
 
         self.ds_sensor = DS(OneWire(self.pin))
         self.roms = self.ds_scan_roms(self.ds_sensor, self.resolution)
 
         self.temperatures = []
+        self.keys = []  # bytes(rom) in self.roms order, see TemperatureHistory
+        self.states = []  # Per-ROM state in self.roms order
+        self.sync_roms()
+        self.read_errors = 0
+        self.read_blocking()
+
+    def add_sensor(self, rom, resolution):
+        resolution, period = self.profiles.get(
+            rom_id(rom), (resolution, self.period_ms)
+        )
+        self.ds_sensor.write_scratch(rom, _CONFIG[resolution])
+
+        sensor = [0] * _LEN
+        sensor[_RESOLUTION] = resolution
+        sensor[_PERIOD] = period
+        sensor[_DUE] = ticks_ms()
+        sensor[_CONVERTING] = False
+        self.sensors[bytes(rom)] = sensor
 
     def ds_scan_roms(self, ds_sensor, resolution):
+        start = ticks_us()
+
         roms = ds_sensor.scan()
+        keys = set()
         for rom in roms:
-            if resolution == 9:
-                config = b"\x00\x00\x1f"
-            elif resolution == 10:
-                config = b"\x00\x00\x3f"
-            elif resolution == 11:
-                config = b"\x00\x00\x5f"
-            elif resolution == 12:
-                config = b"\x00\x00\x7f"
-            ds_sensor.write_scratch(rom, config)
+            key = bytes(rom)
+            keys.add(key)
+            if key not in self.sensors:
+                self.add_sensor(rom, resolution)
+
+        # An unplugged sensor reverts to its EEPROM settings
+        for key in list(self.sensors):
+            if key not in keys:
+                del self.sensors[key]
+
+        self.last_scan = ticks_ms()
+        self.scans += 1
+        self.scan_us = ticks_diff(ticks_us(), start)
         return roms
 
-    def update_roms(self):
-        self.roms = self.ds_scan_roms(self.ds_sensor, self.resolution)
+    def update_roms(self, force=False):
+        # Cheap to call every frame, scans only every rescan_ms or after errors
+        if not (
+            force
+            or self.rescan_needed
+            or ticks_diff(ticks_ms(), self.last_scan) >= self.rescan_ms
+        ):
+            return
+
+        self.rescan_needed = False
+        try:
+            roms = self.ds_scan_roms(self.ds_sensor, self.resolution)
+        except OneWireError:
+            print("Cannot access the sensor.")
+            return
+
+        if roms != self.roms:
+            self.roms = roms
+            self.sync_roms()
+
+    def sync_roms(self):
+        # Temperatures follow their ROM, a sensor unplugged from the middle
+        # of the bus must not hand its reading over to the next one
+        previous = {}
+        for r in range(len(self.keys)):
+            previous[self.keys[r]] = self.temperatures[r]
+
+        self.keys = [bytes(rom) for rom in self.roms]
+        self.states = [self.sensors[key] for key in self.keys]
+        self.temperatures[:] = [previous.get(key, NO_READING) for key in self.keys]
+
+    def start_conversion(self, rom, sensor, now):
+        # Convert T addressed to a single ROM, the others keep their schedule
+        ow = self.ds_sensor.ow
+        try:
+            ow.reset(True)
+            ow.select_rom(rom)
+            ow.writebyte(_CONVERT_T)
+        except OneWireError:
+            print("Cannot access the sensor.")
+            self.rescan_needed = True
+            return
+
+        sensor[_START] = now
+        sensor[_CONVERTING] = True
+
+    def read_conversion(self, r, rom, sensor):
+        # Keep the last good value of a sensor that fails to read
+        sensor[_CONVERTING] = False
+        sensor[_DUE] = ticks_add(sensor[_START], sensor[_PERIOD])
+
+        try:
+            self.temperatures[r] = self.ds_sensor.read_temp(rom)
+        except Exception:  # CRC error or OneWireError
+            self.read_errors += 1
+            self.rescan_needed = True
+
+    def read_blocking(self):
+        # All sensors at once, waiting for the slowest resolution
+        if len(self.roms) == 0:
+            return self.temperatures
+
+        try:
+            self.ds_sensor.convert_temp()
+        except OneWireError:
+            print("Cannot access the sensor.")
+            self.rescan_needed = True
+            return self.temperatures
+
+        sleep_ms(max(conversion_ms(s[_RESOLUTION]) for s in self.states))
+
+        now = ticks_ms()
+        for r in range(len(self.roms)):
+            sensor = self.states[r]
+            sensor[_START] = now
+            self.read_conversion(r, self.roms[r], sensor)
+
+        return self.temperatures
 
     def update_temps(self):
+        # Never waits: reads finished conversions, starts the due ones and
+        # returns the last completed temperatures
+        now = ticks_ms()
+        roms = self.roms
+        states = self.states
 
-        if len(self.roms) > 0:
-            try:
-                self.ds_sensor.convert_temp()
-            except OneWireError:
-                print("Cannot access the sensor.")
-            else:
-                sleep_ms(round(750 / (2 ** (12 - DS_RESOLUTION))))
+        for r in range(len(roms)):
+            rom = roms[r]
+            sensor = states[r]
 
-                self.temperatures = []
-                for r in range(len(self.roms)):
-                    self.temperatures.append(self.ds_sensor.read_temp(self.roms[r]))
+            if sensor[_CONVERTING]:
+                elapsed = ticks_diff(now, sensor[_START])
+                if elapsed >= conversion_ms(sensor[_RESOLUTION]):
+                    self.read_conversion(r, rom, sensor)
+
+            if not sensor[_CONVERTING] and ticks_diff(now, sensor[_DUE]) >= 0:
+                self.start_conversion(rom, sensor, now)
 
         return self.temperatures
 
     def read_nth(self, nth):
-        self.update()
+        return self.update_temps()[nth]
+
+
+class TemperatureRing:
+    """Fixed-capacity history of one sensor, iterates oldest first."""
+
+    def __init__(self, capacity):
+
+        self.values = array("f", [0] * capacity)
+        self.capacity = capacity
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.total = 0.0
+        self.min = NO_READING
+        self.max = NO_READING
+
+    def add(self, value):
+        if value != value:  # NO_READING
+            return
+
+        values = self.values
+        head = self.head
+        evicted = None
+        if self.count == self.capacity:
+            evicted = values[head]
+            self.total -= evicted
+        else:
+            self.count += 1
+
+        values[head] = value
+        value = values[head]  # Rounded to float32, as update_min_max sees it
+        self.head = (head + 1) % self.capacity
+        self.total += value
+
+        if self.count == 1:
+            self.min = value
+            self.max = value
+        elif evicted is not None and (evicted <= self.min or evicted >= self.max):
+            self.update_min_max()  # Only when an extreme leaves the window
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def update_min_max(self):
+        values = self.values
+        lo = hi = values[0]
+        for i in range(1, self.count):
+            v = values[i]
+            if v < lo:
+                lo = v
+            elif v > hi:
+                hi = v
+        self.min = lo
+        self.max = hi
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else NO_READING
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = NO_READING
+        self.max = NO_READING
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        values = self.values
+        capacity = self.capacity
+        i = (self.head - self.count) % capacity
+        for _ in range(self.count):
+            yield values[i]
+            i = (i + 1) % capacity
+
+
+class TemperatureHistory:
+    """Temperature rings keyed by sensor, bytes(rom) for DS18x20 sensors
+    (see DS18X20.keys), so a history follows its sensor across rescans."""
+
+    def __init__(self, capacity):
+
+        self.capacity = capacity
+        self.rings = {}
+
+    def add(self, key, value):
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = TemperatureRing(self.capacity)
+            self.rings[key] = ring
+        ring.add(value)
+
+    def add_all(self, keys, temperatures):
+        for i in range(len(keys)):
+            self.add(keys[i], temperatures[i])
+
+    def get(self, key):
+        return self.rings.get(key)
 
-        return self.ds_sensor.read_temp(self.roms[nth])
+    def clear(self, key):
+        ring = self.rings.get(key)
+        if ring is not None:
+            ring.clear()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Pico Motorcycle Dashboard Fast Math
+
+Table based sin/cos and polynomial atan2 for the IMU path, drop-in
+replacements of the math module functions (radians).
+"""
+
+__author__ = "Salvatore La Bua"
+
+
+import micropython
+from array import array
+from math import pi
+from math import sin as _math_sin
+
+# Sine table over one turn, must be a power of two
+# Linear interpolation error is below (2 pi / SIN_TABLE_SIZE)^2 / 8
+SIN_TABLE_SIZE = 256
+SIN_TABLE_MASK = SIN_TABLE_SIZE - 1
+SIN_MAX_ERROR = 8e-5
+ATAN2_MAX_ERROR = 2e-5  # rad, see atan2()
+
+_TWO_PI = 2 * pi
+_HALF_PI = pi / 2
+_QUARTER_TURN = SIN_TABLE_SIZE // 4
+_TO_INDEX = SIN_TABLE_SIZE / _TWO_PI
+
+# One extra entry so that interpolation never wraps
+_SIN = array(
+    "f", [_math_sin(i * _TWO_PI / SIN_TABLE_SIZE) for i in range(SIN_TABLE_SIZE + 1)]
+)
+
+
+@micropython.native
+def _sin_index(t):
+    i = int(t)
+    if t < i:  # Floor for negative angles
+        i -= 1
+    frac = t - i
+    i &= SIN_TABLE_MASK
+    a = _SIN[i]
+    return a + (_SIN[i + 1] - a) * frac
+
+
+@micropython.native
+def sin(x):
+    return _sin_index(x * _TO_INDEX)
+
+
+@micropython.native
+def cos(x):
+    return _sin_index(x * _TO_INDEX + _QUARTER_TURN)
+
+
+@micropython.native
+def atan2(y, x):
+    # Reduce to |z| <= 1, then Abramowitz and Stegun 4.4.49, error <= 1e-5 rad
+    ax = abs(x)
+    ay = abs(y)
+    if ax == 0 and ay == 0:
+        return 0.0
+
+    if ay > ax:
+        z = ax / ay
+    else:
+        z = ay / ax
+    z2 = z * z
+    a = z * (
+        0.9998660
+        + z2 * (-0.3302995 + z2 * (0.1801410 + z2 * (-0.0851330 + z2 * 0.0208351)))
+    )
+
+    if ay > ax:
+        a = _HALF_PI - a
+    if x < 0:
+        a = pi - a
+    if y < 0:
+        a = -a
+
+    return a
+
+
+if __name__ == "__main__":
+    import math
+    from utime import ticks_diff, ticks_us
+
+    n = 2000
+    err_sin = 0
+    err_cos = 0
+    err_atan2 = 0
+    for i in range(n):
+        x = (i - n / 2) * 8 * pi / n
+        err_sin = max(err_sin, abs(sin(x) - math.sin(x)))
+        err_cos = max(err_cos, abs(cos(x) - math.cos(x)))
+        y = math.sin(x) * (i % 7 + 1)
+        z = math.cos(x) * (i % 5 + 1)
+        err_atan2 = max(err_atan2, abs(atan2(y, z) - math.atan2(y, z)))
+
+    print("Max error sin: %.2e, cos: %.2e, atan2: %.2e" % (err_sin, err_cos, err_atan2))
+
+    for name, f, g in (
+        ("sin", sin, math.sin),
+        ("cos", cos, math.cos),
+        ("atan2", lambda v: atan2(v, 0.7), lambda v: math.atan2(v, 0.7)),
+    ):
+        start = ticks_us()
+        for i in range(n):
+            f(i * 0.01)
+        fast = ticks_diff(ticks_us(), start)
+        start = ticks_us()
+        for i in range(n):
+            g(i * 0.01)
+        ref = ticks_diff(ticks_us(), start)
+        print("%s: %d us fast, %d us math" % (name, fast, ref))
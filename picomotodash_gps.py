@@ -5,26 +5,354 @@
 __author__ = "Salvatore La Bua"
 
 
+from array import array
+from math import cos, degrees, radians, sin, sqrt
 from L76 import l76x
 from L76.micropyGPS.micropyGPS import MicropyGPS
-from utime import sleep
+from machine import Timer, UART
+from utime import sleep, sleep_ms, ticks_diff, ticks_ms, ticks_us
 
 UARTx = 0
 BAUDRATE = 9600
+NMEA_BAUDRATE = 115200  # Negotiated at startup, None keeps BAUDRATE
+FIX_INTERVAL_MS = 200  # 5 Hz, None keeps the receiver default (1 Hz)
+FIX_INTERVAL_MIN_9600 = 200  # RMC + GGA at 9600 baud cannot go faster
+ACK_TIMEOUT_MS = 500  # The L76X acks within ~100 ms
+SENTENCE_TIMEOUT_MS = 1200  # One epoch at the default 1 Hz, plus margin
+
+# PMTK commands, checksum and terminator are added by l76x_send_command
+SET_NMEA_OUTPUT_RMC_GGA = "$PMTK314,0,1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0"
+SET_NMEA_BAUDRATE = "$PMTK251,%d"
+SET_POS_FIX = "$PMTK220,%d"
+RX_BUFFER_SIZE = 256
+TIME_BUDGET_US = 2000  # Max time spent parsing per bulk update
+RX_POLL_FREQ = 50  # Hz, receive timer used when UART.IRQ_RXIDLE is unavailable
+
+# drain() result flags
+RX_DATA = 1
+RX_FIX = 2
+
+# Fix snapshot layout, see GPS.latest_fix()
+FIX_LATITUDE = 0  # Decimal degrees, negative south
+FIX_LONGITUDE = 1  # Decimal degrees, negative west
+FIX_SPEED = 2  # km/h
+FIX_COURSE = 3  # Degrees
+FIX_ALTITUDE = 4  # m
+FIX_HDOP = 5
+FIX_SATELLITES = 6
+FIX_TIME = 7  # Seconds since local midnight
+FIX_STATUS = 8
+FIX_TICKS = 9  # ticks_ms() when the fix was published
+FIX_LEN = 10
+
+# Dead reckoning
+DR_HORIZON_MS = 2000  # Stop extrapolating this long after the last fix
+DR_ACCEL_BIAS_ALPHA = 0.05  # Weight of each fix in the accelerometer bias
+EARTH_RADIUS = 6371000  # m
+STANDARD_GRAVITY = 9.80665  # m/s^2
+
+# NMEA parser
+SENTENCE_TYPES = (b"GGA", b"RMC", b"VTG")
+SENTENCE_MAX_LEN = 96  # NMEA 0183 allows 82, leave room for proprietary ones
+FIELDS_MAX = 24
+KNOTS2MPH = 1.151
+KNOTS2KPH = 1.852
+
+_WAIT = 0  # Waiting for "$"
+_HEADER = 1  # Reading talker and sentence type
+_BODY = 2  # Accumulating a wanted sentence
+_SKIP = 3  # Discarding an unwanted sentence up to the end of line
+
+
+def _parse_int(buf, start, end):
+    value = 0
+    while start < end:
+        value = value * 10 + buf[start] - 48
+        start += 1
+    return value
+
+
+def _parse_float(buf, start, end):
+    value = 0
+    frac = 0
+    div = 1
+    negative = start < end and buf[start] == 45  # "-"
+    if negative:
+        start += 1
+    while start < end and buf[start] != 46:  # "."
+        value = value * 10 + buf[start] - 48
+        start += 1
+    start += 1
+    while start < end:
+        frac = frac * 10 + buf[start] - 48
+        div *= 10
+        start += 1
+    value += frac / div
+    return -value if negative else value
+
+
+def _parse_coord(buf, start, end):
+    # (d)ddmm.mmmm to decimal degrees
+    dot = start
+    while dot < end and buf[dot] != 46:  # "."
+        dot += 1
+    return _parse_int(buf, start, dot - 2) + _parse_float(buf, dot - 2, end) / 60
+
+
+def _hex_digit(char):
+    return char - 48 if char < 65 else (char & 0xDF) - 55
+
+
+class NMEAParser:
+    """Checksum-validating NMEA parser for the GGA, RMC and VTG fields used by
+    the dashboards. Bytes are fed from the receive buffer, unwanted sentence
+    types are discarded without being tokenised and results are written into
+    preallocated slots, using the same layout as MicropyGPS with "dd" formatting.
+    """
+
+    def __init__(self, local_offset=0, sentence_types=SENTENCE_TYPES):
+
+        self.local_offset = local_offset
+        self.sentence_types = sentence_types
+
+        self.line = bytearray(SENTENCE_MAX_LEN)
+        self.line_len = 0
+        self.commas = array("B", [0] * FIELDS_MAX)
+        self.n_commas = 0
+        self.star = 0
+        self.state = _WAIT
+        self.updated = False
+
+        self.latitude = [0.0, "N"]
+        self.longitude = [0.0, "E"]
+        self.speed = [0.0, 0.0, 0.0]  # knots, mph, km/h
+        self.course = 0.0
+        self.altitude = 0.0
+        self.geoid_height = 0.0
+        self.hdop = 0.0
+        self.satellites_in_use = 0
+        self.timestamp = [0, 0, 0]
+        self.fix_stat = 0
+        self.valid = False
+
+        self.parsed_sentences = 0
+        self.skipped_sentences = 0
+        self.crc_fails = 0
+
+    def feed(self, buf, start, end):
+        """Consume buf[start:end] until a sentence has been parsed.
+        Returns the index of the first byte not consumed yet, `updated` tells
+        whether the slots were refreshed by a valid sentence.
+        """
+        self.updated = False
+        line = self.line
+
+        while start < end:
+            char = buf[start]
+            start += 1
+
+            if char == 36:  # "$"
+                line[0] = char
+                self.line_len = 1
+                self.n_commas = 0
+                self.state = _HEADER
+                continue
+
+            state = self.state
+            if state == _WAIT or state == _SKIP:
+                continue
+
+            if char == 13 or char == 10:  # "\r" or "\n"
+                self.state = _WAIT
+                if state == _BODY and self.parse_line():
+                    self.updated = True
+                    return start
+                continue
+
+            if self.line_len >= SENTENCE_MAX_LEN:
+                self.state = _WAIT
+                continue
+
+            if char == 44:  # ","
+                if self.n_commas >= FIELDS_MAX:
+                    self.state = _WAIT
+                    continue
+                self.commas[self.n_commas] = self.line_len
+                self.n_commas += 1
+
+            line[self.line_len] = char
+            self.line_len += 1
+
+            if state == _HEADER and self.line_len == 6:
+                self.state = _SKIP
+                for sentence_type in self.sentence_types:
+                    if (
+                        line[3] == sentence_type[0]
+                        and line[4] == sentence_type[1]
+                        and line[5] == sentence_type[2]
+                    ):
+                        self.state = _BODY
+                        break
+                if self.state == _SKIP:
+                    self.skipped_sentences += 1
+
+        return start
+
+    def field(self, n):
+        # Start and end index of the nth field, 1-based as in the NMEA spec
+        start = self.commas[n - 1] + 1
+        end = self.commas[n] if n < self.n_commas else self.star
+        return start, end
+
+    def parse_line(self):
+        line = self.line
+        length = self.line_len
+
+        # Validate "*hh" checksum
+        star = length - 3
+        if star < 6 or line[star] != 42:  # "*"
+            self.crc_fails += 1
+            return False
+        crc = 0
+        for i in range(1, star):
+            crc ^= line[i]
+        if crc != (_hex_digit(line[star + 1]) << 4) | _hex_digit(line[star + 2]):
+            self.crc_fails += 1
+            return False
+        self.star = star
+
+        # Commas past the checksum do not delimit fields
+        while self.n_commas > 0 and self.commas[self.n_commas - 1] > star:
+            self.n_commas -= 1
+
+        if line[3] == 71:  # "G"GA
+            self.parse_gga()
+        elif line[3] == 82:  # "R"MC
+            self.parse_rmc()
+        elif line[3] == 86:  # "V"TG
+            self.parse_vtg()
+
+        self.parsed_sentences += 1
+        return True
+
+    def parse_time(self, n):
+        start, end = self.field(n)
+        if end - start >= 6:
+            line = self.line
+            self.timestamp[0] = (
+                _parse_int(line, start, start + 2) + self.local_offset
+            ) % 24
+            self.timestamp[1] = _parse_int(line, start + 2, start + 4)
+            self.timestamp[2] = _parse_float(line, start + 4, end)
+
+    def parse_position(self, n):
+        line = self.line
+        start, end = self.field(n)
+        if start == end:
+            return
+        self.latitude[0] = _parse_coord(line, start, end)
+        start, end = self.field(n + 1)
+        self.latitude[1] = "S" if end > start and line[start] == 83 else "N"
+        start, end = self.field(n + 2)
+        if start == end:
+            return
+        self.longitude[0] = _parse_coord(line, start, end)
+        start, end = self.field(n + 3)
+        self.longitude[1] = "W" if end > start and line[start] == 87 else "E"
+
+    def set_speed(self, knots):
+        self.speed[0] = knots
+        self.speed[1] = knots * KNOTS2MPH
+        self.speed[2] = knots * KNOTS2KPH
+
+    def parse_gga(self):
+        if self.n_commas < 11:
+            return
+        line = self.line
+        self.parse_time(1)
+
+        start, end = self.field(6)
+        self.fix_stat = _parse_int(line, start, end)
+        if self.fix_stat == 0:
+            return
+
+        self.parse_position(2)
+        start, end = self.field(7)
+        self.satellites_in_use = _parse_int(line, start, end)
+        start, end = self.field(8)
+        if end > start:
+            self.hdop = _parse_float(line, start, end)
+        start, end = self.field(9)
+        if end > start:
+            self.altitude = _parse_float(line, start, end)
+        start, end = self.field(11)
+        if end > start:
+            self.geoid_height = _parse_float(line, start, end)
+
+    def parse_rmc(self):
+        if self.n_commas < 9:
+            return
+        line = self.line
+        self.parse_time(1)
+
+        start, end = self.field(2)
+        self.valid = end > start and line[start] == 65  # "A"
+        if not self.valid:
+            return
+
+        self.parse_position(3)
+        start, end = self.field(7)
+        if end > start:
+            self.set_speed(_parse_float(line, start, end))
+        start, end = self.field(8)
+        if end > start:
+            self.course = _parse_float(line, start, end)
+
+    def parse_vtg(self):
+        if self.n_commas < 8:
+            return
+        line = self.line
+
+        start, end = self.field(1)
+        if end > start:
+            self.course = _parse_float(line, start, end)
+        start, end = self.field(5)
+        if end > start:
+            self.set_speed(_parse_float(line, start, end))
 
 
 class GPS:
 
     def __init__(
-        self, uartx=UARTx, _baudrate=BAUDRATE, local_offset=9, location_formatting="dd"
+        self,
+        uartx=UARTx,
+        _baudrate=BAUDRATE,
+        local_offset=9,
+        location_formatting="dd",
+        lean=True,
+        irq=False,
+        baudrate=NMEA_BAUDRATE,
+        fix_interval=FIX_INTERVAL_MS,
+        rmc_gga_only=True,
     ):
 
         self.gnss_l76b = l76x.L76X(uartx=uartx, _baudrate=_baudrate)
         self.gnss_l76b.l76x_exit_backup_mode()
         self.gnss_l76b.l76x_send_command(self.gnss_l76b.SET_SYNC_PPS_NMEA_ON)
-        self.parser = MicropyGPS(
-            local_offset=local_offset, location_formatting=location_formatting
+        self.baudrate = _baudrate
+        self.rx_heard = False
+        self.configure(
+            baudrate=baudrate, fix_interval=fix_interval, rmc_gga_only=rmc_gga_only
         )
+
+        # The lean parser only supports "dd" location formatting
+        self.lean = lean and location_formatting == "dd"
+        if self.lean:
+            self.parser = NMEAParser(local_offset=local_offset)
+        else:
+            self.parser = MicropyGPS(
+                local_offset=local_offset, location_formatting=location_formatting
+            )
         # self.parser.start_logging("log.txt")
         # self.sentence = ""
 
@@ -37,13 +365,174 @@ class GPS:
         self.speed = -1
         self.timestamp = [0, 0, 0]
 
+        if self.lean:
+            # Updated in place by the parser, no copies needed
+            self.latitude = self.parser.latitude
+            self.longitude = self.parser.longitude
+            self.timestamp = self.parser.timestamp
+
+        # Receive buffer reused by the bulk update
+        self.rx_buf = bytearray(RX_BUFFER_SIZE)
+        self.rx_pos = 0
+        self.rx_len = 0
+
+        # Double-buffered fix snapshots, the receive path writes the back one
+        # and swaps, readers get the front one from latest_fix()
+        self.fixes = [[0] * FIX_LEN, [0] * FIX_LEN]
+        self.front = 0
+        self.fix_time = -1  # FIX_TIME of the published epoch
+
+        self.irq_active = False
+        self.rx_timer = None
+        if irq:
+            self.start_irq()
+
+    def configure(self, baudrate=None, fix_interval=None, rmc_gga_only=False):
+        """Sentence mask, baud rate and fix interval, in this order.
+        Must run before start_irq(), a baud rate change replaces the UART.
+        Every step blocks until the receiver answers: up to ACK_TIMEOUT_MS
+        per command and 100 ms + SENTENCE_TIMEOUT_MS for the baud rate. A
+        step nothing at all answered means no receiver is listening, the
+        remaining steps are skipped so a silent receiver delays the boot by
+        a single timeout, at most 1.3 s.
+        """
+        if rmc_gga_only:
+            if not self.send_command(SET_NMEA_OUTPUT_RMC_GGA):
+                print("GPS: sentence mask not acknowledged.")
+                if not self.rx_heard:
+                    return
+
+        if baudrate is not None and baudrate != self.baudrate:
+            if not self.set_baudrate(baudrate):
+                print("GPS: cannot switch to %d baud." % baudrate)
+                if not self.rx_heard:
+                    return
+
+        if fix_interval is not None:
+            if self.baudrate <= BAUDRATE:
+                fix_interval = max(fix_interval, FIX_INTERVAL_MIN_9600)
+            if not self.send_command(SET_POS_FIX % fix_interval):
+                print("GPS: fix interval not acknowledged.")
+
+    def send_command(self, command, ack=True):
+        self.gnss_l76b.l76x_send_command(command)
+        if not ack:
+            return True
+        # PMTK001,<command>,<flag>: flag 3 means success
+        return self.wait_line("$PMTK001," + command[5:8] + ",3", ACK_TIMEOUT_MS)
+
+    def set_baudrate(self, baudrate):
+        old_baudrate = self.baudrate
+        self.send_command(SET_NMEA_BAUDRATE % baudrate, ack=False)
+        sleep_ms(100)  # Let the command go out before switching
+        self.gnss_l76b.l76x_set_baudrate(baudrate)
+
+        # The receiver does not ack at the new rate, wait for any sentence
+        if self.wait_line("$G", SENTENCE_TIMEOUT_MS):
+            self.baudrate = baudrate
+            return True
+
+        self.gnss_l76b.l76x_set_baudrate(old_baudrate)
+        return False
+
+    def wait_line(self, prefix, timeout_ms):
+        # Blocking line reader, only used while configuring the receiver.
+        # rx_heard tells whether anything arrived, even garbled
+        line = ""
+        self.rx_heard = False
+        start = ticks_ms()
+        while ticks_diff(ticks_ms(), start) < timeout_ms:
+            if not self.gnss_l76b.uart_any():
+                sleep_ms(5)
+                continue
+            self.rx_heard = True
+            char = chr(self.gnss_l76b.uart_receive_byte()[0])
+            if char == "\n":
+                if line.startswith(prefix):
+                    return True
+                line = ""
+            elif len(line) < SENTENCE_MAX_LEN:
+                line += char
+        return False
+
+    def start_irq(self):
+        # Receive and parse in the background, independently of the frame rate
+        uart = self.gnss_l76b.ser
+        if hasattr(UART, "IRQ_RXIDLE"):
+            uart.irq(handler=self.receive, trigger=UART.IRQ_RXIDLE)
+        else:
+            self.rx_timer = Timer()
+            self.rx_timer.init(
+                freq=RX_POLL_FREQ,
+                mode=Timer.PERIODIC,
+                callback=self.receive,
+            )
+        self.irq_active = True
+
+    def stop_irq(self):
+        if self.rx_timer is not None:
+            self.rx_timer.deinit()
+            self.rx_timer = None
+        else:
+            self.gnss_l76b.ser.irq(handler=None)
+        self.irq_active = False
+
+    def receive(self, _):
+        self.drain()
+
+    def latest_fix(self):
+        """Most recent fix snapshot (see FIX_* indices), never blocks.
+        One snapshot is published per epoch with a valid fix, FIX_TICKS only
+        changes when a new one is. Sentences completing the epoch, e.g. GGA
+        after RMC, publish an updated copy with the same FIX_TICKS. The list
+        is reused two updates later, copy it if it must be kept.
+        """
+        return self.fixes[self.front]
+
+    def publish_fix(self):
+        fix = self.fixes[1 - self.front]
+        latitude = self.latitude[0]
+        longitude = self.longitude[0]
+        fix[FIX_LATITUDE] = -latitude if self.latitude[1] == "S" else latitude
+        fix[FIX_LONGITUDE] = -longitude if self.longitude[1] == "W" else longitude
+        fix[FIX_SPEED] = self.speed
+        fix[FIX_COURSE] = self.parser.course
+        fix[FIX_ALTITUDE] = self.altitude
+        fix[FIX_HDOP] = self.hdop
+        fix[FIX_SATELLITES] = self.satellites_in_use
+        fix[FIX_TIME] = (
+            self.timestamp[0] * 3600 + self.timestamp[1] * 60 + self.timestamp[2]
+        )
+        fix[FIX_STATUS] = self.parser.fix_stat
+        fix[FIX_TICKS] = ticks_ms()
+        self.fix_time = fix[FIX_TIME]
+        self.front = 1 - self.front
+
+    def refresh_fix(self):
+        # Later sentences of a published epoch, e.g. GGA after RMC, only
+        # complete the fields RMC does not carry. Written to a copy in the
+        # back buffer too, a reader never sees half of the update
+        front = self.fixes[self.front]
+        fix = self.fixes[1 - self.front]
+        for i in range(FIX_LEN):
+            fix[i] = front[i]
+        fix[FIX_ALTITUDE] = self.altitude
+        fix[FIX_HDOP] = self.hdop
+        fix[FIX_SATELLITES] = self.satellites_in_use
+        fix[FIX_STATUS] = self.parser.fix_stat
+        self.front = 1 - self.front
+
     def reset(self):
         self.RPM_ESTIMATE = 0
         self.duty = 50
         self.n_repeats = 1
         self.timeout = False
 
-    def update_gps(self, verbose="v"):
+    def update_gps(self, verbose="v", bulk=False):
+        if bulk or self.irq_active:
+            self.update_gps_bulk(verbose=verbose)
+            return
+
         # parser.update(chr(gnss_l76b.uart_receive_byte()[0]))
         # my_sentence = "$GPRMC,081836,A,3751.65,S,14507.36,E,000.0,360.0,130998,011.3,E*62"
         # for x in my_sentence:
@@ -53,18 +542,16 @@ class GPS:
         # sleep(0.1)
 
         if self.gnss_l76b.uart_any():
-            sentence = self.parser.update(chr(self.gnss_l76b.uart_receive_byte()[0]))
+            if self.lean:
+                self.parser.feed(self.gnss_l76b.uart_receive_byte(), 0, 1)
+                sentence = self.parser.updated
+            else:
+                sentence = self.parser.update(
+                    chr(self.gnss_l76b.uart_receive_byte()[0])
+                )
 
             if sentence:
-
-                self.altitude = self.parser.altitude
-                self.geoid_height = self.parser.geoid_height
-                self.hdop = self.parser.hdop
-                self.latitude = self.parser.latitude
-                self.longitude = self.parser.longitude
-                self.satellites_in_use = self.parser.satellites_in_use
-                self.speed = self.parser.speed[2]
-                self.timestamp = self.parser.timestamp
+                self.store_fix()
 
                 if verbose == "v":
                     self.print_gps_data()
@@ -75,6 +562,72 @@ class GPS:
         if verbose == "vvv":
             self.print_gps_data()
 
+    def update_gps_bulk(self, verbose="v", budget_us=TIME_BUDGET_US):
+        # With the receive IRQ running the fields are already up to date
+        result = 0 if self.irq_active else self.drain(budget_us)
+
+        if (result & RX_FIX and verbose == "v") or (result and verbose == "vv"):
+            self.print_gps_data()
+        elif verbose == "vvv":
+            self.print_gps_data()
+
+    def drain(self, budget_us=TIME_BUDGET_US):
+        # Drain the UART into the receive buffer and parse as many complete
+        # sentences as the time budget allows, leftovers are kept for next call
+        start = ticks_us()
+        buf = self.rx_buf
+        parser = self.parser
+        result = 0
+
+        while ticks_diff(ticks_us(), start) < budget_us:
+            if self.rx_pos >= self.rx_len:
+                if not self.gnss_l76b.uart_any():
+                    break
+                self.rx_len = self.gnss_l76b.ser.readinto(buf) or 0
+                self.rx_pos = 0
+                result |= RX_DATA
+                continue
+
+            pos = self.rx_pos
+            end = self.rx_len
+            if self.lean:
+                pos = parser.feed(buf, pos, end)
+                if parser.updated:
+                    self.store_fix()
+                    result |= RX_FIX
+            else:
+                while pos < end:
+                    sentence = parser.update(chr(buf[pos]))
+                    pos += 1
+                    if sentence:
+                        self.store_fix()
+                        result |= RX_FIX
+                        break
+            self.rx_pos = pos
+
+        return result
+
+    def store_fix(self):
+        self.altitude = self.parser.altitude
+        self.geoid_height = self.parser.geoid_height
+        self.hdop = self.parser.hdop
+        self.satellites_in_use = self.parser.satellites_in_use
+        self.speed = self.parser.speed[2]
+        if not self.lean:
+            self.latitude = self.parser.latitude
+            self.longitude = self.parser.longitude
+            self.timestamp = self.parser.timestamp
+
+        # RMC and GGA of an epoch share the UTC time, VTG carries none
+        # A fix is valid once RMC reports "A" and GGA a non-zero fix status
+        if not (self.parser.valid and self.parser.fix_stat):
+            return
+        epoch = self.timestamp[0] * 3600 + self.timestamp[1] * 60 + self.timestamp[2]
+        if epoch != self.fix_time:
+            self.publish_fix()
+        else:
+            self.refresh_fix()
+
     def print_gps_data(self):
         print(
             "WGS84 Coordinate: Latitude(%c), Longitude(%c) %.9f,%.9f"
@@ -109,6 +662,141 @@ class GPS:
         pass
 
 
+class DeadReckoning:
+    """Extrapolates speed and position between GPS fixes from the forward
+    acceleration and the heading reported by picomotodash_mpu9250.MPU.
+    Every new epoch with a valid fix re-anchors the prediction and updates
+    the error metrics, timestamps can be passed explicitly to replay recorded
+    logs.
+    """
+
+    def __init__(self, forward_axis=0, forward_sign=1, horizon_ms=DR_HORIZON_MS):
+
+        self.forward_axis = forward_axis
+        self.forward_sign = forward_sign
+        self.horizon_ms = horizon_ms
+
+        self.latitude = 0.0  # Decimal degrees, negative south
+        self.longitude = 0.0  # Decimal degrees, negative west
+        self.speed = 0.0  # km/h
+
+        self.fix_ticks = 0
+        self.fix_time = -1  # FIX_TIME of the anchoring fix
+        self.fix_speed = 0.0  # FIX_SPEED of the anchoring fix
+        self.last_ticks = 0
+
+        # Forward acceleration [g] GPS does not see, averaged over the fixes
+        self.accel_bias = 0.0
+        self.accel_sum = 0.0  # g*s integrated since the anchoring fix
+        self.sample_ticks = 0
+        self.bias_sum = 0.0  # Averaged excess of accel_sum over the GPS speed
+        self.bias_time = 0.0  # Averaged time between fixes, s
+
+        # Prediction error measured at each new fix
+        self.speed_error = 0.0  # km/h
+        self.position_error = 0.0  # m
+        self.speed_sq_sum = 0.0
+        self.position_sq_sum = 0.0
+        self.n_errors = 0
+
+    def update(self, fix, accel, heading, now=None, pitch=0.0):
+        """fix: GPS.latest_fix() snapshot, accel: MPU acceleration in g,
+        heading: degrees from North, pitch: MPU pitch in degrees to remove
+        gravity from the forward axis, now: ticks_ms() when replaying logs.
+        """
+        if now is None:
+            now = ticks_ms()
+
+        # Nose up pitch reads as -sin(pitch) g on the forward axis
+        forward = accel[self.forward_axis] * self.forward_sign
+        forward += sin(radians(pitch))
+        if self.fix_ticks != 0:
+            self.accel_sum += forward * ticks_diff(now, self.sample_ticks) / 1000
+        self.sample_ticks = now
+
+        # Only a valid fix of a new epoch re-anchors, errors are measured
+        # between distinct epochs
+        fix_ticks = fix[FIX_TICKS]
+        if (
+            fix_ticks != self.fix_ticks
+            and fix[FIX_STATUS] != 0
+            and fix[FIX_TIME] != self.fix_time
+        ):
+            if self.fix_ticks != 0:
+                self.advance(forward, heading, fix_ticks)
+                self.measure_error(fix)
+            self.estimate_bias(fix, forward, now)
+            self.fix_ticks = fix_ticks
+            self.fix_time = fix[FIX_TIME]
+            self.fix_speed = fix[FIX_SPEED]
+            self.last_ticks = fix_ticks
+            self.latitude = fix[FIX_LATITUDE]
+            self.longitude = fix[FIX_LONGITUDE]
+            self.speed = fix[FIX_SPEED]
+
+        if self.fix_ticks == 0:  # No fix yet
+            return
+
+        if ticks_diff(now, self.fix_ticks) <= self.horizon_ms:
+            self.advance(forward, heading, now)
+
+    def estimate_bias(self, fix, forward, now):
+        # Between two fixes the accelerometer should integrate to the speed
+        # change GPS measured, the excess is sensor bias and gravity the
+        # pitch did not remove. A real acceleration does not bias it.
+        tail = forward * ticks_diff(now, fix[FIX_TICKS]) / 1000  # After the fix
+        gap_ms = ticks_diff(fix[FIX_TICKS], self.fix_ticks)
+        if self.fix_ticks != 0 and gap_ms <= self.horizon_ms:
+            speed_change = (fix[FIX_SPEED] - self.fix_speed) / 3.6 / STANDARD_GRAVITY
+            excess = self.accel_sum - tail - speed_change
+            self.bias_sum += DR_ACCEL_BIAS_ALPHA * (excess - self.bias_sum)
+            self.bias_time += DR_ACCEL_BIAS_ALPHA * (gap_ms / 1000 - self.bias_time)
+            self.accel_bias = self.bias_sum / self.bias_time
+        self.accel_sum = tail
+
+    def advance(self, forward, heading, now):
+        dt = ticks_diff(now, self.last_ticks) / 1000
+        if dt <= 0:
+            return
+        self.last_ticks = now
+
+        speed = self.speed / 3.6  # m/s
+        new_speed = speed + (forward - self.accel_bias) * STANDARD_GRAVITY * dt
+        if new_speed < 0:
+            new_speed = 0
+        distance = (speed + new_speed) / 2 * dt
+        self.speed = new_speed * 3.6
+
+        heading = radians(heading)
+        latitude = radians(self.latitude)
+        self.latitude += degrees(distance * cos(heading) / EARTH_RADIUS)
+        self.longitude += degrees(
+            distance * sin(heading) / (EARTH_RADIUS * cos(latitude))
+        )
+
+    def measure_error(self, fix):
+        latitude = radians(self.latitude)
+        north = radians(fix[FIX_LATITUDE] - self.latitude) * EARTH_RADIUS
+        east = (
+            radians(fix[FIX_LONGITUDE] - self.longitude) * EARTH_RADIUS * cos(latitude)
+        )
+        self.position_error = sqrt(north * north + east * east)
+        self.speed_error = self.speed - fix[FIX_SPEED]
+
+        self.position_sq_sum += self.position_error * self.position_error
+        self.speed_sq_sum += self.speed_error * self.speed_error
+        self.n_errors += 1
+
+    def rms_errors(self):
+        # RMS position [m] and speed [km/h] errors since startup
+        if self.n_errors == 0:
+            return 0.0, 0.0
+        return (
+            sqrt(self.position_sq_sum / self.n_errors),
+            sqrt(self.speed_sq_sum / self.n_errors),
+        )
+
+
 if __name__ == "__main__":
     gps = GPS(local_offset=9, location_formatting="dd")
 
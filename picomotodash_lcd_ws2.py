@@ -10,13 +10,14 @@ __maintainer__ = "Salvatore La Bua"
 __email__ = "slabua@gmail.com"
 __status__ = "Development"
 
-import _thread
 import gc
 import math
 
 from machine import ADC, Pin, PWM, Timer  # enable_irq,; disable_irq,
 import picomotodash_env as pmdenv
 from picomotodash_ds18x20 import DS18X20 as pmdDS18X20
+from picomotodash_ds18x20 import TemperatureHistory as pmdTemperatureHistory
+from picomotodash_rpm import RPM as pmdRPM
 from picomotodash_utils import map_range, read_adc, read_builtin_temp
 import qrcode
 
@@ -28,9 +29,7 @@ from picographics import (
 )
 from utime import (
     sleep,
-    sleep_us,
     ticks_ms,
-    ticks_us,
     time,
 )
 
@@ -106,11 +105,9 @@ SCREENS = [
     QR_URL,
 ] = pmdenv.read_config(CONFIG_FILE)
 
-temp_id = 0
+temp_id = 0  # 0 is the built-in sensor, then the 1-Wire ones in scan order
 onewire_sensors = 0
-
-# TODO make this variable dynamic according to the number of sensors connected
-temperature_matrix = [[], [], []]  # type: list[list[float]]
+TEMP_BUILTIN_KEY = "builtin"
 
 in_use = False
 temp_x_pos = TEMP_X
@@ -127,39 +124,17 @@ timer = Timer()
 start_time = time()
 
 
-# Thread
+# RPM
 RPM_ESTIMATE = 0
 
 
-def thread1(PWM2RPM_FACTOR):
+# Utility functions
+def read_rpm():
     global RPM_ESTIMATE
-    n_repeats = 1
-
-    while True:
-        if pwm22.value() == 1:
-            cycle_start = ticks_us()
-            for _ in range(n_repeats):
-                while pwm22.value() == 1:
-                    # pass
-                    sleep_us(100)
-                while pwm22.value() == 0:
-                    # pass
-                    sleep_us(100)
-            cycle_stop = ticks_us()
-            cycle_duration = cycle_stop - cycle_start
-            cycle = 1000000 / (cycle_duration / n_repeats)
-            repeat_factor = ((50 - 20) / (1500 - 150)) * cycle + (  # y = mx + q
-                50 - ((50 - 20) / (1500 - 150) * 1500)
-            )
-            n_repeats = (
-                int((cycle) / repeat_factor) if int((cycle) / repeat_factor) != 0 else 1
-            )
-            RPM_ESTIMATE = cycle * PWM2RPM_FACTOR
 
-            # print("RPM: {:.2f}".format(RPM_ESTIMATE), n_repeats, repeat_factor)
+    RPM_ESTIMATE = rpm.RPM_ESTIMATE
 
 
-# Utility functions
 def set_in_use(_):
     global in_use
 
@@ -234,7 +209,7 @@ pwm0 = PWM(Pin(0))
 pwm0.freq(275)
 pwm0.duty_u16(32768)
 ###
-pwm22 = Pin(22, Pin.IN, Pin.PULL_DOWN)  # RPM pwm
+rpm = pmdRPM(pin=22, factor=PWM2RPM_FACTOR, hard=True)  # RPM pwm
 
 
 # Pico Display boilerplate
@@ -246,6 +221,9 @@ display = PicoGraphics(
 )
 
 width, height = display.get_bounds()
+
+# One bar per reading across the temperature screen
+temperature_history = pmdTemperatureHistory(width // TEMP_BAR_OFFSET)
 w_factor = width / 240
 h_factor = height / 135
 # led = RGBLED(6, 7, 8)
@@ -519,7 +497,6 @@ def int_y(pin):
     global SPLIT_BARS
     global LARGE_BATTERY
     global start_time
-    global temperature_matrix
     global last_press_time
 
     # button_y.irq(handler=None)
@@ -539,7 +516,7 @@ def int_y(pin):
             LARGE_BATTERY = not LARGE_BATTERY
 
         elif current_screen == 3:
-            temperature_matrix[temp_id] = []
+            temperature_history.clear(temp_key())
 
         elif current_screen == 5:
             start_time = time()
@@ -619,6 +596,7 @@ def draw_home_battery():
 
 
 def draw_home_temperature():
+    global temp_id
     global temp_x_pos
     global temp_x_shift
 
@@ -626,6 +604,9 @@ def draw_home_temperature():
         temp_x_shift = 0
 
     if temp_x_shift == 0:
+        if temp_id > len(ds_sensor.roms):  # Sensor unplugged
+            temp_id = 0
+
         if temp_id == 0:
             temperature = read_builtin_temp(temp_builtin)
         else:
@@ -891,28 +872,38 @@ def screen_fuel():
     display.update()
 
 
+def temp_key():
+    # History key of the selected sensor, see temp_id
+    if temp_id == 0 or temp_id > len(ds_sensor.keys):
+        return TEMP_BUILTIN_KEY
+    return ds_sensor.keys[temp_id - 1]
+
+
 def screen_temperature():
-    global temperature_matrix
+    global temp_id
 
     display_clear()
 
     temperatures = ds_sensor.update_temps()
+    builtin = read_builtin_temp(temp_builtin)
+
+    temperature_history.add(TEMP_BUILTIN_KEY, builtin)
+    temperature_history.add_all(ds_sensor.keys, temperatures)
 
-    for ti in range(len(temperatures)):
-        if len(temperature_matrix[ti]) >= (width / TEMP_BAR_OFFSET):
-            temperature_matrix[ti].pop(0)
-        temperature_matrix[ti].append(temperatures[ti])
+    if temp_id > len(temperatures):  # Sensor unplugged
+        temp_id = 0
+    temperature = builtin if temp_id == 0 else temperatures[temp_id - 1]
 
-    if isinstance(temperatures[temp_id], float):
-        print("T" + str(temp_id) + ": " + str(temperatures[temp_id]))
+    if temperature == temperature:  # Not NO_READING
+        print("T" + str(temp_id) + ": " + str(temperature))
     else:
         print("Temperature acquisition failed, retrying...")
 
-    set_temperature_pen(temperatures[temp_id])
+    set_temperature_pen(temperature)
     display.rectangle(0, 0, width, round(135 / 3))
 
     curr_x = 0
-    for t in temperature_matrix[temp_id]:
+    for t in temperature_history.get(temp_key()):
         set_temperature_pen(t)
         display.rectangle(
             curr_x,
@@ -924,7 +915,7 @@ def screen_temperature():
 
     display.set_pen(blackPen)
     display.text(
-        "T" + str(temp_id) + ":  " + "{:.1f}".format(temperatures[temp_id]) + " c",
+        "T" + str(temp_id) + ":  " + "{:.1f}".format(temperature) + " c",
         8,
         6,
         width,
@@ -1095,7 +1086,7 @@ gc.collect()
 # Main
 spinner = "-\|/"
 
-_thread.start_new_thread(thread1, [PWM2RPM_FACTOR])
+rpm.start()
 
 
 while True:
@@ -1119,6 +1110,8 @@ while True:
         print(spinner[t], end="\r")
         t = (t + 1) % len(spinner)
 
+    read_rpm()
+
     screen_functions[current_screen]()
 
     sleep(UPDATE_INTERVAL)
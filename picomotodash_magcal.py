@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Pico Motorcycle Dashboard Magnetometer Calibration
+"""
+
+__author__ = "Salvatore La Bua"
+
+
+from array import array
+from math import sqrt
+from utime import sleep_ms
+
+# Samples are scaled to roughly unit magnitude before accumulation,
+# the Earth field is 25-65 uT
+SAMPLE_SCALE = 50  # uT
+MIN_SAMPLES = 50
+
+# Quadric parameters, a x^2 + b y^2 + c z^2 + 2d xy + 2e xz + 2f yz
+# + 2g x + 2h y + 2i z = 1
+N_PARAMS = 9
+N_NORMAL = N_PARAMS * (N_PARAMS + 1) // 2  # Upper triangle of the normal matrix
+
+JACOBI_SWEEPS = 10
+
+
+class EllipsoidFit:
+    """Least-squares ellipsoid fit of streamed magnetometer samples.
+
+    Only the normal equations are accumulated, so memory does not depend on
+    the number of samples. solve() returns the hard iron offset and the soft
+    iron matrix mapping the fitted ellipsoid onto a sphere of the same volume.
+    """
+
+    def __init__(self):
+        self.normal = array("f", [0] * N_NORMAL)
+        self.rhs = array("f", [0] * N_PARAMS)
+        self.row = array("f", [0] * N_PARAMS)
+        self.count = 0
+
+    def reset(self):
+        for i in range(N_NORMAL):
+            self.normal[i] = 0
+        for i in range(N_PARAMS):
+            self.rhs[i] = 0
+        self.count = 0
+
+    def add(self, x, y, z):
+        x /= SAMPLE_SCALE
+        y /= SAMPLE_SCALE
+        z /= SAMPLE_SCALE
+
+        row = self.row
+        row[0] = x * x
+        row[1] = y * y
+        row[2] = z * z
+        row[3] = 2 * x * y
+        row[4] = 2 * x * z
+        row[5] = 2 * y * z
+        row[6] = 2 * x
+        row[7] = 2 * y
+        row[8] = 2 * z
+
+        normal = self.normal
+        rhs = self.rhs
+        k = 0
+        for i in range(N_PARAMS):
+            ri = row[i]
+            rhs[i] += ri
+            for j in range(i, N_PARAMS):
+                normal[k] += ri * row[j]
+                k += 1
+
+        self.count += 1
+
+    def solve(self):
+        if self.count < MIN_SAMPLES:
+            print("Not enough samples for the ellipsoid fit:", self.count)
+            return None
+
+        p = self.solve_normal()
+        if p is None:
+            return None
+
+        a, b, c, d, e, f, g, h, i = p
+        A = [[a, d, e], [d, b, f], [e, f, c]]
+
+        # Centre, A c = -(g, h, i)
+        A_inv = _inverse3(A)
+        if A_inv is None:
+            return None
+        centre = [
+            -(A_inv[r][0] * g + A_inv[r][1] * h + A_inv[r][2] * i) for r in range(3)
+        ]
+
+        # (x - c)' A (x - c) = k, k < 0 only means the origin lies outside
+        # the ellipsoid (offset larger than the field) and flips the sign of A
+        k = 1 - (g * centre[0] + h * centre[1] + i * centre[2])
+        if k == 0:
+            return None
+
+        values, vectors = _eigen3([[A[r][s] / k for s in range(3)] for r in range(3)])
+        for value in values:
+            if value <= 0:  # A / k not positive definite, not an ellipsoid
+                return None
+
+        # Radius of the sphere with the same volume as the ellipsoid
+        radius = (values[0] * values[1] * values[2]) ** (-1 / 6)
+        roots = [radius * sqrt(value) for value in values]
+
+        matrix = []
+        for r in range(3):
+            for s in range(3):
+                matrix.append(
+                    vectors[r][0] * roots[0] * vectors[s][0]
+                    + vectors[r][1] * roots[1] * vectors[s][1]
+                    + vectors[r][2] * roots[2] * vectors[s][2]
+                )
+
+        offset = [value * SAMPLE_SCALE for value in centre]
+
+        return offset, matrix
+
+    def solve_normal(self):
+        # Gaussian elimination with partial pivoting on the full system
+        n = N_PARAMS
+        m = [[0] * (n + 1) for _ in range(n)]
+        k = 0
+        for i in range(n):
+            for j in range(i, n):
+                m[i][j] = m[j][i] = self.normal[k]
+                k += 1
+            m[i][n] = self.rhs[i]
+
+        for col in range(n):
+            pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+            if abs(m[pivot][col]) < 1e-9:
+                print("Ellipsoid fit is singular, rotate the sensor on all axes.")
+                return None
+            m[col], m[pivot] = m[pivot], m[col]
+
+            for r in range(col + 1, n):
+                factor = m[r][col] / m[col][col]
+                for s in range(col, n + 1):
+                    m[r][s] -= factor * m[col][s]
+
+        p = [0] * n
+        for r in range(n - 1, -1, -1):
+            acc = m[r][n]
+            for s in range(r + 1, n):
+                acc -= m[r][s] * p[s]
+            p[r] = acc / m[r][r]
+
+        return p
+
+
+def _inverse3(A):
+    (a, b, c), (d, e, f), (g, h, i) = A
+    det = a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+    if det == 0:
+        return None
+
+    return [
+        [(e * i - f * h) / det, (c * h - b * i) / det, (b * f - c * e) / det],
+        [(f * g - d * i) / det, (a * i - c * g) / det, (c * d - a * f) / det],
+        [(d * h - e * g) / det, (b * g - a * h) / det, (a * e - b * d) / det],
+    ]
+
+
+def _eigen3(S):
+    # Jacobi rotations of a symmetric 3x3 matrix, columns of V are eigenvectors
+    S = [row[:] for row in S]
+    V = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
+    for _ in range(JACOBI_SWEEPS):
+        for p, q in ((0, 1), (0, 2), (1, 2)):
+            if abs(S[p][q]) < 1e-12:
+                continue
+
+            theta = (S[q][q] - S[p][p]) / (2 * S[p][q])
+            t = (1 if theta >= 0 else -1) / (abs(theta) + sqrt(theta * theta + 1))
+            c = 1 / sqrt(t * t + 1)
+            s = t * c
+
+            for k in range(3):
+                skp = S[k][p]
+                skq = S[k][q]
+                S[k][p] = c * skp - s * skq
+                S[k][q] = s * skp + c * skq
+            for k in range(3):
+                spk = S[p][k]
+                sqk = S[q][k]
+                S[p][k] = c * spk - s * sqk
+                S[q][k] = s * spk + c * sqk
+            for k in range(3):
+                vkp = V[k][p]
+                vkq = V[k][q]
+                V[k][p] = c * vkp - s * vkq
+                V[k][q] = s * vkp + c * vkq
+
+    return [S[0][0], S[1][1], S[2][2]], V
+
+
+def calibrate(ak8963, count=256, delay=200):
+    """Ellipsoid fit calibration of an AK8963, the sensor should be rotated
+    through as many orientations as possible while sampling.
+    """
+    ak8963.offset = (0, 0, 0)
+    ak8963.scale = (1, 1, 1)
+    ak8963.matrix = None
+
+    fit = EllipsoidFit()
+    while count:
+        x, y, z = ak8963.magnetic
+        fit.add(x, y, z)
+        sleep_ms(delay)
+        count -= 1
+
+    result = fit.solve()
+    if result is None:
+        return None
+
+    ak8963.offset, ak8963.matrix = result
+
+    return result
+
+
+if __name__ == "__main__":
+    from machine import I2C, Pin
+    from mpu9250 import MPU9250
+
+    i2c = I2C(1, sda=Pin(6), scl=Pin(7), freq=400000)
+    mpu = MPU9250(i2c)
+
+    print("Rotate the sensor on all axes...")
+    result = calibrate(mpu.ak8963, count=500, delay=20)
+    if result is None:
+        print("Calibration failed.")
+    else:
+        offset, matrix = result
+        print("Offset:", offset)
+        print("Soft iron matrix:", matrix)
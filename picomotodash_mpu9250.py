@@ -1,416 +1,984 @@
-# -*- coding: utf-8 -*-
-"""Pico Motorcycle Dashboard MPU
-"""
-
-__author__ = "Salvatore La Bua"
-
-
-from fusion import Fusion
-from machine import I2C, Pin
-from math import atan2, copysign, cos, sin, sqrt
-from mpu6500 import MPU6500
-from mpu9250 import MPU9250
-from orientate import orientate
-from ujson import dump, load
-from utime import sleep, ticks_diff, ticks_us
-
-
-# MPU = 0x68
-id = 1
-sda = Pin(6)
-scl = Pin(7)
-
-RAD2DEG = 180 / 3.1415
-DEG2RAD = 3.1415 / 180
-
-fuse = Fusion()
-
-
-class MPU:
-
-    def __init__(
-        self,
-        id=id,
-        scl=scl,
-        sda=sda,
-        freq=400000,
-        calib_ag=True,
-        calib_m=True,
-        tiltcomp=True,
-        truenorth=True,
-        parent=None,
-    ):
-
-        print("Initialising MPU9250...")
-
-        i2c = I2C(id=id, scl=scl, sda=sda, freq=freq)
-        # print(i2c.scan())
-
-        mpu6500 = MPU6500(i2c=i2c, accel_sf=1, gyro_sf=1)
-        self.mpu = MPU9250(i2c=i2c, mpu6500=mpu6500)
-
-        if calib_m:
-            print("Calibrating Magnetometer...")
-            self.mpu.ak8963.calibrate(count=100)
-            print("Calibration Completed.")
-
-        self.imu = []
-        self.accel = ()
-        self.gyro = ()
-        self.mag = ()
-
-        self.dt = 0
-        self.comp_pc = 0.99
-        self.lowpass_pc = 0.8
-
-        self.aXerr = 0
-        self.aYerr = 0
-        self.aZerr = 0
-        self.gXerr = 0
-        self.gYerr = 0
-        self.gZerr = 0
-
-        self.gyro_roll = None
-        self.gyro_pitch = None
-        self.gyro_yaw = 0
-
-        self.roll_bias = 0.0
-        self.pitch_bias = 0.0
-        self.roll = 0.0
-        self.pitch = 0.0
-        self.comp_roll = None
-        self.comp_pitch = None
-        self.lowpass_roll = None
-        self.lowpass_pitch = None
-        self.lowpass_mx = 0.0
-        self.lowpass_my = 0.0
-        self.tiltcomp = tiltcomp
-        self.truenorth = truenorth
-        self.heading = 0
-
-        # https://www.magnetic-declination.com/Japan/Kyoto/1340633.html
-        self.declination = -8.12  # Kyoto
-
-        if calib_ag:
-            self.calib_ag()
-
-        self.start = ticks_us()
-
-        self.update_mpu()
-        self.roll_bias = self.roll
-        self.pitch_bias = self.pitch
-
-        print("MPU9250 Initialised.")
-
-    def calib_ag(self, period=0.02, n_samples=1000):
-        print("Running Accel/Gyro Calibration...")
-
-        try:
-            with open("calib.json", "r") as calib_file:
-                self.read_calib(calib_file)
-
-        except OSError:
-            print("Calibration file not found.")
-            print("Starting Calibration...")
-
-            for _ in range(n_samples):
-                ax, ay, az = self.mpu.acceleration
-                gx, gy, gz = self.mpu.gyro
-
-                self.aXerr += ax
-                self.aYerr += ay
-                self.aZerr += az
-                self.gXerr += gx
-                self.gYerr += gy
-                self.gZerr += gz
-
-                sleep(period)
-
-            self.aXerr /= n_samples
-            self.aYerr /= n_samples
-            self.aZerr /= n_samples
-            self.gXerr /= n_samples
-            self.gYerr /= n_samples
-            self.gZerr /= n_samples
-
-            self.aZerr += 1  # 9.80665
-
-            print("Calibration errors:")
-            print(
-                self.aXerr,
-                "\t",
-                self.aYerr,
-                "\t",
-                self.aZerr,
-                "\t",
-                self.gXerr,
-                "\t",
-                self.gYerr,
-                "\t",
-                self.gZerr,
-            )
-
-            self.write_calib()
-
-        print("Calibration Complete.")
-
-    def read_calib(self, calib_file):
-        print("Reading calibration file...")
-
-        calib = load(calib_file)
-
-        print("Calibration file found.")
-        print("Reading calibration data...")
-
-        self.aXerr = calib["aXerr"]
-        self.aYerr = calib["aYerr"]
-        self.aZerr = calib["aZerr"]
-        self.gXerr = calib["gXerr"]
-        self.gYerr = calib["gYerr"]
-        self.gZerr = calib["gZerr"]
-
-    def write_calib(self):
-        print("Writing calibration...")
-        calib = {
-            "aXerr": self.aXerr,
-            "aYerr": self.aYerr,
-            "aZerr": self.aZerr,
-            "gXerr": self.gXerr,
-            "gYerr": self.gYerr,
-            "gZerr": self.gZerr,
-        }
-        with open("calib.json", "w") as calib_file:
-            dump(calib, calib_file)
-        print("Calibration file written.")
-
-    def lowpass(self, alpha, new_value, old_value):
-        return (alpha * new_value) + (1.0 - alpha) * old_value
-
-    def update_mpu(self, madgwick=False):
-        a = self.mpu.acceleration
-        g = self.mpu.gyro
-        m = self.mpu.magnetic
-
-        self.imu = [
-            a[0] - self.aXerr,
-            a[1] - self.aYerr,
-            a[2] - self.aZerr,
-            g[0] - self.gXerr,
-            g[1] - self.gYerr,
-            g[2] - self.gZerr,
-            m[0],
-            m[1],
-            m[2],
-        ]
-
-        self.accel = (self.imu[0], self.imu[1], self.imu[2])
-        self.gyro = (self.imu[3], self.imu[4], self.imu[5])
-        self.mag = (self.imu[6], self.imu[7], self.imu[8])
-
-        if madgwick:
-            self.roll, self.pitch, self.heading = self.madgwick()
-        else:
-            self.roll, self.pitch = self.get_roll_pitch_my(alpha=self.comp_pc)
-            self.heading = self.get_heading(
-                alpha=self.lowpass_pc, tiltcomp=self.tiltcomp, truenorth=self.truenorth
-            )
-
-    def get_roll_pitch(self) -> float:
-        """Returns the readings from the sensor"""
-
-        ax = self.imu[0]
-        ay = self.imu[1]
-        az = self.imu[2]
-
-        roll = atan2(-ax, sqrt((ay * ay) + (az * az))) * RAD2DEG
-        pitch = (
-            atan2(az, copysign(ay, ay) * sqrt((0.01 * ax * ax) + (ay * ay))) * RAD2DEG
-        )
-
-        roll -= self.roll_bias
-        pitch -= self.pitch_bias
-
-        return roll, pitch
-
-    def get_roll_pitch_my(self, alpha=1.0):
-        now = ticks_us()
-        self.dt = ticks_diff(now, self.start) / 1000000
-        self.start = now
-
-        # Read sensor data
-        # TODO Fix sign for both roll and pitch
-        ax = self.imu[0]
-        ay = self.imu[1]
-        az = self.imu[2]
-
-        gx = self.imu[3]
-        gy = self.imu[4]
-        gz = self.imu[5]
-
-        # Calculate gyro rate [deg/sec]
-        gyroXRate = gx  # / 0.017453292519943
-        gyroYRate = gy  # / 0.017453292519943
-        gyroZRate = gz  # / 0.017453292519943
-
-        # Calculate gyro angle [deg]
-        gyroXAngle = gyroXRate * self.dt
-        gyroYAngle = gyroYRate * self.dt
-        gyroZAngle = gyroZRate * self.dt * DEG2RAD
-
-        # Calculate roll and pitch
-        roll = atan2(ay, sqrt((ax * ax) + (az * az)))
-        pitch = atan2(-ax, sqrt((ay * ay) + (az * az)))
-
-        roll -= pitch * sin(gyroZAngle) * RAD2DEG
-        pitch += roll * sin(gyroZAngle) * RAD2DEG
-
-        # Calculate composite angle
-        if self.comp_roll is None:
-            self.comp_roll = roll
-        else:
-            self.comp_roll = alpha * (self.comp_roll + gyroXAngle) + (1 - alpha) * roll
-
-        if self.comp_pitch is None:
-            self.comp_pitch = pitch
-        else:
-            self.comp_pitch = (
-                alpha * (self.comp_pitch + gyroYAngle) + (1 - alpha) * pitch
-            )
-
-            # print("roll", roll, "pitch", pitch)
-            # #print("roll", roll, "pitch", pitch, "c_roll", self.comp_roll, "c_pitch", self.comp_pitch)
-            # print("dt", dt, "roll", roll, "g_roll", gyro_roll, "c_roll", comp_roll)
-            # print("pitch", pitch, "c_pitch", comp_pitch)
-            # print(gyroXAngle, gyroYAngle, gyroZAngle)
-            # print(gyro_yaw)
-
-        if self.lowpass_roll is None:
-            self.lowpass_roll = self.comp_roll
-        else:
-            self.lowpass_roll = self.lowpass(
-                self.lowpass_pc, self.comp_roll, self.lowpass_roll
-            )
-        if self.lowpass_pitch is None:
-            self.lowpass_pitch = self.comp_pitch
-        else:
-            self.lowpass_pitch = self.lowpass(
-                self.lowpass_pc, self.comp_pitch, self.lowpass_pitch
-            )
-
-        return self.lowpass_roll, self.lowpass_pitch
-
-    def get_heading(self, alpha=1.0, tiltcomp=False, truenorth=True):
-
-        mx = self.imu[6]
-        my = self.imu[7]
-        mz = self.imu[8]
-
-        # TODO Fix this block
-        if tiltcomp:
-            m_roll = self.comp_roll * DEG2RAD
-            m_pitch = self.comp_pitch * DEG2RAD
-
-            mx = (
-                mx * cos(m_pitch)
-                + my * sin(m_roll) * sin(m_pitch)
-                - mz * cos(m_roll) * sin(m_pitch)
-            )
-            my = my * cos(m_roll) + mz * sin(m_roll)
-
-        self.lowpass_mx = self.lowpass(alpha, mx, self.lowpass_mx)
-        self.lowpass_my = self.lowpass(alpha, my, self.lowpass_my)
-
-        # Calculate heading in radians and North to zero
-        heading = 90 - atan2(self.lowpass_my, self.lowpass_mx) * RAD2DEG
-
-        # Adjust for negative values
-        # if heading_deg < 0:
-        #     heading_deg += 360
-        declination = self.declination if truenorth else 0
-        heading = (heading + declination + 360) % 360
-        heading = (180 - heading) % 360
-
-        return heading
-
-    def madgwick(self):
-        # fuse.update(self.imu.accel, self.imu.gyro, self.imu.mag)
-        fuse.update(
-            *orientate(
-                (0, 1, 2),
-                (False, False, True),
-                self.imu.accel,
-                self.imu.gyro,
-                self.imu.mag,
-            )
-        )
-
-        return fuse.roll, fuse.pitch, fuse.heading
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exception_type, exception_value, traceback):
-        pass
-
-
-if __name__ == "__main__":
-    mpu = MPU()
-
-    try:
-        while True:
-            # print(
-            #     "\r\n /-------------------------------------------------------------/ \r\n"
-            # )
-            # print(mpu9250.update())
-            mpu.update_mpu()
-
-            # pitch, roll, heading = mpu9250.get_roll_pitch_v1(mpu9250.lowpass_pc)
-            # print("roll " + str(mpu.roll))
-            # print("pitch " + str(mpu.pitch))
-            # print("heading " + str(mpu.heading))
-
-            print(
-                "Heading, Roll, Pitch: {:7.3f} {:7.3f} {:7.3f}".format(
-                    mpu.heading, mpu.roll, mpu.pitch
-                )
-            )
-
-            # pitch, roll = mpu9250.get_roll_pitch_v2(mpu9250.comp_pc)
-            # print(mpu9250.get_roll_pitch_v3(mpu9250.comp_pc))
-
-            # print(
-            #     "\r\n /-------------------------------------------------------------/ \r\n"
-            # )
-            # print(
-            #     "\r\n Roll = %.2f , Pitch = %.2f , Yaw = %.2f\r\n"
-            #     % (roll, pitch, yaw)
-            #     # "Roll: "
-            #     # + str(roll)
-            #     # + "\tPitch: "
-            #     # + str(pitch)
-            #     # "Yaw: "
-            #     # + str(scaled_yaw)
-            # )
-            # print(
-            #     "\r\nAcceleration:  X = %d , Y = %d , Z = %d\r\n"
-            #     % (Accel[0], Accel[1], Accel[2])
-            # )
-            # print(
-            #     "\r\nGyroscope:     X = %d , Y = %d , Z = %d\r\n"
-            #     % (Gyro[0], Gyro[1], Gyro[2])
-            # )
-            # print(
-            #     "\r\nMagnetic:      X = %d , Y = %d , Z = %d"
-            #     % (
-            #         (Mag[1]),  # * 10 * 32760.0 / 4912.0),  # + 32760.0,
-            #         (-Mag[0]),  # * 10 * 32760.0 / 4912.0),  # + 32760.0,
-            #         (Mag[2]),  # * 10 * 32760.0 / 4912.0),  # + 32760.0,
-            #         # (-((Mag[0] - 4912.0))),
-            #         # ((Mag[1] + 4912.0)),
-            #         # (-((Mag[2] - 4912.0))),
-            #     )
-            # )
-            sleep(0.1)
-
-    except KeyboardInterrupt:
-        exit()
+# -*- coding: utf-8 -*-
+"""Pico Motorcycle Dashboard MPU
+"""
+
+__author__ = "Salvatore La Bua"
+
+
+import _thread
+from array import array
+from fusion import FusionFast, Mahony
+from machine import I2C, Pin
+from math import atan2, copysign, cos, sin, sqrt
+from mpu6500 import FIFO_FRAME_LEN, MPU6500
+from micropython import schedule
+from mpu9250 import BURST_LEN, EXT_SENS_LEN, MPU9250
+import picomotodash_fastmath as fastmath
+from picomotodash_magcal import calibrate as ellipsoid_calibrate
+from ujson import dump, load
+from utime import sleep, ticks_diff, ticks_us
+
+
+# MPU = 0x68
+id = 1
+sda = Pin(6)
+scl = Pin(7)
+
+CALIB_FILE = "calib.json"
+CALIB_VERSION = 3
+
+RAD2DEG = 180 / 3.1415
+DEG2RAD = 3.1415 / 180
+
+FIFO_RATE = 100  # Hz
+FIFO_MAX_FRAMES = 32  # Frames drained per update
+DRDY_RATE = 100  # Hz
+
+# Attitude snapshot layout, see MPU.latest_attitude()
+ATT_ROLL = 0
+ATT_PITCH = 1
+ATT_HEADING = 2
+ATT_LEN = 3
+
+# Sensor frame to fusion filter frame, same remap for all three sensors
+FUSION_AXES = (0, 1, 2)  # Source axis of each vehicle axis
+FUSION_INVERT = (False, False, True)  # Invert the vertical axis
+FUSION_BETA = None  # None keeps the Fusion default (40 deg/s gyro error)
+
+# Sensor fusion filters run by update_mpu(fusion=True), see fuse_update()
+AHRS_MADGWICK = "madgwick"
+AHRS_MAHONY = "mahony"
+
+TIMING_ALPHA = 0.05  # Weight of the last update in the filter timing average
+
+# Lean and longitudinal acceleration telemetry, see Lean
+LEAN_SIGN = 1  # Positive roll leans right, -1 if the board is mounted reversed
+LEAN_CORNER_ENTER = 8.0  # deg, a corner starts above this lean
+LEAN_CORNER_EXIT = 4.0  # deg, and ends below this one
+LONG_G_ALPHA = 0.2  # Smoothing of the longitudinal acceleration
+
+# Online gyro bias tracking, see MPU.track_bias()
+BIAS_WINDOW = 50  # Samples per stationarity window
+BIAS_GYRO_LIMIT = 1.0  # deg/s, mean residual rate of a still window
+BIAS_GYRO_VAR = 0.1  # (deg/s)^2, rate variance of a still window, per axis
+BIAS_ACCEL_LIMIT = 0.05  # g, deviation of |a| from 1 g
+BIAS_ACCEL_VAR = 4e-4  # Variance of |a|^2 in a still window, about 0.01 g rms
+BIAS_SPEED_LIMIT = 2.0  # km/h, GPS speed below which the bike may be still
+BIAS_STILL_WINDOWS = 2  # Consecutive still windows before refining
+BIAS_ALPHA = 0.02  # Bias update weight per still window, ~25 s at 100 Hz
+BIAS_SAVE_UPDATES = 60  # Refinements before the bias is saved, once per boot
+BIAS_SEED_SAMPLES = 50  # Short blocking seed when no calibration exists
+BIAS_SEED_PERIOD = 0.005  # s
+
+_BIAS_GYRO_LIMIT2 = BIAS_GYRO_LIMIT * BIAS_GYRO_LIMIT
+_BIAS_ACCEL_LIMIT2 = 2 * BIAS_ACCEL_LIMIT  # |a|^2 - 1 ~ 2 (|a| - 1)
+
+# Window sums, see MPU.track_bias()
+_SUM_GX = 0
+_SUM_GY = 1
+_SUM_GZ = 2
+_SUM_GX2 = 3
+_SUM_GY2 = 4
+_SUM_GZ2 = 5
+_SUM_A = 6  # |a|^2 - 1
+_SUM_A2 = 7
+_SUM_LEN = 8
+
+_ST2_HOFL = 0b00001000  # AK8963 magnetic sensor overflow
+
+
+def _be16(buf, i):
+    value = (buf[i] << 8) | buf[i + 1]
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _le16(buf, i):
+    value = buf[i] | (buf[i + 1] << 8)
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class Lean:
+    """Lean angle, peak lean per corner and longitudinal acceleration.
+
+    Fed by MPU with every attitude update, keeps scalars only. Angles are in
+    degrees (positive right), accelerations in g (positive accelerating,
+    negative braking) with the gravity component due to pitch removed.
+    """
+
+    def __init__(self, forward_axis=0, forward_sign=1, sign=LEAN_SIGN, fast_trig=False):
+
+        self.forward_axis = forward_axis
+        self.forward_sign = forward_sign
+        self.sign = sign
+        self._sin = fastmath.sin if fast_trig else sin
+        self.zero_roll = 0.0
+
+        self.lean = 0.0
+        self.cornering = False
+        self.peak = 0.0  # Peak of the current corner
+        self.last_peak = 0.0  # Peak of the last completed corner
+        self.corners = 0
+        self.max_left = 0.0
+        self.max_right = 0.0
+
+        self.long_g = 0.0
+        self.max_accel = 0.0
+        self.max_brake = 0.0
+
+    def update(self, roll, pitch, accel):
+        lean = self.sign * (roll - self.zero_roll)
+        self.lean = lean
+
+        if lean > self.max_right:
+            self.max_right = lean
+        elif -lean > self.max_left:
+            self.max_left = -lean
+
+        # Hysteresis between enter and exit keeps one peak per corner
+        abs_lean = abs(lean)
+        if self.cornering:
+            if abs_lean > abs(self.peak):
+                self.peak = lean
+            if abs_lean < LEAN_CORNER_EXIT:
+                self.cornering = False
+                self.last_peak = self.peak
+                self.corners += 1
+        elif abs_lean > LEAN_CORNER_ENTER:
+            self.cornering = True
+            self.peak = lean
+
+        # Nose up pitch reads as -sin(pitch) g on the forward axis
+        forward = accel[self.forward_axis] * self.forward_sign
+        long_g = forward + self._sin(pitch * DEG2RAD)
+        self.long_g += LONG_G_ALPHA * (long_g - self.long_g)
+
+        if self.long_g > self.max_accel:
+            self.max_accel = self.long_g
+        elif -self.long_g > self.max_brake:
+            self.max_brake = -self.long_g
+
+    def zero(self, roll):
+        # Current roll becomes upright, e.g. off the side stand
+        self.zero_roll = roll
+
+    def reset_peaks(self):
+        self.cornering = False
+        self.peak = 0.0
+        self.last_peak = 0.0
+        self.corners = 0
+        self.max_left = 0.0
+        self.max_right = 0.0
+        self.max_accel = 0.0
+        self.max_brake = 0.0
+
+
+class MPU:
+
+    def __init__(
+        self,
+        id=id,
+        scl=scl,
+        sda=sda,
+        freq=400000,
+        calib_ag=True,
+        calib_m=True,
+        tiltcomp=True,
+        truenorth=True,
+        parent=None,
+        int_pin=None,
+        bias_tracking=True,
+        beta=FUSION_BETA,
+        ahrs=AHRS_MADGWICK,
+        lean=True,
+        fast_trig=False,
+    ):
+
+        print("Initialising MPU9250...")
+
+        i2c = I2C(id=id, scl=scl, sda=sda, freq=freq)
+        # print(i2c.scan())
+
+        mpu6500 = MPU6500(i2c=i2c, accel_sf=1, gyro_sf=1)
+        self.mpu = MPU9250(i2c=i2c, mpu6500=mpu6500)
+
+        # A valid calibration file skips the slow magnetometer calibration
+        calib = self.load_calib()
+        m_changed = False
+        ag_changed = False
+
+        if calib_m:
+            if calib is not None and "mag_offset" in calib:
+                self.mpu.ak8963.offset = calib["mag_offset"]
+                self.mpu.ak8963.scale = calib["mag_scale"]
+                self.mpu.ak8963.matrix = calib.get("mag_matrix")
+                print("Magnetometer calibration loaded.")
+            else:
+                self.calib_m()
+                m_changed = True
+
+        # Scaled readings, accel [g], gyro [deg/s], mag [uT]
+        self.imu = array("f", [0] * 9)
+        imu = memoryview(self.imu)
+        self.accel = imu[0:3]
+        self.gyro = imu[3:6]
+        self.mag = imu[6:9]
+
+        # Burst read of all nine axes, scaled in place
+        self.raw = bytearray(BURST_LEN)
+        self.accel_gain = mpu6500._accel_sf / mpu6500._accel_so
+        self.gyro_gain = mpu6500._gyro_sf / mpu6500._gyro_so
+        self.mag_gain = array("f", [0] * 3)
+        self.mag_bias = array("f", [0] * 3)
+        self.mag_matrix = array("f", [0] * 9)
+        self.update_mag_gains()
+        self.mpu.enable_passthrough()
+
+        # FIFO batched sampling, see start_fifo()
+        self.fifo = False
+        self.fifo_dt = 0
+        self.fifo_buf = bytearray(FIFO_MAX_FRAMES * FIFO_FRAME_LEN)
+        self.fifo_mv = memoryview(self.fifo_buf)
+        self.mag_raw = bytearray(EXT_SENS_LEN)
+        self.fifo_frames = 0  # Frames processed by the last update
+        self.fifo_overflows = 0
+
+        # Data-ready interrupt acquisition, see start_drdy()
+        self.drdy_pin = None
+        self.drdy_ticks = 0
+        self.drdy_prev = 0
+        self.drdy_pending = False
+        self.drdy_missed = 0
+        # Bound methods allocate, create them once outside the IRQ
+        self.drdy_irq_ref = self.drdy_irq
+        self.drdy_read_ref = self.drdy_read
+        self.lock = _thread.allocate_lock()
+        self.attitude = array("f", [0] * ATT_LEN)
+        self.attitude_ticks = 0  # ticks_us() of the data-ready edge
+
+        # Fusion filter inputs, remapped into preallocated vectors
+        if ahrs == AHRS_MAHONY:
+            self.fuse = Mahony()
+        elif ahrs == AHRS_MADGWICK:
+            self.fuse = FusionFast()
+            if beta is not None:
+                self.fuse.beta = beta
+        else:
+            raise ValueError("Unknown AHRS filter: {}".format(ahrs))
+        self.fuse_imu = array("f", [0] * 9)
+        fuse_imu = memoryview(self.fuse_imu)
+        self.fuse_accel = fuse_imu[0:3]
+        self.fuse_gyro = fuse_imu[3:6]
+        self.fuse_mag = fuse_imu[6:9]
+        self.fuse_sign = array("f", [-1 if inv else 1 for inv in FUSION_INVERT])
+
+        # Trig used by the attitude and heading updates, see picomotodash_fastmath
+        if fast_trig:
+            self._sin = fastmath.sin
+            self._cos = fastmath.cos
+            self._atan2 = fastmath.atan2
+        else:
+            self._sin = sin
+            self._cos = cos
+            self._atan2 = atan2
+
+        # Lean and longitudinal g, updated with every attitude update
+        self.lean = Lean(fast_trig=fast_trig) if lean else None
+
+        # Filter cost per update [us], excluding the sensor read
+        self.filter_us = 0
+        self.filter_us_avg = 0.0
+
+        self.dt = 0
+        self.comp_pc = 0.99
+        self.lowpass_pc = 0.8
+
+        self.aXerr = 0
+        self.aYerr = 0
+        self.aZerr = 0
+        self.gXerr = 0
+        self.gYerr = 0
+        self.gZerr = 0
+
+        # Gyro bias refined whenever the bike is still, see track_bias()
+        self.bias_tracking = bias_tracking
+        self.bias_sums = array("f", [0] * _SUM_LEN)
+        self.bias_samples = 0
+        self.still_count = 0  # Consecutive still windows
+        self.bias_updates = 0
+        self.bias_save_pending = False
+        self.gps_speed = None  # km/h, see set_speed()
+
+        self.gyro_roll = None
+        self.gyro_pitch = None
+        self.gyro_yaw = 0
+
+        self.roll_bias = 0.0
+        self.pitch_bias = 0.0
+        self.roll = 0.0
+        self.pitch = 0.0
+        self.comp_roll = None
+        self.comp_pitch = None
+        self.lowpass_roll = None
+        self.lowpass_pitch = None
+        self.lowpass_mx = 0.0
+        self.lowpass_my = 0.0
+        self.tiltcomp = tiltcomp
+        self.truenorth = truenorth
+        self.heading = 0
+
+        # https://www.magnetic-declination.com/Japan/Kyoto/1340633.html
+        self.declination = -8.12  # Kyoto
+
+        if calib_ag:
+            if calib is not None and "aXerr" in calib:
+                self.read_calib(calib)
+            elif bias_tracking:
+                # Short seed, the gyro bias is then refined while still and
+                # only saved once refined, see track_bias()
+                self.calib_ag(period=BIAS_SEED_PERIOD, n_samples=BIAS_SEED_SAMPLES)
+                if calib is not None and "gXerr" in calib:
+                    self.read_calib(calib, accel=False)  # Refined on a past ride
+            else:
+                self.calib_ag()
+                ag_changed = True
+
+        # Sections that were neither calibrated nor loaded are not written
+        if m_changed or ag_changed:
+            self.write_calib(ag=ag_changed, m=m_changed)
+
+        self.start = ticks_us()
+
+        self.update_mpu()
+        self.roll_bias = self.roll
+        self.pitch_bias = self.pitch
+
+        if int_pin is not None:
+            self.start_drdy(int_pin)
+
+        print("MPU9250 Initialised.")
+
+    def calib_m(self, count=100, ellipsoid=True):
+        print("Calibrating Magnetometer...")
+
+        # Calibration reads the AK8963 directly
+        passthrough = self.mpu.passthrough
+        if passthrough:
+            self.mpu.disable_passthrough()
+        if not ellipsoid or ellipsoid_calibrate(self.mpu.ak8963, count=count) is None:
+            print("Using min/max calibration.")
+            self.mpu.ak8963.calibrate(count=count)
+        if passthrough:
+            self.mpu.enable_passthrough()
+
+        print("Calibration Completed.")
+
+    def calib_ag(self, period=0.02, n_samples=1000):
+        print("Running Accel/Gyro Calibration...")
+
+        self.aXerr = 0
+        self.aYerr = 0
+        self.aZerr = 0
+        self.gXerr = 0
+        self.gYerr = 0
+        self.gZerr = 0
+
+        for _ in range(n_samples):
+            ax, ay, az = self.mpu.acceleration
+            gx, gy, gz = self.mpu.gyro
+
+            self.aXerr += ax
+            self.aYerr += ay
+            self.aZerr += az
+            self.gXerr += gx
+            self.gYerr += gy
+            self.gZerr += gz
+
+            sleep(period)
+
+        self.aXerr /= n_samples
+        self.aYerr /= n_samples
+        self.aZerr /= n_samples
+        self.gXerr /= n_samples
+        self.gYerr /= n_samples
+        self.gZerr /= n_samples
+
+        self.aZerr += 1  # 9.80665
+
+        print("Calibration errors:")
+        print(
+            self.aXerr,
+            "\t",
+            self.aYerr,
+            "\t",
+            self.aZerr,
+            "\t",
+            self.gXerr,
+            "\t",
+            self.gYerr,
+            "\t",
+            self.gZerr,
+        )
+
+        print("Calibration Complete.")
+
+    def recalibrate(self, ag=True, m=True):
+        # Explicit recalibration, the result replaces its calibration file section
+        if m:
+            self.calib_m()
+            self.update_mag_gains()
+        if ag:
+            self.calib_ag()
+        self.write_calib(ag=ag, m=m)
+
+    def load_calib(self):
+        print("Reading calibration file...")
+
+        try:
+            with open(CALIB_FILE, "r") as calib_file:
+                calib = load(calib_file)
+        except (OSError, ValueError):
+            print("Calibration file not found.")
+            return None
+
+        # Files without a version only hold the accel/gyro errors
+        version = calib.get("version", 1)
+        if version > CALIB_VERSION:
+            print("Unsupported calibration file version:", version)
+            return None
+
+        print("Calibration file found.")
+        return calib
+
+    def read_calib(self, calib, accel=True):
+        print("Reading calibration data...")
+
+        if accel:
+            self.aXerr = calib["aXerr"]
+            self.aYerr = calib["aYerr"]
+            self.aZerr = calib["aZerr"]
+        self.gXerr = calib["gXerr"]
+        self.gYerr = calib["gYerr"]
+        self.gZerr = calib["gZerr"]
+
+    def write_calib(self, ag=True, m=True, gyro=False):
+        # Replaces the accel/gyro (ag) and magnetometer (m) sections, the
+        # other sections of an existing file are kept. gyro replaces only the
+        # gyro errors of the accel/gyro section
+        calib = self.load_calib() or {}
+
+        print("Writing calibration...")
+        calib["version"] = CALIB_VERSION
+        if ag:
+            calib["aXerr"] = self.aXerr
+            calib["aYerr"] = self.aYerr
+            calib["aZerr"] = self.aZerr
+        if ag or gyro:
+            calib["gXerr"] = self.gXerr
+            calib["gYerr"] = self.gYerr
+            calib["gZerr"] = self.gZerr
+        if m:
+            ak8963 = self.mpu.ak8963
+            calib["mag_offset"] = list(ak8963.offset)
+            calib["mag_scale"] = list(ak8963.scale)
+            if ak8963.matrix is not None:
+                calib["mag_matrix"] = list(ak8963.matrix)
+            elif "mag_matrix" in calib:
+                del calib["mag_matrix"]
+        with open(CALIB_FILE, "w") as calib_file:
+            dump(calib, calib_file)
+        print("Calibration file written.")
+
+    def lowpass(self, alpha, new_value, old_value):
+        return (alpha * new_value) + (1.0 - alpha) * old_value
+
+    def update_mag_gains(self):
+        # Fold factory adjustment and resolution into gain, calibration into
+        # bias and a soft iron matrix (diagonal for min/max calibration)
+        ak8963 = self.mpu.ak8963
+        matrix = ak8963.matrix
+        for i in range(3):
+            self.mag_gain[i] = ak8963.adjustement[i] * ak8963._so
+            self.mag_bias[i] = ak8963.offset[i]
+            for j in range(3):
+                if matrix is not None:
+                    self.mag_matrix[3 * i + j] = matrix[3 * i + j]
+                else:
+                    self.mag_matrix[3 * i + j] = ak8963.scale[i] if i == j else 0
+
+    def read_imu(self):
+        imu = self.imu
+
+        if not self.mpu.passthrough:
+            a = self.mpu.acceleration
+            g = self.mpu.gyro
+            m = self.mpu.magnetic
+            imu[0] = a[0] - self.aXerr
+            imu[1] = a[1] - self.aYerr
+            imu[2] = a[2] - self.aZerr
+            imu[3] = g[0] - self.gXerr
+            imu[4] = g[1] - self.gYerr
+            imu[5] = g[2] - self.gZerr
+            imu[6] = m[0]
+            imu[7] = m[1]
+            imu[8] = m[2]
+        else:
+            raw = self.raw
+            self.mpu.read_burst_into(raw)
+            self.decode_accel_gyro(raw, 0, 8)
+            self.decode_mag(raw, 14)
+
+        if self.bias_tracking:
+            self.track_bias()
+
+    def track_bias(self):
+        # Samples are grouped in windows of BIAS_WINDOW. A window is still
+        # when the residual rate is small and steady, |a| stays close to 1 g
+        # and the GPS speed, if known, is close to zero. A constant turn
+        # passes the variance test but not the rate limit or the GPS speed.
+        # After BIAS_STILL_WINDOWS still windows the mean residual rate
+        # slowly refines the gyro bias.
+        imu = self.imu
+        sums = self.bias_sums
+        gx = imu[3]
+        gy = imu[4]
+        gz = imu[5]
+        ax = imu[0]
+        ay = imu[1]
+        az = imu[2]
+        a = ax * ax + ay * ay + az * az - 1
+
+        sums[_SUM_GX] += gx
+        sums[_SUM_GY] += gy
+        sums[_SUM_GZ] += gz
+        sums[_SUM_GX2] += gx * gx
+        sums[_SUM_GY2] += gy * gy
+        sums[_SUM_GZ2] += gz * gz
+        sums[_SUM_A] += a
+        sums[_SUM_A2] += a * a
+        self.bias_samples += 1
+        if self.bias_samples < BIAS_WINDOW:
+            return
+
+        n = self.bias_samples
+        gx = sums[_SUM_GX] / n
+        gy = sums[_SUM_GY] / n
+        gz = sums[_SUM_GZ] / n
+        a = sums[_SUM_A] / n
+        speed = self.gps_speed
+        still = (
+            (speed is None or speed < BIAS_SPEED_LIMIT)
+            and gx * gx + gy * gy + gz * gz <= _BIAS_GYRO_LIMIT2
+            and sums[_SUM_GX2] / n - gx * gx <= BIAS_GYRO_VAR
+            and sums[_SUM_GY2] / n - gy * gy <= BIAS_GYRO_VAR
+            and sums[_SUM_GZ2] / n - gz * gz <= BIAS_GYRO_VAR
+            and abs(a) <= _BIAS_ACCEL_LIMIT2
+            and sums[_SUM_A2] / n - a * a <= BIAS_ACCEL_VAR
+        )
+
+        for i in range(_SUM_LEN):
+            sums[i] = 0
+        self.bias_samples = 0
+
+        if not still:
+            self.still_count = 0
+            return
+
+        if self.still_count < BIAS_STILL_WINDOWS:
+            self.still_count += 1
+            return
+
+        self.gXerr += BIAS_ALPHA * gx
+        self.gYerr += BIAS_ALPHA * gy
+        self.gZerr += BIAS_ALPHA * gz
+        self.bias_updates += 1
+        if self.bias_updates == BIAS_SAVE_UPDATES:
+            self.bias_save_pending = True  # Written by update_mpu()
+
+    def set_speed(self, speed):
+        # GPS ground speed [km/h] gating the bias tracking, None if unknown
+        self.gps_speed = speed
+
+    def save_bias(self):
+        # Only the refined gyro errors are saved, the accel errors of the
+        # seed come from a single pose and would pass for a calibration
+        self.bias_save_pending = False
+        self.write_calib(ag=False, m=False, gyro=True)
+
+    def read_mag(self):
+        if not self.mpu.passthrough:
+            m = self.mpu.magnetic
+            self.imu[6] = m[0]
+            self.imu[7] = m[1]
+            self.imu[8] = m[2]
+            return
+
+        self.mpu.read_magnetic_into(self.mag_raw)
+        self.decode_mag(self.mag_raw, 0)
+
+    def decode_accel_gyro(self, raw, a, g):
+        imu = self.imu
+
+        gain = self.accel_gain
+        imu[0] = _be16(raw, a) * gain - self.aXerr
+        imu[1] = _be16(raw, a + 2) * gain - self.aYerr
+        imu[2] = _be16(raw, a + 4) * gain - self.aZerr
+
+        gain = self.gyro_gain
+        offset = self.mpu.mpu6500._gyro_offset
+        imu[3] = _be16(raw, g) * gain - offset[0] - self.gXerr
+        imu[4] = _be16(raw, g + 2) * gain - offset[1] - self.gYerr
+        imu[5] = _be16(raw, g + 4) * gain - offset[2] - self.gZerr
+
+    def decode_mag(self, raw, m):
+        if raw[m + 6] & _ST2_HOFL:  # Keep the previous reading
+            return
+
+        imu = self.imu
+        gain = self.mag_gain
+        bias = self.mag_bias
+        x = _le16(raw, m) * gain[0] - bias[0]
+        y = _le16(raw, m + 2) * gain[1] - bias[1]
+        z = _le16(raw, m + 4) * gain[2] - bias[2]
+
+        w = self.mag_matrix
+        imu[6] = w[0] * x + w[1] * y + w[2] * z
+        imu[7] = w[3] * x + w[4] * y + w[5] * z
+        imu[8] = w[6] * x + w[7] * y + w[8] * z
+
+    def start_fifo(self, rate=FIFO_RATE):
+        # Let the sensor pace the samples, update_mpu() then drains them all
+        rate = self.mpu.mpu6500.fifo_enable(rate)
+        self.fifo_dt = 1 / rate
+        self.fifo = True
+
+    def stop_fifo(self):
+        self.mpu.mpu6500.fifo_disable()
+        self.fifo = False
+
+    def update_fifo(self):
+        mpu6500 = self.mpu.mpu6500
+
+        if mpu6500.fifo_overflow:
+            # Frames are no longer aligned, drop them and start over
+            mpu6500.fifo_reset()
+            self.fifo_overflows += 1
+            self.fifo_frames = 0
+            return
+
+        frames = min(mpu6500.fifo_count // FIFO_FRAME_LEN, FIFO_MAX_FRAMES)
+        self.fifo_frames = frames
+        if frames == 0:
+            return
+
+        buf = self.fifo_buf
+        mpu6500.fifo_read_into(self.fifo_mv[: frames * FIFO_FRAME_LEN])
+        self.read_mag()
+
+        # Run the filter over every sample with the exact sample period
+        tracking = self.bias_tracking
+        for i in range(0, frames * FIFO_FRAME_LEN, FIFO_FRAME_LEN):
+            self.decode_accel_gyro(buf, i, i + 6)
+            if tracking:
+                self.track_bias()
+            self.roll, self.pitch = self.get_roll_pitch_my(
+                alpha=self.comp_pc, dt=self.fifo_dt
+            )
+            if self.lean is not None:
+                self.lean.update(self.roll, self.pitch, self.accel)
+
+    def start_drdy(self, pin, rate=DRDY_RATE):
+        # Sample on the sensor data-ready pulses, independently of the frame rate
+        self.mpu.mpu6500.data_ready_enable(rate)
+        self.drdy_pin = Pin(pin, Pin.IN) if isinstance(pin, int) else pin
+        self.drdy_prev = ticks_us()
+        self.drdy_pin.irq(
+            trigger=Pin.IRQ_RISING,
+            handler=self.drdy_irq_ref,
+            hard=True,
+        )
+
+    def stop_drdy(self):
+        self.drdy_pin.irq(handler=None)
+        self.mpu.mpu6500.data_ready_disable()
+        self.drdy_pin = None
+
+    def drdy_irq(self, _):
+        # Runs in the hard IRQ: timestamp the sample and defer the I2C read
+        if self.drdy_pending:
+            self.drdy_missed += 1
+            return
+        self.drdy_ticks = ticks_us()
+        self.drdy_pending = True
+        try:
+            schedule(self.drdy_read_ref, 0)
+        except RuntimeError:  # Schedule queue full, wait for the next sample
+            self.drdy_pending = False
+
+    def drdy_read(self, _):
+        ticks = self.drdy_ticks
+        dt = ticks_diff(ticks, self.drdy_prev) / 1000000
+        self.drdy_prev = ticks
+
+        self.read_imu()
+        self.drdy_pending = False
+
+        self.roll, self.pitch = self.get_roll_pitch_my(alpha=self.comp_pc, dt=dt)
+        self.heading = self.get_heading(
+            alpha=self.lowpass_pc, tiltcomp=self.tiltcomp, truenorth=self.truenorth
+        )
+        if self.lean is not None:
+            self.lean.update(self.roll, self.pitch, self.accel)
+
+        # Never block here: this may run while the reader holds the lock,
+        # in that case the snapshot is refreshed on the next sample
+        if self.lock.acquire(0):
+            attitude = self.attitude
+            attitude[ATT_ROLL] = self.roll
+            attitude[ATT_PITCH] = self.pitch
+            attitude[ATT_HEADING] = self.heading
+            self.attitude_ticks = ticks
+            self.lock.release()
+
+    def latest_attitude(self, out):
+        """Copy the latest roll, pitch and heading (see ATT_*) published by
+        the data-ready path into `out`, returns the ticks_us() of the sample."""
+        with self.lock:
+            for i in range(ATT_LEN):
+                out[i] = self.attitude[i]
+            return self.attitude_ticks
+
+    def update_mpu(self, fusion=False):
+        # File writes never run from the sampling paths
+        if self.bias_save_pending:
+            self.save_bias()
+
+        if self.drdy_pin is not None:
+            return  # Attitude is kept up to date by drdy_read()
+
+        if self.fifo and not fusion:
+            self.update_fifo()
+            self.heading = self.get_heading(
+                alpha=self.lowpass_pc, tiltcomp=self.tiltcomp, truenorth=self.truenorth
+            )
+            return
+
+        self.read_imu()
+
+        t0 = ticks_us()
+        if fusion:
+            self.roll, self.pitch, self.heading = self.fuse_update()
+        else:
+            self.roll, self.pitch = self.get_roll_pitch_my(alpha=self.comp_pc)
+            self.heading = self.get_heading(
+                alpha=self.lowpass_pc, tiltcomp=self.tiltcomp, truenorth=self.truenorth
+            )
+        self.filter_us = ticks_diff(ticks_us(), t0)
+        self.filter_us_avg += TIMING_ALPHA * (self.filter_us - self.filter_us_avg)
+
+        if self.lean is not None:
+            self.lean.update(self.roll, self.pitch, self.accel)
+
+    def get_roll_pitch(self) -> float:
+        """Returns the readings from the sensor"""
+
+        ax = self.imu[0]
+        ay = self.imu[1]
+        az = self.imu[2]
+
+        roll = atan2(-ax, sqrt((ay * ay) + (az * az))) * RAD2DEG
+        pitch = (
+            atan2(az, copysign(ay, ay) * sqrt((0.01 * ax * ax) + (ay * ay))) * RAD2DEG
+        )
+
+        roll -= self.roll_bias
+        pitch -= self.pitch_bias
+
+        return roll, pitch
+
+    def get_roll_pitch_my(self, alpha=1.0, dt=None):
+        now = ticks_us()
+        self.dt = ticks_diff(now, self.start) / 1000000 if dt is None else dt
+        self.start = now
+
+        # Read sensor data, roll about x and pitch about y follow the
+        # right-hand rule of the gyro axes
+        ax = self.imu[0]
+        ay = self.imu[1]
+        az = self.imu[2]
+
+        gx = self.imu[3]
+        gy = self.imu[4]
+        gz = self.imu[5]
+
+        # Calculate gyro rate [deg/sec]
+        gyroXRate = gx  # / 0.017453292519943
+        gyroYRate = gy  # / 0.017453292519943
+        gyroZRate = gz  # / 0.017453292519943
+
+        # Calculate gyro angle [deg]
+        gyroXAngle = gyroXRate * self.dt
+        gyroYAngle = gyroYRate * self.dt
+        gyroZAngle = gyroZRate * self.dt * DEG2RAD
+
+        # Calculate roll and pitch [deg]
+        _atan2 = self._atan2
+        roll = _atan2(ay, sqrt((ax * ax) + (az * az))) * RAD2DEG
+        pitch = _atan2(-ax, sqrt((ay * ay) + (az * az))) * RAD2DEG
+
+        sin_yaw = self._sin(gyroZAngle)
+        roll -= pitch * sin_yaw
+        pitch += roll * sin_yaw
+
+        # Calculate composite angle
+        if self.comp_roll is None:
+            self.comp_roll = roll
+        else:
+            self.comp_roll = alpha * (self.comp_roll + gyroXAngle) + (1 - alpha) * roll
+
+        if self.comp_pitch is None:
+            self.comp_pitch = pitch
+        else:
+            self.comp_pitch = (
+                alpha * (self.comp_pitch + gyroYAngle) + (1 - alpha) * pitch
+            )
+
+            # print("roll", roll, "pitch", pitch)
+            # #print("roll", roll, "pitch", pitch, "c_roll", self.comp_roll,
+            # #      "c_pitch", self.comp_pitch)
+            # print("dt", dt, "roll", roll, "g_roll", gyro_roll, "c_roll", comp_roll)
+            # print("pitch", pitch, "c_pitch", comp_pitch)
+            # print(gyroXAngle, gyroYAngle, gyroZAngle)
+            # print(gyro_yaw)
+
+        if self.lowpass_roll is None:
+            self.lowpass_roll = self.comp_roll
+        else:
+            self.lowpass_roll = self.lowpass(
+                self.lowpass_pc, self.comp_roll, self.lowpass_roll
+            )
+        if self.lowpass_pitch is None:
+            self.lowpass_pitch = self.comp_pitch
+        else:
+            self.lowpass_pitch = self.lowpass(
+                self.lowpass_pc, self.comp_pitch, self.lowpass_pitch
+            )
+
+        return self.lowpass_roll, self.lowpass_pitch
+
+    def get_heading(self, alpha=1.0, tiltcomp=False, truenorth=True):
+
+        mx = self.imu[6]
+        my = self.imu[7]
+        mz = self.imu[8]
+
+        # TODO Fix this block
+        if tiltcomp:
+            m_roll = self.comp_roll * DEG2RAD
+            m_pitch = self.comp_pitch * DEG2RAD
+            sin_roll = self._sin(m_roll)
+            cos_roll = self._cos(m_roll)
+            sin_pitch = self._sin(m_pitch)
+            cos_pitch = self._cos(m_pitch)
+
+            mx = mx * cos_pitch + my * sin_roll * sin_pitch - mz * cos_roll * sin_pitch
+            my = my * cos_roll + mz * sin_roll
+
+        self.lowpass_mx = self.lowpass(alpha, mx, self.lowpass_mx)
+        self.lowpass_my = self.lowpass(alpha, my, self.lowpass_my)
+
+        # Calculate heading in radians and North to zero
+        heading = 90 - self._atan2(self.lowpass_my, self.lowpass_mx) * RAD2DEG
+
+        # Adjust for negative values
+        # if heading_deg < 0:
+        #     heading_deg += 360
+        declination = self.declination if truenorth else 0
+        heading = (heading + declination + 360) % 360
+        heading = (180 - heading) % 360
+
+        return heading
+
+    def fuse_update(self):
+        # Runs the filter selected by the ahrs argument (Madgwick or Mahony),
+        # inputs remapped in place, see FUSION_AXES and FUSION_INVERT
+        imu = self.imu
+        out = self.fuse_imu
+        sign = self.fuse_sign
+        for v in range(0, 9, 3):
+            for i in range(3):
+                out[v + i] = imu[v + FUSION_AXES[i]] * sign[i]
+
+        fuse = self.fuse
+        fuse.declination = self.declination if self.truenorth else 0
+        fuse.update(self.fuse_accel, self.fuse_gyro, self.fuse_mag)
+
+        return fuse.roll, fuse.pitch, fuse.heading
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        pass
+
+
+if __name__ == "__main__":
+    mpu = MPU()
+
+    try:
+        while True:
+            # print(
+            #     "\r\n /-------------------------------------------------------------/ \r\n"
+            # )
+            # print(mpu9250.update())
+            mpu.update_mpu()
+
+            # pitch, roll, heading = mpu9250.get_roll_pitch_v1(mpu9250.lowpass_pc)
+            # print("roll " + str(mpu.roll))
+            # print("pitch " + str(mpu.pitch))
+            # print("heading " + str(mpu.heading))
+
+            print(
+                "Heading, Roll, Pitch: {:7.3f} {:7.3f} {:7.3f}".format(
+                    mpu.heading, mpu.roll, mpu.pitch
+                )
+            )
+
+            # pitch, roll = mpu9250.get_roll_pitch_v2(mpu9250.comp_pc)
+            # print(mpu9250.get_roll_pitch_v3(mpu9250.comp_pc))
+
+            # print(
+            #     "\r\n /-------------------------------------------------------------/ \r\n"
+            # )
+            # print(
+            #     "\r\n Roll = %.2f , Pitch = %.2f , Yaw = %.2f\r\n"
+            #     % (roll, pitch, yaw)
+            #     # "Roll: "
+            #     # + str(roll)
+            #     # + "\tPitch: "
+            #     # + str(pitch)
+            #     # "Yaw: "
+            #     # + str(scaled_yaw)
+            # )
+            # print(
+            #     "\r\nAcceleration:  X = %d , Y = %d , Z = %d\r\n"
+            #     % (Accel[0], Accel[1], Accel[2])
+            # )
+            # print(
+            #     "\r\nGyroscope:     X = %d , Y = %d , Z = %d\r\n"
+            #     % (Gyro[0], Gyro[1], Gyro[2])
+            # )
+            # print(
+            #     "\r\nMagnetic:      X = %d , Y = %d , Z = %d"
+            #     % (
+            #         (Mag[1]),  # * 10 * 32760.0 / 4912.0),  # + 32760.0,
+            #         (-Mag[0]),  # * 10 * 32760.0 / 4912.0),  # + 32760.0,
+            #         (Mag[2]),  # * 10 * 32760.0 / 4912.0),  # + 32760.0,
+            #         # (-((Mag[0] - 4912.0))),
+            #         # ((Mag[1] + 4912.0)),
+            #         # (-((Mag[2] - 4912.0))),
+            #     )
+            # )
+            sleep(0.1)
+
+    except KeyboardInterrupt:
+        exit()
@@ -20,27 +20,53 @@ MODE_BACKLIGHT = 3
 
 class NEOPX:
 
-    def __init__(self, pin=PIN_NUM, n=NUM_LEDS, rgbw=RGBW):
+    def __init__(self, pin=PIN_NUM, n=NUM_LEDS, rgbw=RGBW, autowrite=True):
 
         self.n = n
         self.np = neopixel.NeoPixel(Pin(pin), n, bpp=4 if rgbw else 3, timing=1)
 
         self.mode = MODE_COMPASS
 
+        # Without autowrite the set_* methods only stage the pixels,
+        # commit() then writes the strip once per frame if anything changed
+        self.autowrite = autowrite
+        self.last_buf = bytearray(len(self.np.buf))  # Last written pixels
+        self.writes = 0
+        self.writes_saved = 0
+
         self.off()
+        self.commit(force=True)  # The strip state is unknown after reset
 
     def map_range(self, value, in_range, out_range):
         (a, b), (c, d) = in_range, out_range
         return (value - a) / (b - a) * (d - c) + c
 
-    def off(self):
+    def show(self):
+        if self.autowrite:
+            self.commit()
+
+    def commit(self, force=False):
+        buf = self.np.buf
+        if not force and buf == self.last_buf:
+            self.writes_saved += 1
+            return False
+
+        self.np.write()
+        self.last_buf[:] = buf
+        self.writes += 1
+        return True
+
+    def clear(self):
         for i in range(self.n):
             self.np[i] = (0, 0, 0)
-        self.np.write()
+
+    def off(self):
+        self.clear()
+        self.show()
 
     def set_np(self, i, rgb_tuple):
         self.np[i] = rgb_tuple
-        self.np.write()
+        self.show()
 
     def set_np_rpm(self, rpm):
         upto = rpm // 1000
@@ -50,7 +76,7 @@ class NEOPX:
             else:
                 self.np[i] = (0, 0, 0)
 
-        self.np.write()
+        self.show()
 
     def set_np_compass(self, heading):
         # PLACEHOLDER
@@ -61,12 +87,12 @@ class NEOPX:
         i = int(self.map_range(heading, (0, 360), (34, 24)))
         self.np[i] = (0, 0, 5)
 
-        self.np.write()
+        self.show()
 
     def set_np_blend(self, rpm, heading):
         # TODO Update logic
 
-        self.off()
+        self.clear()
 
         upto = rpm // 1000
         for i in range(24, upto + 24):
@@ -75,7 +101,7 @@ class NEOPX:
         i = int(self.map_range(heading, (0, 360), (34, 24)))
         self.np[i] = (0, 0, 5)
 
-        self.np.write()
+        self.show()
 
     def update(self, rpm, heading):
         # TODO Update logic
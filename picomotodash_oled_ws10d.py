@@ -17,13 +17,15 @@ import math
 import sh1107
 
 from picomotodash_gps import GPS as pmdGPS
+from picomotodash_gps import DeadReckoning as pmdDR
+from picomotodash_gps import DR_HORIZON_MS, FIX_SPEED, FIX_TICKS
 from picomotodash_mpu9250 import MPU as pmdMPU
 from picomotodash_neopx import NEOPX as pmdNEOPX
 from picomotodash_rpm import RPM as pmdRPM
 from picomotodash_utils import moving_avg, normalise_avg, read_gps, read_mpu
 
 from machine import Pin, PWM, SPI
-from utime import sleep, sleep_us
+from utime import sleep, sleep_us, ticks_diff, ticks_ms
 
 gc.enable()
 gc.threshold(100000)
@@ -52,7 +54,8 @@ display.fill(0)
 display.show()
 
 # GPS setup
-gps = pmdGPS(local_offset=9, location_formatting="dd")
+gps = pmdGPS(local_offset=9, location_formatting="dd", irq=True)
+dr = pmdDR()
 
 # Magnetometer setup
 mpu = pmdMPU()
@@ -66,7 +69,7 @@ labels = ["N", "NE", "E", "SE", "S", "SW", "W", "NW", "N"]
 # Neopixel setup
 PIN_NUM = 3
 NUM_LEDS = 37
-neopixel_ring = pmdNEOPX(pin=PIN_NUM, n=NUM_LEDS)
+neopixel_ring = pmdNEOPX(pin=PIN_NUM, n=NUM_LEDS, autowrite=False)
 
 # RPM setup
 PWM2RPM_FACTOR = 10
@@ -290,7 +293,7 @@ def draw_infobox():
     display.fill_rect(64, 28, 1, 12, 1)
 
     # display.text("R:" + f"{str(round(RPM_ESTIMATE)):>5}", 69, 31, 1)
-    display.text("kph:" + f"{str(round(gps.speed)):>3}", 69, 31, 1)
+    display.text("kph:" + f"{str(round(dr.speed)):>3}", 69, 31, 1)
 
 
 def draw_gps():
@@ -309,6 +312,31 @@ def draw_gps():
     display.text("Alt %d" % (gps.altitude), 0, 57, 1)
 
 
+def draw_lean():
+    lean = mpu.lean
+
+    # Horizon tilted by the lean angle
+    angle = math.radians(lean.lean)
+    dx = round(40 * math.cos(angle))
+    dy = round(40 * math.sin(angle))
+    display.line(64 - dx, 22 + dy, 64 + dx, 22 - dy, 1)
+    display.fill_rect(62, 20, 5, 5, 1)
+
+    display.text("%+3d" % round(lean.lean), 0, 0, 1)
+    display.text("pk%+3d" % round(lean.last_peak), 88, 0, 1)
+
+    display.line(0, 44, 127, 44, 1)
+    display.text("L%2d" % round(lean.max_left), 0, 47, 1)
+    display.text("R%2d" % round(lean.max_right), 104, 47, 1)
+    display.text("g%+.2f" % lean.long_g, 40, 47, 1)
+    display.text(
+        "a%.2f  b%.2f" % (lean.max_accel, lean.max_brake),
+        8,
+        56,
+        1,
+    )
+
+
 def draw_rpm():
     # print("RPM: %.3f" % RPM_ESTIMATE)
 
@@ -360,13 +388,6 @@ def read_rpm():
 
     RPM_ESTIMATE = moving_avg(rpm.RPM_ESTIMATE, rpm_estimates, 10)
 
-    if rpm.timeout:
-        # rpm.stop()
-        # decrease_rpm()
-        # rpm_estimates = []
-        rpm.reset()
-        # rpm.start()
-
 
 rpm = pmdRPM(pin=22, factor=PWM2RPM_FACTOR)
 
@@ -381,7 +402,7 @@ _thread.start_new_thread(startup_rpm, [])
 rpm.start()
 
 PAGE_ID = 0
-PAGES = 4
+PAGES = 5
 
 # Main loop
 try:
@@ -392,10 +413,19 @@ try:
             # sleep(0.1)
             read_gps(gps)
 
+            # A recent GPS speed gates the gyro bias tracking
+            fix = gps.latest_fix()
+            fix_age = ticks_diff(ticks_ms(), fix[FIX_TICKS])
+            if fix[FIX_TICKS] and fix_age <= DR_HORIZON_MS:
+                mpu.set_speed(fix[FIX_SPEED])
+            else:
+                mpu.set_speed(None)
+
             read_mpu(mpu)
             HEADING = mpu.heading
             HEADING = moving_avg(HEADING, headings, 5)  # 9
             HEADING = normalise_avg(HEADING, headings, neopixel_ring)
+            dr.update(gps.latest_fix(), mpu.accel, HEADING, pitch=mpu.pitch)
 
             if not pause_rpm_readings:
                 read_rpm()
@@ -425,8 +455,11 @@ try:
                 # draw_compass()
                 # draw_infobox()
                 draw_rpm()
+            elif PAGE_ID == 4:
+                draw_lean()
 
             display.show()
+            neopixel_ring.commit()  # Single strip write per frame
         else:
             sleep(0.2)
             PAGE_ID = (PAGE_ID + 1) % PAGES
@@ -5,31 +5,67 @@
 __author__ = "Salvatore La Bua"
 
 
+from array import array
 from machine import Pin, Timer
-from utime import ticks_us
+from micropython import schedule
+from utime import ticks_diff, ticks_us
 
 pin = 22
 PWM2RPM_FACTOR = 10
 
+# Ring buffer of cycle durations, must be a power of two
+# The averaging window never exceeds 45 cycles (see update_estimate)
+RING_SIZE = 64
+RING_MASK = RING_SIZE - 1
+
+# Edge timestamps captured by the hard IRQ, must be a power of two
+EDGE_BUFFER_SIZE = 32
+EDGE_MASK = EDGE_BUFFER_SIZE - 1
+EDGE_INDEX_MASK = 2 * EDGE_BUFFER_SIZE - 1  # Indices wrap before becoming long ints
+
+# Timeout checks
+TIMEOUT_FREQ = 10  # Hz
+TIMEOUT_PERIODS = 3  # Missed periods before the estimate starts to decay
+TIMEOUT_MIN = 20000  # us
+TIMEOUT_MAX = 1000000  # us, no edge for this long means zero speed
+
 
 class RPM:
 
-    def __init__(self, pin=pin, factor=PWM2RPM_FACTOR, autostart=False):
+    def __init__(self, pin=pin, factor=PWM2RPM_FACTOR, autostart=False, hard=False):
 
         self.pwm = Pin(pin, Pin.IN, Pin.PULL_DOWN)  # RPM pwm
 
         self.curr_interrupt = ticks_us()
         self.prev_interrupt = ticks_us()
-        self.durations = []
+        self.durations = array("L", [0] * RING_SIZE)
+        self.head = 0
+        self.count = 0
+        self.total = 0
 
         self.RPM_ESTIMATE = 0
         self.factor = factor
+        self.rpm_num = 1000000 * factor  # RPM = rpm_num * count / total
 
         self.n_repeats = 1
         self.duty = 50
 
+        # Hard IRQ capture: the handler only timestamps edges,
+        # the estimate is computed in batches by a scheduled callback
+        self.hard = hard
+        self.edges = array("L", [0] * EDGE_BUFFER_SIZE)
+        self.edge_head = 0  # Written by the hard IRQ only
+        self.edge_tail = 0  # Written by the scheduled callback only
+        self.pending = False
+        self.overruns = 0
+        self.jitter = 0  # Period spread within the last batch [us]
+        # Bound methods allocate, create them once outside the IRQ
+        self.capture_ref = self.capture
+        self.process_ref = self.process
+
         self.timeout = False
-        self.timeout_max = 1000
+        self.timeout_periods = TIMEOUT_PERIODS
+        self.timeout_max = TIMEOUT_MAX
 
         self.timer = Timer()
 
@@ -37,14 +73,20 @@ class RPM:
             self.start()
 
     def start(self):
-        self.pwm.irq(
-            trigger=Pin.IRQ_FALLING,
-            handler=self.estimate,
-            # priority=2,
-            # hard=True,
-        )
+        if self.hard:
+            self.pwm.irq(
+                trigger=Pin.IRQ_FALLING,
+                handler=self.capture_ref,
+                hard=True,
+            )
+        else:
+            self.pwm.irq(
+                trigger=Pin.IRQ_FALLING,
+                handler=self.estimate,
+                # priority=2,
+            )
         self.timer.init(
-            freq=(1 / 1),
+            freq=TIMEOUT_FREQ,
             mode=Timer.PERIODIC,
             callback=self.set_timeout,
         )
@@ -56,7 +98,11 @@ class RPM:
     def reset(self):
         self.curr_interrupt = ticks_us()
         self.prev_interrupt = ticks_us()
-        self.durations = []
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        self.edge_tail = self.edge_head
+        self.jitter = 0
 
         self.RPM_ESTIMATE = 0
         self.duty = 50
@@ -67,31 +113,120 @@ class RPM:
         self.start()
 
     def estimate(self, _):
-
+        # Runs in the pin IRQ: integer arithmetic only, no allocations
         self.curr_interrupt = ticks_us()
-        cycle_duration = self.curr_interrupt - self.prev_interrupt
+        if self.timeout:  # First edge after a stall has no valid period
+            self.timeout = False
+        else:
+            self.push(ticks_diff(self.curr_interrupt, self.prev_interrupt))
+            self.update_estimate()
         self.prev_interrupt = self.curr_interrupt
 
-        if len(self.durations) > self.n_repeats:
-            self.durations.pop(0)
-        self.durations.append(cycle_duration)
-        duration_avg = sum(self.durations) / len(self.durations)
-
-        freq = 1000000 / duration_avg
-
-        repeat_factor = ((50 - 20) / (1500 - 150)) * freq + (  # y = mx + q
-            50 - ((50 - 20) / (1500 - 150) * 1500)  # magic numbers
-        )
-        self.n_repeats = (
-            int(freq / repeat_factor) if int(freq / repeat_factor) != 0 else 1
-        )
-
-        self.RPM_ESTIMATE = freq * self.factor
+    def capture(self, _):
+        # Runs in the hard IRQ: store the timestamp and defer the maths
+        head = self.edge_head
+        if (head - self.edge_tail) & EDGE_INDEX_MASK >= EDGE_BUFFER_SIZE:
+            self.overruns += 1
+            return
+        self.edges[head & EDGE_MASK] = ticks_us()
+        self.edge_head = (head + 1) & EDGE_INDEX_MASK
+
+        if not self.pending:
+            self.pending = True
+            try:
+                schedule(self.process_ref, 0)
+            except RuntimeError:  # Schedule queue full, retry on next edge
+                self.pending = False
+
+    def process(self, _):
+        self.pending = False
+
+        head = self.edge_head
+        tail = self.edge_tail
+        if head == tail:
+            return
+
+        edges = self.edges
+        prev = self.prev_interrupt
+        shortest = longest = -1
+        while tail != head:
+            curr = edges[tail & EDGE_MASK]
+            tail = (tail + 1) & EDGE_INDEX_MASK
+            if self.timeout:  # First edge after a stall has no valid period
+                self.timeout = False
+                prev = curr
+                continue
+
+            cycle_duration = ticks_diff(curr, prev)
+            prev = curr
+
+            self.push(cycle_duration)
+            if shortest < 0 or cycle_duration < shortest:
+                shortest = cycle_duration
+            if cycle_duration > longest:
+                longest = cycle_duration
+
+        self.edge_tail = tail
+        self.prev_interrupt = prev
+        self.curr_interrupt = prev
+        self.jitter = longest - shortest
+
+        self.update_estimate()
+
+    def push(self, cycle_duration):
+        durations = self.durations
+        head = (self.head + 1) & RING_MASK
+        durations[head] = cycle_duration
+        self.head = head
+        self.total += cycle_duration
+        self.count += 1
+
+        # Keep the running sum over the last n_repeats + 1 cycles
+        while self.count > self.n_repeats + 1:
+            self.total -= durations[(head - self.count + 1) & RING_MASK]
+            self.count -= 1
+
+    def update_estimate(self):
+        count = self.count
+        total = self.total
+        if total <= 0:
+            return
+
+        # freq = 1e6 * count / total
+        # repeat_factor = m * freq + q, m = (50 - 20) / (1500 - 150), q = 50 - m * 1500
+        # n_repeats = freq / repeat_factor = 45 * freq / (freq + 750)
+        # Numerator and denominator scaled by 1 / 250 to stay within small ints
+        n_repeats = (180000 * count) // (4000 * count + 3 * total)
+        self.n_repeats = n_repeats if n_repeats != 0 else 1
+
+        self.RPM_ESTIMATE = (self.rpm_num * count) // total
 
     def set_timeout(self, _):
-        if ticks_us() - self.curr_interrupt > self.timeout_max:
-            self.stop()
+        if self.timeout:
+            return
+
+        elapsed = ticks_diff(ticks_us(), self.curr_interrupt)
+
+        # Allow a few missed periods before considering the engine slowing down
+        threshold = TIMEOUT_MIN
+        if self.count > 0:
+            threshold = max(threshold, self.timeout_periods * self.total // self.count)
+        if elapsed <= threshold:
+            return
+
+        if elapsed > self.timeout_max:
+            self.count = 0
+            self.total = 0
+            self.n_repeats = 1
+            self.jitter = 0
+            self.RPM_ESTIMATE = 0
             self.timeout = True
+            return
+
+        # No edge for `elapsed` us: the engine cannot be spinning faster than this
+        upper_bound = self.rpm_num // elapsed
+        if upper_bound < self.RPM_ESTIMATE:
+            self.RPM_ESTIMATE = upper_bound
 
     def __enter__(self):
         return self
@@ -111,13 +246,10 @@ if __name__ == "__main__":
     rpm = RPM(pin=pin, factor=PWM2RPM_FACTOR, autostart=True)
 
     while True:
-        if not rpm.timeout and rpm.RPM_ESTIMATE > 0:
+        if not rpm.timeout:
             print(rpm.n_repeats, rpm.RPM_ESTIMATE)
         else:
-            # rpm.stop()
             print("TIMEOUT", rpm.RPM_ESTIMATE)
             sleep(0.5)
-            rpm.reset()
-            # rpm.start()
 
         sleep(0.02)
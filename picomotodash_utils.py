@@ -67,7 +67,7 @@ def read_builtin_temp(adc):
 
 
 def read_gps(gps):
-    gps.update_gps(verbose=False)
+    gps.update_gps(verbose=False, bulk=True)
 
 
 def read_mpu(mpu):
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Host test harness: the stubs in tests/stubs stand in for the MicroPython
+modules, time only moves when a test advances utime.
+"""
+
+import os
+import sys
+
+import pytest
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+
+for path in (os.path.join(_ROOT, "lib"), _ROOT, os.path.join(_HERE, "stubs")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import micropython  # noqa: E402
+import utime  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def host_runtime():
+    utime.reset()
+    micropython.reset()
+    yield
+    micropython.reset()
+
+
+@pytest.fixture
+def sensor(tmp_path, monkeypatch):
+    """Fresh fake MPU-9250 and AK8963, no calibration file to start with."""
+    import fake_mpu9250
+
+    monkeypatch.chdir(tmp_path)
+    return fake_mpu9250.attach()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""DS18B20 devices for the fake onewire bus of the host tests.
+
+Conversions take the datasheet time of the configured resolution on the
+utime clock, to the microsecond, the scratchpad keeps the previous reading
+until then.
+"""
+
+import utime
+from onewire import OneWire, _crc8
+
+_CONVERT = 0x44
+_RD_SCRATCH = 0xBE
+_WR_SCRATCH = 0x4E
+
+POWER_ON_RAW = 0x0550  # 85 C
+
+
+def rom(serial, family=0x28):
+    data = bytearray([family]) + bytearray(serial.to_bytes(6, "little"))
+    return bytes(data + bytearray([_crc8(data)]))
+
+
+class FakeDS18B20:
+    def __init__(self, serial, temperature=20.0):
+        self.rom = rom(serial)
+        self.temperature = temperature
+        self.th = 0x4B
+        self.tl = 0x46
+        self.config = 0x7F  # 12 bits after power-on
+        self.raw = POWER_ON_RAW
+        self.command = None
+        self.data = bytearray()
+        self.read_pos = 0
+        self.done_us = None
+        self.pending_raw = 0
+        self.conversions = 0
+        self.config_writes = 0
+        self.crc_errors = 0  # Reads to corrupt
+
+    @property
+    def resolution(self):
+        return 9 + ((self.config >> 5) & 3)
+
+    def conversion_us(self):
+        # 750 ms at 12 bits down to 93.75 ms at 9 bits
+        return 750000 >> (12 - self.resolution)
+
+    def finish(self):
+        if self.done_us is not None and utime.ticks_us() >= self.done_us:
+            self.raw = self.pending_raw
+            self.done_us = None
+
+    def scratchpad(self):
+        self.finish()
+        data = bytearray(
+            [
+                self.raw & 0xFF,
+                (self.raw >> 8) & 0xFF,
+                self.th,
+                self.tl,
+                self.config,
+                0xFF,
+                0x0C,
+                0x10,
+            ]
+        )
+        return data + bytearray([_crc8(data)])
+
+    def reset(self):
+        self.finish()
+        self.command = None
+
+    def write(self, value):
+        if self.command is None:
+            self.command = value
+            if value == _CONVERT:
+                # Undefined low bits read as zero
+                raw = int(round(self.temperature * 16)) & 0xFFFF
+                raw &= ~((1 << (12 - self.resolution)) - 1)
+                self.pending_raw = raw
+                self.done_us = utime.ticks_us() + self.conversion_us()
+                self.conversions += 1
+            elif value == _RD_SCRATCH:
+                self.data = self.scratchpad()
+                if self.crc_errors:
+                    self.crc_errors -= 1
+                    self.data[0] ^= 0x01
+                self.read_pos = 0
+            elif value == _WR_SCRATCH:
+                self.data = bytearray()
+            return
+
+        if self.command == _WR_SCRATCH:
+            self.data.append(value)
+            if len(self.data) == 3:
+                self.th, self.tl, self.config = self.data
+                self.config_writes += 1
+
+    def read(self):
+        if self.command != _RD_SCRATCH or self.read_pos >= len(self.data):
+            return 0xFF
+        value = self.data[self.read_pos]
+        self.read_pos += 1
+        return value
+
+
+def attach(*devices):
+    """Put `devices` on every onewire bus, in ROM search order."""
+    OneWire.devices = list(devices)
+    return OneWire.devices
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""L76X output for the host tests: NMEA sentences with valid checksums, a
+canned ride in the receiver's default sentence set and a receiver answering
+the configuration commands.
+"""
+
+from math import cos, degrees, radians
+
+import utime
+
+KNOTS2KPH = 1.852
+EARTH_RADIUS = 6371000  # m
+
+# Start of the canned ride, 37 51.65 S 145 07.36 E
+START_LATITUDE = -37.860833
+START_LONGITUDE = 145.122667
+
+
+def nmea(body):
+    crc = 0
+    for char in body.encode():
+        crc ^= char
+    return b"$%s*%02X\r\n" % (body.encode(), crc)
+
+
+# Satellites in view, sent as is every epoch
+GSA = nmea("GNGSA,A,3,04,05,09,12,24,25,29,31,,,,,1.6,0.9,1.3")
+GSV = (
+    nmea("GPGSV,3,1,11,04,40,083,46,05,17,308,41,09,07,344,39,12,22,228,45"),
+    nmea("GPGSV,3,2,11,24,62,144,47,25,33,051,44,29,12,199,38,31,48,270,46"),
+    nmea("GPGSV,3,3,11,02,05,023,,10,03,160,,18,01,310,"),
+)
+
+
+def nmea_time(seconds):
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return "%02d%02d%05.2f" % (hours, minutes, seconds)
+
+
+def nmea_coord(value, degree_digits):
+    minutes = abs(value) * 60
+    degrees, minutes = divmod(minutes, 60)
+    return "%0*d%07.4f" % (degree_digits, degrees, minutes)
+
+
+def position(latitude, longitude):
+    return "%s,%s,%s,%s" % (
+        nmea_coord(latitude, 2),
+        "S" if latitude < 0 else "N",
+        nmea_coord(longitude, 3),
+        "W" if longitude < 0 else "E",
+    )
+
+
+def rmc(
+    time,
+    status="A",
+    knots="010.0",
+    course="090.0",
+    latitude=START_LATITUDE,
+    longitude=START_LONGITUDE,
+    talker="GP",
+):
+    return nmea(
+        "%sRMC,%s,%s,%s,%s,%s,130998,,,A"
+        % (talker, time, status, position(latitude, longitude), knots, course)
+    )
+
+
+def gga(
+    time,
+    fix_stat=1,
+    satellites=8,
+    altitude="12.5",
+    hdop="0.9",
+    latitude=START_LATITUDE,
+    longitude=START_LONGITUDE,
+    talker="GP",
+):
+    return nmea(
+        "%sGGA,%s,%s,%d,%02d,%s,%s,M,-34.0,M,,"
+        % (
+            talker,
+            time,
+            position(latitude, longitude),
+            fix_stat,
+            satellites,
+            hdop,
+            altitude,
+        )
+    )
+
+
+def vtg(course="090.0", knots="010.0", kph="018.5", talker="GP"):
+    return nmea("%sVTG,%s,T,,M,%s,N,%s,K,A" % (talker, course, knots, kph))
+
+
+def ride(epochs, interval_s=1.0, start_s=12 * 3600, kph=54.0, rmc_gga_only=False):
+    """Epochs of a ride heading east at `kph`, as [(fix_time, sentences)].
+    The default sentence set is RMC, VTG, GGA, GSA, 3 GSV and GLL."""
+    log = []
+    latitude = START_LATITUDE
+    longitude = START_LONGITUDE
+    step = kph / 3.6 * interval_s / (EARTH_RADIUS * cos(radians(latitude)))
+    knots = "%05.1f" % (kph / KNOTS2KPH)
+    for epoch in range(epochs):
+        fix_time = start_s + epoch * interval_s
+        time = nmea_time(fix_time)
+        longitude = START_LONGITUDE + degrees(epoch * step)
+        sentences = [
+            rmc(time, knots=knots, longitude=longitude, talker="GN"),
+            gga(time, satellites=9, longitude=longitude, talker="GN"),
+        ]
+        if not rmc_gga_only:
+            sentences[1:1] = [vtg(knots=knots, kph="%05.1f" % kph, talker="GN")]
+            sentences += [GSA, *GSV]
+            sentences.append(
+                nmea("GNGLL,%s,%s,A,A" % (position(latitude, longitude), time))
+            )
+        log.append((round(fix_time, 2), sentences))
+    return log
+
+
+class FakeL76X:
+    """L76X receiver on the utime clock. Acknowledges PMTK commands with
+    $PMTK001,<cmd>,3, switches rate on PMTK251 without an ack and sends one
+    epoch of ride() every fix interval. Commands sent at another baud rate
+    are not understood and its output arrives garbled, a silent receiver
+    never answers.
+    """
+
+    def __init__(self, baudrate=9600, baudrates=(9600, 115200), silent=False):
+        self.baudrate = baudrate
+        self.baudrates = baudrates  # Rates PMTK251 can switch to
+        self.silent = silent
+        self.fix_interval_ms = 1000
+        self.rmc_gga_only = False
+        self.commands = []
+        self.pending = []  # (data, baud rate it was sent at)
+        self.fix_s = 12 * 3600
+        self.next_epoch_us = utime.ticks_us() + self.fix_interval_ms * 1000
+
+    def command(self, command, baudrate):
+        self.commands.append(command)
+        if self.silent or baudrate != self.baudrate:
+            return
+
+        name, _, args = command[1:].partition(",")
+        if name == "PMTK251":
+            if int(args) in self.baudrates:
+                self.baudrate = int(args)
+            return
+        if name == "PMTK220":
+            self.fix_interval_ms = int(args)
+            next_epoch_us = utime.ticks_us() + self.fix_interval_ms * 1000
+            self.next_epoch_us = min(self.next_epoch_us, next_epoch_us)
+        elif name == "PMTK314":
+            self.rmc_gga_only = args.startswith("0,1,0,1,0,0")
+        elif name != "PMTK255":
+            self.send(nmea("PMTK001,%s,1" % name[4:]))  # Invalid command
+            return
+        self.send(nmea("PMTK001,%s,3" % name[4:]))
+
+    def send(self, data):
+        self.pending.append((data, self.baudrate))
+
+    def transmit(self, baudrate):
+        """Everything sent up to now, as read by a UART at `baudrate`."""
+        while not self.silent and utime.ticks_us() >= self.next_epoch_us:
+            interval_s = self.fix_interval_ms / 1000
+            _, sentences = ride(
+                1, start_s=self.fix_s, rmc_gga_only=self.rmc_gga_only
+            )[0]
+            self.send(b"".join(sentences))
+            self.fix_s += interval_s
+            self.next_epoch_us += self.fix_interval_ms * 1000
+
+        data = bytearray()
+        for chunk, sent_at in self.pending:
+            if sent_at == baudrate:
+                data += chunk
+            else:
+                data += bytes(0x80 | char for char in chunk)  # Framing errors
+        self.pending = []
+        return data
+
+
+def attach(receiver):
+    """Answer the commands and feed the UART of every new GPS with
+    `receiver`, None restores the plain ser.data feed."""
+    from L76 import l76x
+
+    l76x.L76X.receiver = receiver
+    return receiver
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Register-level MPU-9250 and AK8963 for the host tests.
+
+Only the registers used by lib/mpu6500.py, lib/mpu9250.py and lib/ak8963.py
+are modelled: sensor data, the FIFO with its overflow flag, INT_STATUS read
+to clear and the I2C master copying the AK8963 into EXT_SENS_DATA.
+"""
+
+import struct
+
+MPU_ADDRESS = 0x68
+AK_ADDRESS = 0x0C
+
+_CONFIG = 0x1A
+_ACCEL_CONFIG = 0x1C
+_GYRO_CONFIG = 0x1B
+_FIFO_EN = 0x23
+_I2C_SLV0_REG = 0x26
+_I2C_SLV0_CTRL = 0x27
+_INT_STATUS = 0x3A
+_ACCEL_XOUT_H = 0x3B
+_GYRO_XOUT_H = 0x43
+_EXT_SENS_DATA_00 = 0x49
+_USER_CTRL = 0x6A
+_PWR_MGMT_1 = 0x6B
+_FIFO_COUNTH = 0x72
+_FIFO_R_W = 0x74
+_WHO_AM_I = 0x75
+
+_CONFIG_FIFO_MODE_STOP = 0x40
+_FIFO_EN_GYRO_ACCEL = 0x78
+_USER_CTRL_FIFO_EN = 0x40
+_USER_CTRL_I2C_MST_EN = 0x20
+_USER_CTRL_FIFO_RST = 0x04
+_INT_STATUS_FIFO_OFLOW = 0x10
+
+FIFO_SIZE = 512
+FRAME_LEN = 12
+
+_ACCEL_SO = (16384, 8192, 4096, 2048)  # LSB/g per ACCEL_FS_SEL
+_GYRO_SO = (131, 65.5, 32.8, 16.4)  # LSB/(deg/s) per GYRO_FS_SEL
+
+_AK_WIA = 0x00
+_AK_HXL = 0x03
+_AK_ST2 = 0x09
+_AK_ASAX = 0x10
+_AK_ST2_HOFL = 0x08
+_AK_ST2_BITM = 0x10
+AK_SO = 0.15  # uT/LSB, 16 bit output
+
+
+def _clamp16(value):
+    return max(-32768, min(32767, int(round(value))))
+
+
+class FakeAK8963:
+    def __init__(self, adjustment=(128, 128, 128)):
+        self.regs = bytearray(0x13)
+        self.regs[_AK_WIA] = 0x48
+        self.regs[_AK_ASAX : _AK_ASAX + 3] = bytes(adjustment)
+        self.field = (0.0, 0.0, 0.0)  # uT, before the sensitivity adjustment
+        self.fields = None  # Iterator of fields, one per read
+        self.overflow = False
+
+    def refresh(self):
+        if self.fields is not None:
+            self.field = next(self.fields)
+        raw = [_clamp16(value / AK_SO) for value in self.field]
+        struct.pack_into("<hhh", self.regs, _AK_HXL, *raw)
+        st2 = _AK_ST2_BITM
+        if self.overflow:
+            st2 |= _AK_ST2_HOFL
+        self.regs[_AK_ST2] = st2
+
+    def read_into(self, reg, buf):
+        self.refresh()
+        buf[:] = self.regs[reg : reg + len(buf)]
+
+    def write(self, reg, data):
+        self.regs[reg : reg + len(data)] = data
+
+
+class FakeMPU9250:
+    def __init__(self, ak8963=None):
+        self.ak8963 = ak8963
+        self.accel = (0.0, 0.0, 1.0)  # g
+        self.gyro = (0.0, 0.0, 0.0)  # deg/s
+        self.samples = 0
+        self.reset()
+
+    def reset(self):
+        # PWR_MGMT_1 device reset, the motion is left alone
+        self.regs = bytearray(0x80)
+        self.regs[_WHO_AM_I] = 0x71
+        self.fifo = bytearray()
+
+    @property
+    def accel_so(self):
+        return _ACCEL_SO[(self.regs[_ACCEL_CONFIG] >> 3) & 3]
+
+    @property
+    def gyro_so(self):
+        return _GYRO_SO[(self.regs[_GYRO_CONFIG] >> 3) & 3]
+
+    def outputs(self):
+        accel = [_clamp16(value * self.accel_so) for value in self.accel]
+        gyro = [_clamp16(value * self.gyro_so) for value in self.gyro]
+        return accel, gyro
+
+    def sample(self, accel=None, gyro=None):
+        """One new sample, queued in the FIFO when enabled. A full FIFO
+        raises the overflow flag and either drops the sample (FIFO_MODE
+        stop) or overwrites the oldest bytes. The output registers always
+        follow the current motion."""
+        if accel is not None:
+            self.accel = accel
+        if gyro is not None:
+            self.gyro = gyro
+        self.samples += 1
+
+        regs = self.regs
+        accel, gyro = self.outputs()
+        if not (
+            regs[_USER_CTRL] & _USER_CTRL_FIFO_EN
+            and regs[_FIFO_EN] & _FIFO_EN_GYRO_ACCEL == _FIFO_EN_GYRO_ACCEL
+        ):
+            return
+
+        frame = struct.pack(">hhhhhh", *accel, *gyro)
+        if len(self.fifo) + FRAME_LEN > FIFO_SIZE:
+            regs[_INT_STATUS] |= _INT_STATUS_FIFO_OFLOW
+            if regs[_CONFIG] & _CONFIG_FIFO_MODE_STOP:
+                return
+            self.fifo += frame
+            del self.fifo[: len(self.fifo) - FIFO_SIZE]
+        else:
+            self.fifo += frame
+
+    def run(self, samples):
+        for accel, gyro in samples:
+            self.sample(accel, gyro)
+
+    def refresh(self):
+        regs = self.regs
+        accel, gyro = self.outputs()
+        struct.pack_into(">hhh", regs, _ACCEL_XOUT_H, *accel)
+        struct.pack_into(">hhh", regs, _GYRO_XOUT_H, *gyro)
+        struct.pack_into(">H", regs, _FIFO_COUNTH, len(self.fifo))
+
+        # I2C master slave 0 copies the AK8963 registers
+        ctrl = regs[_I2C_SLV0_CTRL]
+        if self.ak8963 is not None and regs[_USER_CTRL] & _USER_CTRL_I2C_MST_EN:
+            if ctrl & 0x80:
+                n = ctrl & 0x0F
+                self.ak8963.refresh()
+                start = regs[_I2C_SLV0_REG]
+                regs[_EXT_SENS_DATA_00 : _EXT_SENS_DATA_00 + n] = self.ak8963.regs[
+                    start : start + n
+                ]
+
+    def read_into(self, reg, buf):
+        n = len(buf)
+        if reg == _FIFO_R_W:
+            # Reading an empty FIFO returns 0xFF
+            data = self.fifo[:n] + b"\xff" * (n - len(self.fifo[:n]))
+            del self.fifo[:n]
+            buf[:] = data
+            return
+
+        self.refresh()
+        buf[:] = self.regs[reg : reg + n]
+        if reg <= _INT_STATUS < reg + n:
+            self.regs[_INT_STATUS] = 0  # Cleared on read
+
+    def write(self, reg, data):
+        for i, value in enumerate(data):
+            r = reg + i
+            if r == _PWR_MGMT_1 and value & 0x80:
+                self.reset()
+                continue
+            if r == _USER_CTRL and value & _USER_CTRL_FIFO_RST:
+                self.fifo = bytearray()
+                value &= ~_USER_CTRL_FIFO_RST
+            self.regs[r] = value
+
+
+def attach():
+    """Fresh MPU-9250 and AK8963 on every machine.I2C bus."""
+    from machine import I2C
+
+    ak8963 = FakeAK8963()
+    mpu = FakeMPU9250(ak8963)
+    I2C.devices = {MPU_ADDRESS: mpu, AK_ADDRESS: ak8963}
+    return mpu, ak8963
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""machine.UART stand-in on a Linux pty, for the receive IRQ tests.
+
+The test writes what the receiver sends with send(), the code under test
+reads the other end through any(), readinto() and read(). A handler
+registered with UART.IRQ_RXIDLE runs on a background thread once the line
+has been idle for IDLE_S after new data, as the RP2040 RX idle interrupt.
+"""
+
+import fcntl
+import os
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+
+IDLE_S = 0.002
+
+
+class PtyUART:
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo, no CR/LF translation
+        self.handler = None
+        self.trigger = 0
+        self.irqs = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.irq_line, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def send(self, data):
+        os.write(self.master, data)
+
+    def wait_received(self, n, timeout_s=1.0):
+        # Writes to the pty are not visible on the other end immediately
+        deadline = time.monotonic() + timeout_s
+        while self.any() < n:
+            if time.monotonic() > deadline:
+                raise TimeoutError("%d of %d bytes received" % (self.any(), n))
+            time.sleep(IDLE_S)
+
+    def irq(self, handler=None, trigger=0):
+        self.trigger = trigger
+        self.handler = handler
+
+    def irq_line(self):
+        while not self.closed:
+            if self.handler is None:
+                time.sleep(IDLE_S)
+                continue
+            readable, _, _ = select.select([self.slave], [], [], 0.01)
+            if not readable:
+                continue
+            # Wait until the line goes idle
+            count = self.any()
+            time.sleep(IDLE_S)
+            while self.any() != count:
+                count = self.any()
+                time.sleep(IDLE_S)
+            handler = self.handler
+            if handler is not None and count:
+                self.irqs += 1
+                handler(self)
+
+    def any(self):
+        data = fcntl.ioctl(self.slave, termios.FIONREAD, b"\0\0\0\0")
+        return struct.unpack("i", data)[0]
+
+    def readinto(self, buf):
+        n = min(len(buf), self.any())
+        if n == 0:
+            return None
+        data = os.read(self.slave, n)
+        buf[: len(data)] = data
+        return len(data)
+
+    def read(self, n):
+        n = min(n, self.any())
+        return os.read(self.slave, n) if n else b""
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for the Waveshare L76X driver, the receiver output is
+whatever a test appends to ser.data, or what L76X.receiver sends (see
+fake_l76x.FakeL76X).
+"""
+
+
+class FakeSerial:
+    def __init__(self):
+        self.data = bytearray()
+        self.handler = None
+        self.source = None  # Returns the bytes received since the last call
+
+    def irq(self, handler=None, trigger=0):
+        self.handler = handler
+
+    def pull(self):
+        if self.source is not None:
+            self.data += self.source()
+
+    def any(self):
+        self.pull()
+        return len(self.data)
+
+    def readinto(self, buf):
+        self.pull()
+        n = min(len(buf), len(self.data))
+        if n == 0:
+            return None
+        buf[:n] = self.data[:n]
+        del self.data[:n]
+        return n
+
+    def read(self, n):
+        self.pull()
+        data = bytes(self.data[:n])
+        del self.data[:n]
+        return data
+
+
+class L76X:
+    SET_SYNC_PPS_NMEA_ON = "$PMTK255,1"
+    receiver = None  # Answers commands when set
+
+    def __init__(self, uartx=0, _baudrate=9600):
+        self.ser = FakeSerial()
+        self.baudrate = _baudrate
+        self.commands = []
+        self.receiver = L76X.receiver
+        if self.receiver is not None:
+            self.ser.source = lambda: self.receiver.transmit(self.baudrate)
+
+    def l76x_exit_backup_mode(self):
+        pass
+
+    def l76x_send_command(self, command):
+        self.commands.append(command)
+        if self.receiver is not None:
+            self.receiver.command(command, self.baudrate)
+
+    def l76x_set_baudrate(self, baudrate):
+        self.baudrate = baudrate
+
+    def uart_any(self):
+        return self.ser.any()
+
+    def uart_receive_byte(self):
+        return self.ser.read(1)
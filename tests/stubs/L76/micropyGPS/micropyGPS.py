@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for MicropyGPS: the same update() per character and the
+same attributes for the RMC, GGA and VTG sentences the dashboards use,
+string based like the original. Used by the lean=False path and as the
+reference of the lean parser in the tests.
+"""
+
+
+class MicropyGPS:
+    SUPPORTED_SENTENCES = ("RMC", "GGA", "VTG", "GSA", "GSV", "GLL")
+
+    def __init__(self, local_offset=0, location_formatting="ddm"):
+        self.local_offset = local_offset
+        self.coord_format = location_formatting
+
+        self.sentence_active = False
+        self.active_segment = 0
+        self.process_crc = False
+        self.gps_segments = []
+        self.crc_xor = 0
+        self.char_count = 0
+
+        self.clean_sentences = 0
+        self.parsed_sentences = 0
+        self.crc_fails = 0
+
+        self.timestamp = [0, 0, 0.0]
+        self._latitude = [0, 0.0, "N"]
+        self._longitude = [0, 0.0, "W"]
+        self.speed = [0.0, 0.0, 0.0]
+        self.course = 0.0
+        self.altitude = 0.0
+        self.geoid_height = 0.0
+        self.satellites_in_use = 0
+        self.hdop = 0.0
+        self.fix_stat = 0
+        self.valid = False
+
+    @property
+    def latitude(self):
+        if self.coord_format == "dd":
+            degrees = self._latitude[0] + self._latitude[1] / 60
+            return [degrees, self._latitude[2]]
+        return self._latitude
+
+    @property
+    def longitude(self):
+        if self.coord_format == "dd":
+            degrees = self._longitude[0] + self._longitude[1] / 60
+            return [degrees, self._longitude[2]]
+        return self._longitude
+
+    def new_sentence(self):
+        self.gps_segments = [""]
+        self.active_segment = 0
+        self.crc_xor = 0
+        self.sentence_active = True
+        self.process_crc = True
+        self.char_count = 0
+
+    def update(self, new_char):
+        """Feed one character, returns the sentence type once a valid
+        sentence has been parsed, None otherwise."""
+        valid_sentence = False
+        ascii_char = ord(new_char)
+        if not 10 <= ascii_char <= 126:
+            return None
+
+        self.char_count += 1
+        if new_char == "$":
+            self.new_sentence()
+            return None
+        if not self.sentence_active:
+            return None
+
+        if new_char == "*":
+            self.process_crc = False
+            self.active_segment += 1
+            self.gps_segments.append("")
+            return None
+        if new_char == ",":
+            self.active_segment += 1
+            self.gps_segments.append("")
+        else:
+            self.gps_segments[self.active_segment] += new_char
+            if not self.process_crc and len(self.gps_segments[-1]) == 2:
+                try:
+                    final_crc = int(self.gps_segments[-1], 16)
+                    valid_sentence = self.crc_xor == final_crc
+                    if not valid_sentence:
+                        self.crc_fails += 1
+                except ValueError:
+                    pass
+
+        if self.process_crc:
+            self.crc_xor ^= ascii_char
+
+        if valid_sentence:
+            self.clean_sentences += 1
+            self.sentence_active = False
+            sentence_type = self.gps_segments[0]
+            parser = getattr(self, "parse_" + sentence_type[2:].lower(), None)
+            if sentence_type[2:] in self.SUPPORTED_SENTENCES and parser:
+                if parser():
+                    self.parsed_sentences += 1
+                    return sentence_type
+
+        if self.char_count > 90:
+            self.sentence_active = False
+        return None
+
+    def parse_time(self, utc_string):
+        if utc_string:
+            hours = (int(utc_string[0:2]) + self.local_offset) % 24
+            minutes = int(utc_string[2:4])
+            seconds = float(utc_string[4:])
+            self.timestamp = [hours, minutes, seconds]
+
+    def parse_position(self, first):
+        segments = self.gps_segments
+        l_string = segments[first]
+        if not l_string:
+            return False
+        self._latitude = [
+            int(l_string[0:2]),
+            float(l_string[2:]),
+            segments[first + 1],
+        ]
+        l_string = segments[first + 2]
+        self._longitude = [
+            int(l_string[0:3]),
+            float(l_string[3:]),
+            segments[first + 3],
+        ]
+        return True
+
+    def parse_rmc(self):
+        segments = self.gps_segments
+        try:
+            self.parse_time(segments[1])
+        except ValueError:
+            return False
+
+        if segments[2] != "A":
+            self.valid = False
+            return True
+
+        try:
+            self.parse_position(3)
+            knots = float(segments[7])
+            self.speed = [knots, knots * 1.151, knots * 1.852]
+            if segments[8]:
+                self.course = float(segments[8])
+        except (ValueError, IndexError):
+            return False
+        self.valid = True
+        return True
+
+    def parse_gga(self):
+        segments = self.gps_segments
+        try:
+            self.parse_time(segments[1])
+            fix_stat = int(segments[6])
+        except ValueError:
+            return False
+
+        if fix_stat:
+            try:
+                self.parse_position(2)
+                self.satellites_in_use = int(segments[7])
+                self.hdop = float(segments[8])
+                self.altitude = float(segments[9])
+                self.geoid_height = float(segments[11])
+            except (ValueError, IndexError):
+                return False
+        self.fix_stat = fix_stat
+        return True
+
+    def parse_vtg(self):
+        segments = self.gps_segments
+        try:
+            if segments[1]:
+                self.course = float(segments[1])
+            knots = float(segments[5])
+        except (ValueError, IndexError):
+            return False
+        self.speed = [knots, knots * 1.151, knots * 1.852]
+        return True
+
+    def parse_gsa(self):
+        return True
+
+    def parse_gsv(self):
+        return True
+
+    def parse_gll(self):
+        return True
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for machine, only what the dashboard modules touch."""
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=IN, pull=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.level = 0
+        self.handler = None
+        self.hard = False
+
+    def irq(self, handler=None, trigger=IRQ_FALLING, hard=False):
+        self.handler = handler
+        self.hard = hard
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.level = level
+
+
+class Timer:
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, id=-1):
+        self.mode = None
+        self.freq = None
+        self.period = None
+        self.callback = None
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None):
+        self.mode = mode
+        self.freq = freq
+        self.period = period
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
+
+
+class UART:
+    def __init__(self, id, baudrate=9600, tx=None, rx=None):
+        self.id = id
+        self.baudrate = baudrate
+        self.handler = None
+
+    def irq(self, handler=None, trigger=0):
+        self.handler = handler
+
+
+class I2C:
+    """Register-level bus, fake devices are attached by address in
+    I2C.devices before the driver under test is created."""
+
+    devices = {}
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.devices = I2C.devices
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def device(self, addr):
+        device = self.devices.get(addr)
+        if device is None:
+            raise OSError(5)  # EIO, nothing acknowledged the address
+        return device
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        self.device(addr).read_into(memaddr, buf)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.device(addr).write(memaddr, bytes(buf))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for micropython, scheduled callbacks run on run_scheduled()."""
+
+SCHEDULE_DEPTH = 8  # Same as the rp2 port
+
+_queue = []
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+viper = native
+
+
+def schedule(func, arg):
+    if len(_queue) >= SCHEDULE_DEPTH:
+        raise RuntimeError("schedule queue full")
+    _queue.append((func, arg))
+
+
+def run_scheduled():
+    while _queue:
+        func, arg = _queue.pop(0)
+        func(arg)
+
+
+def reset():
+    del _queue[:]
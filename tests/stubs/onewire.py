@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for onewire, a bus of fake devices at command level.
+
+Devices are attached to OneWire.devices before the driver is created, see
+tests/fake_ds18x20.py. ROM commands select devices, function commands and
+data bytes are then passed to the selected ones.
+"""
+
+
+class OneWireError(Exception):
+    pass
+
+
+def _crc8(data):
+    # Dallas/Maxim CRC-8, x^8 + x^5 + x^4 + 1
+    crc = 0
+    for byte in data:
+        for _ in range(8):
+            mix = (crc ^ byte) & 1
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+
+class OneWire:
+    SEARCH_ROM = 0xF0
+    MATCH_ROM = 0x55
+    SKIP_ROM = 0xCC
+
+    devices = []
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.selected = []
+        self.rom_command = None
+        self.match = bytearray()
+        self.resets = 0
+
+    def reset(self, required=False):
+        self.resets += 1
+        present = bool(OneWire.devices)
+        if required and not present:
+            raise OneWireError
+        for device in OneWire.devices:
+            device.reset()
+        self.selected = []
+        self.rom_command = None
+        self.match = bytearray()
+        return present
+
+    def writebyte(self, value):
+        if self.rom_command is None:
+            self.rom_command = value
+            if value == self.SKIP_ROM:
+                self.selected = list(OneWire.devices)
+            return
+
+        if self.rom_command == self.MATCH_ROM and len(self.match) < 8:
+            self.match.append(value)
+            if len(self.match) == 8:
+                self.selected = [
+                    d for d in OneWire.devices if bytes(d.rom) == bytes(self.match)
+                ]
+            return
+
+        for device in self.selected:
+            device.write(value)
+
+    def write(self, buf):
+        for value in buf:
+            self.writebyte(value)
+
+    def readbyte(self):
+        # Open drain bus: the line reads 1 unless a device pulls it low
+        value = 0xFF
+        for device in self.selected:
+            value &= device.read()
+        return value
+
+    def readinto(self, buf):
+        for i in range(len(buf)):
+            buf[i] = self.readbyte()
+
+    def select_rom(self, rom):
+        self.reset()
+        self.writebyte(self.MATCH_ROM)
+        self.write(rom)
+
+    def scan(self):
+        return [bytearray(device.rom) for device in OneWire.devices]
+
+    def crc8(self, data):
+        return _crc8(data)
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for ubinascii."""
+
+from binascii import hexlify, unhexlify  # noqa: F401
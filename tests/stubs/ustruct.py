@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for ustruct, packing truncates out of range integers as
+MicroPython does instead of raising."""
+
+import struct
+from struct import calcsize, error, pack, unpack, unpack_from  # noqa: F401
+
+_MASKS = {"b": 0xFF, "h": 0xFFFF, "i": 0xFFFFFFFF, "l": 0xFFFFFFFF}
+
+
+def pack_into(fmt, buffer, offset, *values):
+    order = fmt[0] if fmt[0] in "<>!=@" else ""
+    codes = fmt[len(order) :]
+    if len(codes) == len(values):
+        values = [
+            value & _MASKS[code.lower()] if code.lower() in _MASKS else value
+            for code, value in zip(codes, values)
+        ]
+        fmt = order + "".join(
+            code.upper() if code.lower() in _MASKS else code for code in codes
+        )
+    struct.pack_into(fmt, buffer, offset, *values)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Host stand-in for utime, the clock only advances when told to."""
+
+_now_us = 0
+
+
+def reset(us=0):
+    global _now_us
+    _now_us = us
+
+
+def advance_us(us):
+    global _now_us
+    _now_us += us
+
+
+def advance_ms(ms):
+    advance_us(ms * 1000)
+
+
+def ticks_us():
+    return _now_us
+
+
+def ticks_ms():
+    return _now_us // 1000
+
+
+def ticks_diff(ticks1, ticks2):
+    return ticks1 - ticks2
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def sleep_us(us):
+    advance_us(us)
+
+
+def sleep_ms(ms):
+    advance_us(ms * 1000)
+
+
+def sleep(s):
+    advance_us(int(s * 1000000))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""DS18X20 scheduling and hot-plug on a fake 1-Wire bus."""
+
+from math import isnan
+
+import pytest
+
+import fake_ds18x20
+import picomotodash_ds18x20
+import utime
+from fake_ds18x20 import FakeDS18B20
+from picomotodash_ds18x20 import DS18X20, conversion_ms, rom_id
+
+
+def run(ds, ms, step=50):
+    for _ in range(ms // step):
+        utime.advance_ms(step)
+        ds.update_roms()
+        ds.update_temps()
+
+
+@pytest.fixture
+def sensors():
+    return fake_ds18x20.attach(
+        FakeDS18B20(1, 21.0), FakeDS18B20(2, 35.5), FakeDS18B20(3, 90.25)
+    )
+
+
+@pytest.mark.parametrize(
+    "resolution, datasheet_ms", [(9, 93.75), (10, 187.5), (11, 375), (12, 750)]
+)
+def test_conversion_time_is_never_short(resolution, datasheet_ms):
+    # ticks_ms() may have been about to tick when the conversion started
+    assert conversion_ms(resolution) - 1 >= datasheet_ms
+    assert conversion_ms(resolution) <= datasheet_ms + 2
+
+
+@pytest.mark.parametrize("resolution", [9, 10, 11, 12])
+@pytest.mark.parametrize("rounded_down", [False, True])
+def test_first_read_gets_the_new_conversion(monkeypatch, resolution, rounded_down):
+    if rounded_down:
+        # The old 750 >> n reads 9 and 10 bit conversions early
+        monkeypatch.setattr(
+            picomotodash_ds18x20, "conversion_ms", lambda r: 750 >> (12 - r)
+        )
+    stale = rounded_down and resolution < 11
+    sensor = FakeDS18B20(1, 20.0)
+    fake_ds18x20.attach(sensor)
+    ds = DS18X20(pin=None, resolution=resolution)
+    # Read before the end of the conversion, the power-on value
+    assert ds.temperatures == [85.0 if stale else 20.0]
+
+    # Started late in a ticks_ms() tick, read at the earliest chance
+    sensor.temperature = 30.0
+    utime.advance_us(999)
+    ds.update_temps()
+    conversions = sensor.conversions
+    while sensor.conversions == conversions:
+        utime.advance_ms(1)
+        ds.update_temps()
+
+    assert ds.temperatures == [20.0 if stale else 30.0]
+
+
+def test_initial_blocking_read(sensors):
+    ds = DS18X20(pin=None)
+    assert ds.temperatures == [21.0, 35.5, 90.25]
+    assert ds.keys == [s.rom for s in sensors]
+
+
+def test_sensors_convert_on_their_own_schedule(sensors):
+    coolant, ambient, oil = sensors
+    profiles = {
+        rom_id(coolant.rom): (12, 2000),
+        rom_id(ambient.rom): (9, 10000),
+    }
+    ds = DS18X20(pin=None, profiles=profiles)
+    assert [s.resolution for s in sensors] == [12, 9, 11]
+
+    start = [s.conversions for s in sensors]
+    run(ds, 20000)
+    counts = [s.conversions - n for s, n in zip(sensors, start)]
+
+    assert counts[0] == pytest.approx(10, abs=1)
+    assert counts[1] == pytest.approx(2, abs=1)
+    # Period 0 converts again as soon as read, 375 ms at 11 bits
+    assert counts[2] == pytest.approx(20000 / 400, rel=0.1)
+
+    coolant.temperature = 80.0625
+    ambient.temperature = 24.6
+    oil.temperature = 101.3
+    run(ds, 12000)
+    assert ds.temperatures[0] == 80.0625
+    assert ds.temperatures[1] == 24.5  # 9 bits, 0.5 C steps
+    assert ds.temperatures[2] == 101.25  # 11 bits, 0.125 C steps
+
+
+def test_resolution_written_once_per_rom(sensors):
+    ds = DS18X20(pin=None, rescan_ms=500)
+    run(ds, 10000)
+
+    assert ds.scans > 10
+    assert [s.config_writes for s in sensors] == [1, 1, 1]
+
+
+def test_unplugged_middle_sensor_keeps_readings_with_their_rom(sensors):
+    first, middle, last = sensors
+    ds = DS18X20(pin=None)
+
+    fake_ds18x20.attach(first, last)
+    ds.update_roms(force=True)
+
+    assert ds.keys == [first.rom, last.rom]
+    assert ds.temperatures == [21.0, 90.25]
+
+
+def test_new_sensor_has_no_reading_until_converted(sensors):
+    ds = DS18X20(pin=None)
+
+    added = FakeDS18B20(4, -10.5)
+    fake_ds18x20.attach(*sensors, added)
+    ds.update_roms(force=True)
+    assert ds.keys[-1] == added.rom
+    assert isnan(ds.temperatures[-1])
+    assert added.config_writes == 1
+
+    run(ds, 1000)
+    assert ds.temperatures == [21.0, 35.5, 90.25, -10.5]
+
+
+def test_read_error_keeps_the_last_value_and_rescans(sensors):
+    ds = DS18X20(pin=None, rescan_ms=60000)
+    scans = ds.scans
+
+    sensors[1].crc_errors = 1
+    sensors[1].temperature = 50.0
+    run(ds, 500)
+
+    assert ds.read_errors == 1
+    assert ds.scans == scans + 1
+    assert ds.temperatures[1] == 35.5
+
+    run(ds, 1000)
+    assert ds.temperatures[1] == 50.0
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""picomotodash_fastmath error bounds and MPU(fast_trig=True).
+
+The MPU comparison prints its worst difference, run pytest with -s to see it.
+"""
+
+import math
+import random
+
+import picomotodash_fastmath as fastmath
+import utime
+from picomotodash_mpu9250 import MPU
+
+
+def angles():
+    # Negative and large angles, every table entry and both sides of it
+    step = 2 * math.pi / fastmath.SIN_TABLE_SIZE
+    values = [i * step + offset for i in range(-600, 600) for offset in (0, 1e-9)]
+    values += [-x for x in values]
+    values += [k * math.pi / 4 for k in range(-64, 65)]
+    values += [x + 2 * math.pi * turns for x in (0.3, -2.1) for turns in (50, -50)]
+    values += [1000.0, -1000.0, 12345.678, -12345.678]
+    rnd = random.Random(4)
+    values += [rnd.uniform(-100, 100) for _ in range(20000)]
+    return values
+
+
+def test_sin_and_cos_within_bound():
+    for x in angles():
+        assert abs(fastmath.sin(x) - math.sin(x)) <= fastmath.SIN_MAX_ERROR, x
+        assert abs(fastmath.cos(x) - math.cos(x)) <= fastmath.SIN_MAX_ERROR, x
+
+
+def vectors():
+    # Both sides of every quadrant and octant edge, then random ones
+    points = []
+    for k in range(16):
+        edge = k * math.pi / 8
+        for offset in (-1e-7, 0.0, 1e-7, 0.05):
+            for radius in (1e-6, 1.0, 1e6):
+                a = edge + offset
+                points.append((radius * math.sin(a), radius * math.cos(a)))
+    points += [(1.0, 0.0), (-1.0, 0.0), (0.0, 1.0), (0.0, -1.0)]
+    points += [(1.0, 1.0), (-1.0, 1.0), (1.0, -1.0), (-1.0, -1.0)]
+    rnd = random.Random(5)
+    points += [(rnd.gauss(0, 10), rnd.gauss(0, 10)) for _ in range(20000)]
+    return points
+
+
+def test_atan2_within_bound():
+    for y, x in vectors():
+        error = fastmath.atan2(y, x) - math.atan2(y, x)
+        # +-pi are the same angle
+        error = (error + math.pi) % (2 * math.pi) - math.pi
+        assert abs(error) <= fastmath.ATAN2_MAX_ERROR, (y, x)
+
+
+def test_atan2_of_the_origin():
+    assert fastmath.atan2(0.0, 0.0) == 0.0
+    assert fastmath.atan2(0, 0) == 0.0
+
+
+def test_mpu_fast_trig_matches_math(sensor):
+    fake, ak8963 = sensor
+    mpus = [
+        MPU(calib_ag=False, calib_m=False, lean=False, fast_trig=fast_trig)
+        for fast_trig in (False, True)
+    ]
+    # Building the second one moved the clock, start both from the same tick
+    for mpu in mpus:
+        mpu.update_mpu()
+
+    # Leaning and pitching through every heading
+    rnd = random.Random(6)
+    worst = 0.0
+    headings = set()
+    for i in range(3000):
+        roll = math.radians(40 * math.sin(i / 100))
+        pitch = math.radians(10 * math.sin(i / 170))
+        heading = i / 250
+        fake.accel = (
+            math.sin(pitch) + rnd.gauss(0, 0.01),
+            math.sin(roll) + rnd.gauss(0, 0.01),
+            math.cos(roll) * math.cos(pitch),
+        )
+        fake.gyro = (rnd.gauss(0, 2), rnd.gauss(0, 2), rnd.gauss(20, 2))
+        ak8963.field = (40 * math.cos(heading), 40 * math.sin(heading), 30.0)
+        utime.advance_ms(10)
+
+        for mpu in mpus:
+            mpu.update_mpu()
+        reference, fast = mpus
+        heading_error = (fast.heading - reference.heading + 180) % 360 - 180
+        for error in (fast.roll - reference.roll, fast.pitch - reference.pitch):
+            worst = max(worst, abs(error))
+        worst = max(worst, abs(heading_error))
+        headings.add(int(reference.heading) // 30)
+
+    print("\nfast_trig worst roll/pitch/heading difference %.4f deg" % worst)
+    assert worst < 0.01
+    assert len(headings) == 12  # Turned through every heading
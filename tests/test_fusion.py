@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""lib/fusion.py: FusionFast against the reference Madgwick Fusion, and
+Mahony against Madgwick on a simulated ride.
+
+The benchmarks print their figures, run pytest with -s to see them.
+"""
+
+import random
+from math import asin, atan2, cos, degrees, pi, radians, sin, sqrt
+from time import perf_counter
+
+import pytest
+
+from fusion import Fusion, FusionFast, Mahony
+
+SAMPLES = 5000
+
+
+def timediff(end, start):
+    return (end - start) / 1000000
+
+
+def samples(n, seed=3):
+    # Noisy gravity, rotation and magnetic field, timestamps in us
+    rnd = random.Random(seed)
+    ts = 0
+    out = []
+    for _ in range(n):
+        ts += rnd.randint(2000, 12000)
+        accel = (rnd.gauss(0, 0.3), rnd.gauss(0, 0.3), 1 + rnd.gauss(0, 0.3))
+        gyro = (rnd.uniform(-200, 200), rnd.uniform(-200, 200), rnd.uniform(-200, 200))
+        mag = (rnd.gauss(20, 15), rnd.gauss(0, 15), rnd.gauss(40, 15))
+        out.append((accel, gyro, mag, ts))
+    return out
+
+
+def state(fusion):
+    return (tuple(fusion.q), fusion.heading, fusion.pitch, fusion.roll)
+
+
+@pytest.mark.parametrize("mag", [True, False])
+def test_fusion_fast_is_bit_identical(mag):
+    reference = Fusion(timediff)
+    fast = FusionFast(timediff)
+
+    for accel, gyro, field, ts in samples(SAMPLES):
+        if mag:
+            reference.update(accel, gyro, field, ts)
+            fast.update(accel, gyro, field, ts)
+        else:
+            reference.update_nomag(accel, gyro, ts)
+            fast.update_nomag(accel, gyro, ts)
+        # Exact equality, not approx
+        assert state(fast) == state(reference)
+
+
+def test_fusion_fast_benchmark():
+    data = samples(SAMPLES)
+
+    rates = []
+    for cls in (Fusion, FusionFast):
+        fusion = cls(timediff)
+        start = perf_counter()
+        for accel, gyro, field, ts in data:
+            fusion.update(accel, gyro, field, ts)
+        rates.append(SAMPLES / (perf_counter() - start))
+
+    print()
+    print("Fusion %d updates/s, FusionFast %d updates/s" % tuple(rates))
+
+
+def quat_mul(a, b):
+    a1, a2, a3, a4 = a
+    b1, b2, b3, b4 = b
+    return (
+        a1 * b1 - a2 * b2 - a3 * b3 - a4 * b4,
+        a1 * b2 + a2 * b1 + a3 * b4 - a4 * b3,
+        a1 * b3 - a2 * b4 + a3 * b1 + a4 * b2,
+        a1 * b4 + a2 * b3 - a3 * b2 + a4 * b1,
+    )
+
+
+def to_body(q, v):
+    # Earth frame vector seen by the sensor, the transposed rotation of q
+    q1, q2, q3, q4 = q
+    x, y, z = v
+    return (
+        (1 - 2 * (q3 * q3 + q4 * q4)) * x
+        + 2 * (q2 * q3 + q1 * q4) * y
+        + 2 * (q2 * q4 - q1 * q3) * z,
+        2 * (q2 * q3 - q1 * q4) * x
+        + (1 - 2 * (q2 * q2 + q4 * q4)) * y
+        + 2 * (q3 * q4 + q1 * q2) * z,
+        2 * (q2 * q4 + q1 * q3) * x
+        + 2 * (q3 * q4 - q1 * q2) * y
+        + (1 - 2 * (q2 * q2 + q3 * q3)) * z,
+    )
+
+
+def angles(q):
+    # Roll, pitch and heading as the filters compute them
+    q1, q2, q3, q4 = q
+    return (
+        degrees(atan2(2 * (q1 * q2 + q3 * q4), q1 * q1 - q2 * q2 - q3 * q3 + q4 * q4)),
+        degrees(-asin(2 * (q2 * q4 - q1 * q3))),
+        degrees(atan2(2 * (q2 * q3 + q1 * q4), q1 * q1 + q2 * q2 - q3 * q3 - q4 * q4)),
+    )
+
+
+def rotating_ride(gyro_bias, seconds=60, dt_s=0.01, seed=1):
+    """Turning at 30 deg/s while leaning +-30 deg at 0.2 Hz, sensors with
+    noise and a constant gyro bias in deg/s. Returns (accel, gyro, mag, ts,
+    true roll, pitch and heading) per sample."""
+    rnd = random.Random(seed)
+    field = (20.0, 0.0, -40.0)  # uT, north and down
+    q = (1.0, 0.0, 0.0, 0.0)
+    out = []
+    for k in range(int(seconds / dt_s)):
+        t = k * dt_s
+        rates = (radians(60 * pi * 0.2 * cos(2 * pi * 0.2 * t)), 0.0, radians(30))
+        norm = sqrt(sum(rate * rate for rate in rates))
+        half = norm * dt_s / 2
+        q = quat_mul(q, (cos(half),) + tuple(rate / norm * sin(half) for rate in rates))
+
+        accel = tuple(a + rnd.gauss(0, 0.01) for a in to_body(q, (0.0, 0.0, 1.0)))
+        gyro = tuple(
+            degrees(rate) + bias + rnd.gauss(0, 0.1)
+            for rate, bias in zip(rates, gyro_bias)
+        )
+        mag = tuple(m + rnd.gauss(0, 0.3) for m in to_body(q, field))
+        out.append((accel, gyro, mag, round((t + dt_s) * 1000000), angles(q)))
+    return out
+
+
+def wrap(angle):
+    return (angle + 180) % 360 - 180
+
+
+@pytest.mark.parametrize("gyro_bias", [(0.0, 0.0, 0.0), (0.5, -0.4, 0.8)])
+def test_mahony_against_madgwick(gyro_bias):
+    ride = rotating_ride(gyro_bias)
+
+    print()
+    for cls in (FusionFast, Mahony):
+        fusion = cls(timediff)
+        sq_sums = [0.0, 0.0, 0.0]
+        n = 0
+        for accel, gyro, mag, ts, truth in ride:
+            fusion.update(accel, gyro, mag, ts)
+            if ts > 30000000:  # Settled, Mahony integrates the bias out in ~10 s
+                errors = (
+                    fusion.roll - truth[0],
+                    fusion.pitch - truth[1],
+                    wrap(fusion.heading - truth[2]),
+                )
+                for i in range(3):
+                    sq_sums[i] += errors[i] * errors[i]
+                n += 1
+        roll, pitch, heading = (sqrt(sq_sum / n) for sq_sum in sq_sums)
+
+        print(
+            "%s, gyro bias %s deg/s: RMS roll %.2f, pitch %.2f, heading %.2f deg"
+            % (cls.__name__, gyro_bias, roll, pitch, heading)
+        )
+        assert roll < 1.0
+        assert pitch < 1.0
+        assert heading < 4.0
+
+    # The integral term is the opposite of the gyro bias
+    for integral, bias in zip(fusion.integral, gyro_bias):
+        assert degrees(-integral) == pytest.approx(bias, abs=0.2)
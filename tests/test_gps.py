@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""GPS bulk receive, fix publishing and dead reckoning.
+
+The benchmarks print their figures, run pytest with -s to see them.
+"""
+
+import random
+from math import cos, degrees, radians, sin, sqrt
+from time import perf_counter
+
+import pytest
+
+import utime
+from fake_l76x import EARTH_RADIUS, START_LATITUDE, START_LONGITUDE, gga, ride, rmc
+from picomotodash_gps import (
+    FIX_ALTITUDE,
+    FIX_HDOP,
+    FIX_LATITUDE,
+    FIX_LEN,
+    FIX_LONGITUDE,
+    FIX_SATELLITES,
+    FIX_SPEED,
+    FIX_STATUS,
+    FIX_TICKS,
+    FIX_TIME,
+    GPS,
+    RX_BUFFER_SIZE,
+    STANDARD_GRAVITY,
+    DeadReckoning,
+)
+
+
+def make_gps():
+    return GPS(local_offset=0, baudrate=None, fix_interval=None, rmc_gga_only=False)
+
+
+def receive(gps, *sentences):
+    utime.advance_ms(10)
+    for sentence in sentences:
+        gps.gnss_l76b.ser.data += sentence
+    gps.drain(budget_us=1)
+
+
+def test_one_snapshot_per_epoch():
+    gps = make_gps()
+
+    receive(gps, rmc("120000.00"), gga("120000.00", satellites=9))
+    fix = gps.latest_fix()
+    ticks = fix[FIX_TICKS]
+    assert ticks != 0
+    assert fix[FIX_TIME] == 12 * 3600
+    # GGA completed the snapshot published by RMC
+    assert fix[FIX_SATELLITES] == 9
+    assert fix[FIX_ALTITUDE] == 12.5
+
+    receive(gps, rmc("120000.20"), gga("120000.20"))
+    assert gps.latest_fix()[FIX_TICKS] != ticks
+    assert gps.latest_fix()[FIX_TIME] == 12 * 3600 + 0.2
+
+
+def test_completing_an_epoch_publishes_a_copy():
+    gps = make_gps()
+
+    receive(gps, rmc("120000.00"), gga("120000.00"))
+    fix = gps.latest_fix()
+    held = list(fix)
+
+    # A later GGA of the epoch leaves the list a reader holds untouched
+    receive(gps, gga("120000.00", satellites=11, hdop="1.4", talker="GN"))
+    assert fix == held
+    refreshed = gps.latest_fix()
+    assert refreshed is not fix
+    assert refreshed[FIX_SATELLITES] == 11
+    assert refreshed[FIX_HDOP] == pytest.approx(1.4)
+    assert refreshed[FIX_TICKS] == fix[FIX_TICKS]
+    assert refreshed[FIX_TIME] == fix[FIX_TIME]
+
+
+def test_no_snapshot_without_a_fix():
+    gps = make_gps()
+
+    receive(gps, rmc("120000.00", status="V"), gga("120000.00", fix_stat=0))
+    assert gps.latest_fix()[FIX_TICKS] == 0
+
+    receive(gps, rmc("120000.20"), gga("120000.20"))
+    ticks = gps.latest_fix()[FIX_TICKS]
+    assert ticks != 0
+
+    # Fix lost
+    receive(gps, rmc("120000.40", status="V"), gga("120000.40", fix_stat=0))
+    assert gps.latest_fix()[FIX_TICKS] == ticks
+
+    # Regained, RMC alone is not enough until GGA confirms
+    receive(gps, rmc("120000.60"))
+    assert gps.latest_fix()[FIX_TICKS] == ticks
+    receive(gps, gga("120000.60"))
+    assert gps.latest_fix()[FIX_TICKS] != ticks
+
+
+def test_micropygps_fallback_publishes_the_same_fixes():
+    published = []
+    for lean in (True, False):
+        utime.reset()
+        gps = GPS(
+            local_offset=0,
+            lean=lean,
+            baudrate=None,
+            fix_interval=None,
+            rmc_gga_only=False,
+        )
+        assert gps.lean == lean
+        fixes = []
+        for _, sentences in ride(5, interval_s=0.2):
+            receive(gps, *sentences)
+            fixes.append(list(gps.latest_fix()))
+        published.append(fixes)
+
+    lean_fixes, reference_fixes = published
+    assert lean_fixes[0][FIX_TICKS] != 0
+    for lean_fix, reference_fix in zip(lean_fixes, reference_fixes):
+        assert lean_fix == pytest.approx(reference_fix)
+
+
+def timed_parser(gps, us_per_byte):
+    # Parsing takes time on the utime clock, as on the Pico
+    feed = gps.parser.feed
+
+    def timed_feed(buf, start, end):
+        pos = feed(buf, start, end)
+        utime.advance_us((pos - start) * us_per_byte)
+        return pos
+
+    gps.parser.feed = timed_feed
+
+
+def test_drain_stops_at_the_budget_and_keeps_leftovers():
+    gps = make_gps()
+    timed_parser(gps, us_per_byte=10)
+    log = ride(5, interval_s=0.2)
+    for _, sentences in log:
+        gps.gnss_l76b.ser.data += b"".join(sentences)
+
+    published = []
+    calls = 0
+    while gps.gnss_l76b.uart_any() or gps.rx_pos < gps.rx_len:
+        start = utime.ticks_us()
+        gps.drain(budget_us=2000)
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        calls += 1
+        # One feed call past the budget at most
+        assert elapsed < 2000 + RX_BUFFER_SIZE * 10
+        fix_time = gps.latest_fix()[FIX_TIME]
+        if not published or published[-1] != fix_time:
+            published.append(fix_time)
+        assert calls < 100
+
+    # Several calls, nothing lost between them
+    assert calls > 5
+    assert published == [fix_time for fix_time, _ in log]
+    assert gps.parser.parsed_sentences == 5 * 3  # RMC, VTG and GGA
+    assert gps.parser.skipped_sentences == 5 * 5  # GSA, 3 GSV and GLL
+    assert gps.parser.crc_fails == 0
+
+
+def arrivals(log, baudrate):
+    """Receive time [us] of every byte of `log`, each epoch is sent from its
+    fix time at `baudrate`, and the receive time of the end of its first
+    sentence, keyed by fix time."""
+    byte_us = 10000000 / baudrate
+    times = []
+    data = bytearray()
+    first_sentence = {}
+    start_s = log[0][0]
+    for fix_time, sentences in log:
+        t = (fix_time - start_s) * 1000000
+        for sentence in sentences:
+            for char in sentence:
+                t += byte_us
+                times.append(t)
+            data += sentence
+            first_sentence.setdefault(fix_time, t)
+    return data, times, first_sentence
+
+
+def frame_latencies(gps, log, bulk, frame_ms=20, baudrate=9600):
+    # Bytes are received while the main loop runs one update per frame
+    data, times, first_sentence = arrivals(log, baudrate)
+    ser = gps.gnss_l76b.ser
+    latencies = []
+    sent = 0
+    fix_time = None
+    end_us = times[-1] + 1000000
+    while utime.ticks_us() < end_us:
+        utime.advance_ms(frame_ms)
+        now = utime.ticks_us()
+        while sent < len(data) and times[sent] <= now:
+            ser.data.append(data[sent])
+            sent += 1
+        gps.update_gps(verbose=None, bulk=bulk)
+        fix = gps.latest_fix()
+        if fix[FIX_TICKS] and fix[FIX_TIME] != fix_time:
+            fix_time = fix[FIX_TIME]
+            latencies.append((now - first_sentence[fix_time]) / 1000)
+    return latencies
+
+
+def test_bulk_receive_benchmark():
+    print()
+
+    # Parse throughput on the host, default sentence set
+    log = ride(300)
+    gps = make_gps()
+    for _, sentences in log:
+        gps.gnss_l76b.ser.data += b"".join(sentences)
+    start = perf_counter()
+    while gps.gnss_l76b.uart_any() or gps.rx_pos < gps.rx_len:
+        gps.drain(budget_us=1000000)
+    elapsed = perf_counter() - start
+    parser = gps.parser
+    sentences = parser.parsed_sentences + parser.skipped_sentences
+    assert sentences == 300 * 8
+    print("%d sentences/s parsed on the host" % (sentences / elapsed))
+
+    # Latency from the arrival of an epoch's RMC to its snapshot, 1 Hz at
+    # 9600 baud with one update per 20 ms frame. The first snapshot also
+    # waits for GGA and is left out.
+    log = ride(20)
+    for bulk in (True, False):
+        utime.reset()
+        gps = make_gps()
+        latencies = frame_latencies(gps, log, bulk=bulk)
+        published = len(latencies)
+        latencies = latencies[1:]
+        print(
+            "%s: %d of %d epochs published, latency max %d ms"
+            % (
+                "bulk" if bulk else "one byte per frame",
+                published,
+                len(log),
+                max(latencies, default=0),
+            )
+        )
+        if bulk:
+            assert published == len(log)
+            assert max(latencies) <= 20
+        else:
+            # The backlog grows by ~430 bytes per second
+            assert published < len(log) / 2
+            assert max(latencies) > 1000
+
+
+def test_dead_reckoning_anchors_once_per_epoch():
+    gps = make_gps()
+    dr = DeadReckoning()
+    accel = (0.0, 0.0, 1.0)
+
+    for epoch in range(5):
+        time = "1200%05.2f" % (epoch * 0.2)
+        # RMC and GGA read in separate frames
+        receive(gps, rmc(time))
+        dr.update(gps.latest_fix(), accel, 90.0)
+        receive(gps, gga(time))
+        dr.update(gps.latest_fix(), accel, 90.0)
+
+    assert dr.n_errors == 4
+    assert dr.fix_ticks == gps.latest_fix()[FIX_TICKS]
+
+
+def test_dead_reckoning_ignores_repeated_and_invalid_fixes():
+    dr = DeadReckoning()
+    accel = (0.0, 0.0, 1.0)
+
+    fix = [0] * FIX_LEN
+    fix[FIX_TICKS] = 1000
+    fix[FIX_TIME] = 100.0
+    fix[FIX_STATUS] = 1
+    dr.update(fix, accel, 0.0, now=1000)
+    assert dr.fix_ticks == 1000
+
+    # Same epoch published again
+    repeated = list(fix)
+    repeated[FIX_TICKS] = 1100
+    dr.update(repeated, accel, 0.0, now=1100)
+    assert dr.fix_ticks == 1000
+    assert dr.n_errors == 0
+
+    # No fix
+    invalid = list(fix)
+    invalid[FIX_TICKS] = 1200
+    invalid[FIX_TIME] = 100.2
+    invalid[FIX_STATUS] = 0
+    dr.update(invalid, accel, 0.0, now=1200)
+    assert dr.fix_ticks == 1000
+    assert dr.n_errors == 0
+
+    valid = list(invalid)
+    valid[FIX_STATUS] = 1
+    dr.update(valid, accel, 0.0, now=1300)
+    assert dr.fix_ticks == 1200
+    assert dr.n_errors == 1
+
+
+def replay_ride(
+    accel_g,
+    bias_g=0.0,
+    pitch=0.0,
+    seconds=20,
+    fix_ms=200,
+    frame_ms=33,
+    kph=36.0,
+    speed_noise_kph=0.2,
+):
+    """Replays a ride heading east at a constant acceleration, fixes with
+    noisy speeds every fix_ms and IMU frames every frame_ms. Returns the
+    dead reckoning and the RMS error of the speed it predicted per frame."""
+    rng = random.Random(9)
+    dr = DeadReckoning()
+    # The accelerometer sees the slope as -sin(pitch) g
+    accel = (accel_g + bias_g - sin(radians(pitch)), 0.0, 1.0)
+    start_ms = 1000
+
+    def truth(ms):
+        t = (ms - start_ms) / 1000
+        speed = kph / 3.6 + accel_g * STANDARD_GRAVITY * t
+        distance = kph / 3.6 * t + accel_g * STANDARD_GRAVITY * t * t / 2
+        longitude = START_LONGITUDE + degrees(
+            distance / (EARTH_RADIUS * cos(radians(START_LATITUDE)))
+        )
+        return speed * 3.6, longitude
+
+    fix = [0] * FIX_LEN
+    sq_sum = 0.0
+    frames = 0
+    for now in range(start_ms, start_ms + seconds * 1000, frame_ms):
+        fix_ticks = now - (now - start_ms) % fix_ms
+        if fix_ticks != fix[FIX_TICKS]:
+            speed, longitude = truth(fix_ticks)
+            fix = [0] * FIX_LEN
+            fix[FIX_LATITUDE] = START_LATITUDE
+            fix[FIX_LONGITUDE] = longitude
+            fix[FIX_SPEED] = speed + rng.gauss(0, speed_noise_kph)
+            fix[FIX_TIME] = fix_ticks / 1000
+            fix[FIX_STATUS] = 1
+            fix[FIX_TICKS] = fix_ticks
+
+        dr.update(fix, accel, 90.0, now=now, pitch=pitch)
+        if now - start_ms >= 2000:  # Let the bias settle
+            error = dr.speed - truth(now)[0]
+            sq_sum += error * error
+            frames += 1
+    return dr, sqrt(sq_sum / frames)
+
+
+def test_dead_reckoning_follows_a_steady_acceleration():
+    dr, frame_rms = replay_ride(0.2)
+    position_rms, speed_rms = dr.rms_errors()
+    print()
+    print(
+        "0.2 g: bias %.4f g, speed RMS %.2f km/h at fixes, %.2f per frame, "
+        "position RMS %.3f m" % (dr.accel_bias, speed_rms, frame_rms, position_rms)
+    )
+
+    # Holding the last GPS speed is 0.2 g * 0.2 s = 1.41 km/h off
+    assert abs(dr.accel_bias) < 0.01
+    assert speed_rms < 0.5
+    assert frame_rms < 0.5
+    assert position_rms < 0.05
+    assert dr.n_errors == 20 * 5 - 1
+
+
+@pytest.mark.parametrize(
+    "pitch, bias_g",
+    [(5.0, 0.0), (5.0, 0.05), (-3.0, -0.02)],
+)
+def test_dead_reckoning_removes_pitch_and_bias(pitch, bias_g):
+    dr, frame_rms = replay_ride(0.1, bias_g=bias_g, pitch=pitch)
+    position_rms, speed_rms = dr.rms_errors()
+
+    assert dr.accel_bias == pytest.approx(bias_g, abs=0.01)
+    assert speed_rms < 0.5
+    assert frame_rms < 0.5
+    assert position_rms < 0.05
+
+    # Without the pitch the bias estimate absorbs the slope
+    dr, frame_rms = replay_ride(0.1, bias_g=bias_g - sin(radians(pitch)))
+    assert dr.accel_bias == pytest.approx(bias_g - sin(radians(pitch)), abs=0.01)
+    assert frame_rms < 0.5
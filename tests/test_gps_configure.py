@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""GPS.configure(), set_baudrate() and wait_line() against a receiver that
+answers the PMTK commands on the utime clock.
+"""
+
+import pytest
+
+import utime
+from fake_l76x import FakeL76X, attach, nmea
+from picomotodash_gps import (
+    ACK_TIMEOUT_MS,
+    BAUDRATE,
+    FIX_INTERVAL_MIN_9600,
+    FIX_TIME,
+    GPS,
+    NMEA_BAUDRATE,
+    SENTENCE_TIMEOUT_MS,
+    SET_NMEA_OUTPUT_RMC_GGA,
+)
+
+
+@pytest.fixture
+def receiver(request):
+    receiver = attach(FakeL76X(**getattr(request, "param", {})))
+    yield receiver
+    attach(None)
+
+
+def test_configure_negotiates_rate_interval_and_mask(receiver):
+    gps = GPS(local_offset=0)
+    boot_ms = utime.ticks_ms()
+
+    assert receiver.commands == [
+        "$PMTK255,1",
+        SET_NMEA_OUTPUT_RMC_GGA,
+        "$PMTK251,%d" % NMEA_BAUDRATE,
+        "$PMTK220,200",
+    ]
+    assert receiver.rmc_gga_only
+    assert receiver.baudrate == gps.baudrate == NMEA_BAUDRATE
+    assert gps.gnss_l76b.baudrate == NMEA_BAUDRATE
+    assert receiver.fix_interval_ms == 200
+    # 100 ms before switching, then the next 1 Hz epoch
+    assert boot_ms <= 1000 + ACK_TIMEOUT_MS
+
+    # RMC and GGA only, 5 Hz at the new rate
+    utime.advance_ms(1000)
+    gps.drain()
+    assert gps.parser.parsed_sentences == 2 * 5
+    assert gps.parser.skipped_sentences == 0
+    assert gps.latest_fix()[FIX_TIME] == 12 * 3600 + 1.8
+
+
+@pytest.mark.parametrize("receiver", [{"baudrates": (BAUDRATE,)}], indirect=True)
+def test_baudrate_reverts_without_a_sentence(receiver):
+    gps = GPS(local_offset=0, fix_interval=100)
+
+    assert gps.baudrate == gps.gnss_l76b.baudrate == receiver.baudrate == BAUDRATE
+    assert utime.ticks_ms() >= 100 + SENTENCE_TIMEOUT_MS
+    # Still configured at 9600, with the interval clamped
+    assert receiver.commands[-1] == "$PMTK220,%d" % FIX_INTERVAL_MIN_9600
+    assert receiver.fix_interval_ms == FIX_INTERVAL_MIN_9600
+
+    utime.advance_ms(1000)
+    gps.drain()
+    assert gps.parser.crc_fails == 0
+    assert gps.latest_fix()[FIX_TIME] > 12 * 3600
+
+
+@pytest.mark.parametrize(
+    "baudrate, fix_interval",
+    [(None, 100), (None, 1000), (NMEA_BAUDRATE, 100)],
+)
+def test_fix_interval_is_clamped_at_9600_baud(receiver, baudrate, fix_interval):
+    GPS(baudrate=baudrate, fix_interval=fix_interval, rmc_gga_only=False)
+
+    if baudrate is None:
+        expected = max(fix_interval, FIX_INTERVAL_MIN_9600)
+    else:
+        expected = fix_interval
+    assert receiver.commands[-1] == "$PMTK220,%d" % expected
+    assert receiver.fix_interval_ms == expected
+
+
+@pytest.mark.parametrize(
+    "rmc_gga_only, timeout_ms",
+    [(True, ACK_TIMEOUT_MS), (False, 100 + SENTENCE_TIMEOUT_MS)],
+)
+@pytest.mark.parametrize("receiver", [{"silent": True}], indirect=True)
+def test_silent_receiver_costs_one_timeout(receiver, rmc_gga_only, timeout_ms):
+    gps = GPS(rmc_gga_only=rmc_gga_only)
+
+    assert utime.ticks_ms() <= timeout_ms + 5
+    assert gps.baudrate == gps.gnss_l76b.baudrate == BAUDRATE
+    assert not any(command.startswith("$PMTK220") for command in receiver.commands)
+
+
+def test_wait_line_ignores_other_lines_and_garbage(receiver):
+    gps = GPS(baudrate=None, fix_interval=None, rmc_gga_only=False)
+
+    # An ack at the wrong rate arrives garbled
+    receiver.baudrate = NMEA_BAUDRATE
+    receiver.send(nmea("PMTK001,220,3"))
+    assert not gps.wait_line("$PMTK001,220,3", 100)
+    assert gps.rx_heard
+    assert utime.ticks_ms() >= 100
+
+    # Skips sentences and other flags up to the ack
+    receiver.baudrate = BAUDRATE
+    utime.advance_ms(1000)
+    receiver.send(nmea("PMTK001,220,2") + nmea("PMTK001,220,3"))
+    assert gps.wait_line("$PMTK001,220,3", 100)
+
+    receiver.silent = True
+    gps.drain()
+    assert not gps.wait_line("$G", 100)
+    assert not gps.rx_heard
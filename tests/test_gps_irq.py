@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""GPS receive IRQ and the RX_POLL_FREQ timer fallback on a pty-backed
+UART, the receiver output goes through the kernel like a real serial line.
+"""
+
+import sys
+import time
+
+import pytest
+
+import machine
+import utime
+from fake_l76x import ride
+from picomotodash_gps import FIX_TICKS, FIX_TIME, GPS, RX_POLL_FREQ
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="needs a Linux pty"
+)
+
+
+@pytest.fixture
+def uart():
+    from pty_uart import PtyUART
+
+    uart = PtyUART()
+    yield uart
+    uart.close()
+
+
+@pytest.fixture
+def gps(uart):
+    gps = GPS(local_offset=0, baudrate=None, fix_interval=None, rmc_gga_only=False)
+    gps.gnss_l76b.ser = uart
+    utime.advance_ms(1000)  # FIX_TICKS 0 means no fix
+    return gps
+
+
+def wait_fix(gps, fix_time, timeout_s=2.0):
+    deadline = time.monotonic() + timeout_s
+    while gps.latest_fix()[FIX_TIME] != fix_time:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_rxidle_irq_parses_in_the_background(gps, uart, monkeypatch):
+    monkeypatch.setattr(machine.UART, "IRQ_RXIDLE", 0x10, raising=False)
+    log = ride(5, interval_s=0.2)
+
+    gps.start_irq()
+    assert gps.irq_active
+    assert gps.rx_timer is None
+    assert uart.handler == gps.receive
+    assert uart.trigger == machine.UART.IRQ_RXIDLE
+
+    for fix_time, sentences in log:
+        uart.send(b"".join(sentences))
+        assert wait_fix(gps, fix_time)
+    assert uart.any() == 0
+    assert gps.parser.parsed_sentences == 3 * len(log)
+    assert uart.irqs >= len(log)
+
+    # The frame loop leaves the UART to the IRQ
+    uart.handler = None
+    uart.send(b"".join(ride(1, start_s=13 * 3600)[0][1]))
+    uart.wait_received(1)
+    gps.update_gps(verbose=None)
+    gps.update_gps_bulk(verbose=None)
+    assert uart.any() > 0
+    uart.handler = gps.receive
+    assert wait_fix(gps, 13 * 3600)
+
+    gps.stop_irq()
+    assert not gps.irq_active
+    assert uart.handler is None
+    fix_time, sentences = ride(1, start_s=14 * 3600)[0]
+    data = b"".join(sentences)
+    uart.send(data)
+    uart.wait_received(len(data))
+    time.sleep(0.02)
+    assert gps.latest_fix()[FIX_TIME] == 13 * 3600
+
+    # Polled again by the frame loop
+    gps.update_gps(verbose=None, bulk=True)
+    assert gps.latest_fix()[FIX_TIME] == fix_time
+
+
+def test_timer_fallback_polls_the_uart(gps, uart):
+    assert not hasattr(machine.UART, "IRQ_RXIDLE")
+    log = ride(3, interval_s=0.2)
+
+    gps.start_irq()
+    timer = gps.rx_timer
+    assert gps.irq_active
+    assert uart.handler is None
+    assert timer.freq == RX_POLL_FREQ
+    assert timer.mode == machine.Timer.PERIODIC
+
+    ticks = 0
+    for fix_time, sentences in log:
+        data = b"".join(sentences)
+        uart.send(data)
+        uart.wait_received(len(data))
+        timer.callback(timer)  # Next timer period
+        assert uart.any() == 0
+        fix = gps.latest_fix()
+        assert fix[FIX_TIME] == fix_time
+        assert fix[FIX_TICKS] != ticks
+        ticks = fix[FIX_TICKS]
+        utime.advance_ms(1000 // RX_POLL_FREQ)
+
+    # An idle period finds nothing to parse
+    timer.callback(timer)
+    assert gps.latest_fix()[FIX_TICKS] == ticks
+
+    gps.stop_irq()
+    assert not gps.irq_active
+    assert gps.rx_timer is None
+    assert timer.callback is None
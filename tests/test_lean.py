@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Lean angle, corner peaks and longitudinal g."""
+
+from math import radians, sin
+
+import pytest
+
+import picomotodash_fastmath as fastmath
+from picomotodash_mpu9250 import LEAN_CORNER_ENTER, LEAN_CORNER_EXIT, MPU, Lean
+
+LEVEL = (0.0, 0.0, 1.0)
+
+
+def ride(lean, rolls, pitch=0.0, accel=LEVEL):
+    for roll in rolls:
+        lean.update(roll, pitch, accel)
+
+
+def test_corner_hysteresis_keeps_one_peak_per_corner():
+    lean = Lean()
+
+    # Dips between the thresholds neither end nor restart the corner
+    ride(lean, [0.0, 5.0, 9.0, 20.0, 6.0, 25.0, 5.0, 30.0, 12.0])
+    assert lean.cornering
+    assert lean.corners == 0
+    assert lean.peak == 30.0
+
+    ride(lean, [LEAN_CORNER_EXIT - 0.5])
+    assert not lean.cornering
+    assert lean.corners == 1
+    assert lean.last_peak == 30.0
+
+    # Jitter around the enter threshold is one corner, not several
+    enter = LEAN_CORNER_ENTER
+    ride(lean, [-enter + 0.5, -enter - 0.5, -enter + 1.0, -enter - 2.0, -5.0])
+    assert lean.cornering
+    assert lean.peak == -enter - 2.0
+    ride(lean, [-15.0, -2.0])
+    assert lean.corners == 2
+    assert lean.last_peak == -15.0
+
+
+def test_left_and_right_maxima():
+    lean = Lean()
+    ride(lean, [10.0, 35.0, 0.0, -20.0, -42.0, -3.0, 28.0])
+
+    assert lean.max_right == 35.0
+    assert lean.max_left == 42.0
+    assert lean.lean == 28.0
+
+    lean.reset_peaks()
+    assert (lean.max_left, lean.max_right, lean.corners) == (0.0, 0.0, 0)
+    assert lean.last_peak == 0.0
+
+
+def test_zero_and_mounting_sign():
+    lean = Lean(sign=-1)
+    lean.zero(3.0)  # On the side stand
+
+    ride(lean, [3.0])
+    assert lean.lean == 0.0
+    ride(lean, [-27.0])
+    assert lean.lean == 30.0
+    assert lean.max_right == 30.0
+
+
+@pytest.mark.parametrize("pitch", [-10.0, 0.0, 6.0, 15.0])
+@pytest.mark.parametrize("accel_g", [0.0, 0.3, -0.5])
+def test_gravity_is_removed_from_long_g(pitch, accel_g):
+    lean = Lean()
+    # Nose up, the forward axis reads -sin(pitch) g on top of the acceleration
+    forward = accel_g - sin(radians(pitch))
+    ride(lean, [0.0] * 100, pitch=pitch, accel=(forward, 0.0, 1.0))
+
+    # DEG2RAD is 3.1415 / 180
+    assert lean.long_g == pytest.approx(accel_g, abs=1e-4)
+    assert lean.max_accel == pytest.approx(max(accel_g, 0.0), abs=1e-4)
+    assert lean.max_brake == pytest.approx(max(-accel_g, 0.0), abs=1e-4)
+
+
+def test_forward_axis_and_sign():
+    lean = Lean(forward_axis=1, forward_sign=-1)
+    ride(lean, [0.0] * 100, accel=(0.7, -0.2, 1.0))
+    assert lean.long_g == pytest.approx(0.2, abs=1e-4)
+
+
+def test_fast_trig_long_g(sensor):
+    fast = Lean(fast_trig=True)
+    assert fast._sin is fastmath.sin
+    assert MPU(calib_ag=False, calib_m=False, fast_trig=True).lean._sin is fastmath.sin
+
+    reference = Lean()
+    for pitch in range(-30, 31):
+        accel = (0.1, 0.0, 1.0)
+        fast.update(0.0, float(pitch), accel)
+        reference.update(0.0, float(pitch), accel)
+        error = fast.long_g - reference.long_g
+        assert abs(error) <= fastmath.SIN_MAX_ERROR
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Ellipsoid fit of simulated magnetometer readings."""
+
+import random
+from math import sqrt
+
+import pytest
+
+from picomotodash_magcal import EllipsoidFit
+
+IDENTITY = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+SOFT_IRON = ((1.3, 0.1, 0.05), (0.1, 0.8, -0.07), (0.05, -0.07, 1.1))
+
+
+def readings(offset, distortion, radius, n=500, noise=0.2, seed=1):
+    rnd = random.Random(seed)
+    points = []
+    for _ in range(n):
+        v = [rnd.gauss(0, 1) for _ in range(3)]
+        norm = sqrt(sum(x * x for x in v))
+        v = [radius * x / norm for x in v]
+        points.append(
+            [
+                sum(distortion[i][j] * v[j] for j in range(3))
+                + offset[i]
+                + rnd.gauss(0, noise)
+                for i in range(3)
+            ]
+        )
+    return points
+
+
+def corrected_radii(points, offset, matrix):
+    radii = []
+    for p in points:
+        u = [p[i] - offset[i] for i in range(3)]
+        c = [sum(matrix[3 * i + j] * u[j] for j in range(3)) for i in range(3)]
+        radii.append(sqrt(sum(x * x for x in c)))
+    return radii
+
+
+@pytest.mark.parametrize(
+    "offset, distortion, radius",
+    [
+        ((12, -30, 5), SOFT_IRON, 45),
+        # Offsets larger than the field: the origin is outside the ellipsoid
+        ((12, -30, 45), SOFT_IRON, 45),
+        ((30, 30, 30), IDENTITY, 45),
+        ((-80, 60, 40), SOFT_IRON, 30),
+    ],
+)
+def test_fit_recovers_offset_and_sphere(offset, distortion, radius):
+    points = readings(offset, distortion, radius)
+    fit = EllipsoidFit()
+    for p in points:
+        fit.add(*p)
+
+    result = fit.solve()
+    assert result is not None
+    fit_offset, matrix = result
+    assert fit_offset == pytest.approx(offset, abs=0.5)
+
+    radii = corrected_radii(points, fit_offset, matrix)
+    mean = sum(radii) / len(radii)
+    assert max(radii) - min(radii) < 0.05 * mean
+
+
+def test_degenerate_samples_are_rejected():
+    # All samples in one plane, no ellipsoid can be fitted
+    fit = EllipsoidFit()
+    rnd = random.Random(2)
+    for _ in range(200):
+        fit.add(rnd.uniform(-40, 40), rnd.uniform(-40, 40), 10.0)
+    assert fit.solve() is None
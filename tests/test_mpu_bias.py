@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Online gyro bias tracking with a simulated ride."""
+
+import json
+import random
+
+import pytest
+
+from picomotodash_mpu9250 import (
+    BIAS_SAVE_UPDATES,
+    BIAS_STILL_WINDOWS,
+    BIAS_WINDOW,
+    CALIB_FILE,
+    CALIB_VERSION,
+    MPU,
+)
+
+
+def make_mpu():
+    # Seeded with the sensor at rest and no bias
+    return MPU(calib_ag=True, calib_m=False, bias_tracking=True, lean=False)
+
+
+def ride(mpu, fake, windows, gyro, accel=(0.0, 0.0, 1.0), noise=0.05, seed=1):
+    rnd = random.Random(seed)
+    for _ in range(windows * BIAS_WINDOW):
+        fake.gyro = [g + rnd.gauss(0, noise) for g in gyro]
+        fake.accel = [a + rnd.gauss(0, 0.002) for a in accel]
+        mpu.read_imu()
+
+
+def test_still_bike_converges_to_the_bias(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+
+    ride(mpu, fake, 250, gyro=(0.2, -0.3, 0.4))
+    assert mpu.bias_updates == 250 - BIAS_STILL_WINDOWS
+    assert (mpu.gXerr, mpu.gYerr, mpu.gZerr) == pytest.approx(
+        (0.2, -0.3, 0.4), abs=0.03
+    )
+
+
+def test_steady_highway_sweeper_is_not_still(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+
+    # Constant 2 deg/s yaw, as steady as a still bike
+    ride(mpu, fake, 50, gyro=(0.0, 0.0, 2.0))
+    assert mpu.bias_updates == 0
+    assert mpu.gZerr == pytest.approx(0.0, abs=0.01)
+
+
+def test_gps_speed_vetoes_a_gentle_sweeper(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+
+    # Below the rate limit, only the GPS speed tells it apart
+    mpu.set_speed(90.0)
+    ride(mpu, fake, 50, gyro=(0.0, 0.0, 0.6))
+    assert mpu.bias_updates == 0
+
+    mpu.set_speed(0.0)
+    ride(mpu, fake, 50, gyro=(0.0, 0.0, 0.6))
+    assert mpu.bias_updates > 0
+
+
+def test_vibration_is_not_still(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+
+    ride(mpu, fake, 50, gyro=(0.0, 0.0, 0.0), noise=1.0)
+    assert mpu.bias_updates == 0
+
+
+def test_seed_is_not_saved_until_refined(sensor, tmp_path):
+    fake, _ = sensor
+    mpu = make_mpu()
+    assert not (tmp_path / CALIB_FILE).exists()
+
+    ride(mpu, fake, BIAS_SAVE_UPDATES + BIAS_STILL_WINDOWS, gyro=(0.0, 0.0, 0.5))
+    assert mpu.bias_save_pending
+    assert not (tmp_path / CALIB_FILE).exists()
+
+    # Written from the main loop, once
+    mpu.update_mpu()
+    assert not mpu.bias_save_pending
+    with open(CALIB_FILE) as calib_file:
+        calib = json.load(calib_file)
+    assert calib["gZerr"] == pytest.approx(mpu.gZerr)
+    assert calib["gZerr"] > 0.3
+    assert "mag_offset" not in calib
+    # The seed's accel errors are not a calibration
+    assert "aXerr" not in calib
+
+    ride(mpu, fake, BIAS_SAVE_UPDATES, gyro=(0.0, 0.0, 0.5))
+    assert not mpu.bias_save_pending
+
+
+def test_saved_gyro_bias_is_loaded_over_the_seed(sensor):
+    fake, _ = sensor
+    calib = {"version": CALIB_VERSION, "gXerr": 0.1, "gYerr": -0.2, "gZerr": 0.5}
+    with open(CALIB_FILE, "w") as calib_file:
+        json.dump(calib, calib_file)
+
+    # Booted tilted, the accel errors still come from the seed
+    fake.accel = (0.1, 0.0, 1.0)
+    mpu = make_mpu()
+    assert (mpu.gXerr, mpu.gYerr, mpu.gZerr) == (0.1, -0.2, 0.5)
+    assert mpu.aXerr == pytest.approx(0.1, abs=1e-3)
+
+
+def test_saving_the_bias_keeps_the_accel_calibration(sensor):
+    fake, _ = sensor
+    calib = {"version": CALIB_VERSION, "aXerr": 0.05, "aYerr": -0.02, "aZerr": 0.01}
+    calib.update({"gXerr": 0.0, "gYerr": 0.0, "gZerr": 0.0})
+    with open(CALIB_FILE, "w") as calib_file:
+        json.dump(calib, calib_file)
+
+    mpu = make_mpu()
+    mpu.gZerr = 0.4
+    mpu.aXerr = 0.3
+    mpu.save_bias()
+    with open(CALIB_FILE) as calib_file:
+        saved = json.load(calib_file)
+    assert saved["gZerr"] == pytest.approx(0.4)
+    assert saved["aXerr"] == 0.05
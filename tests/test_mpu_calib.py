@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Calibration file sections written by MPU."""
+
+import itertools
+import json
+from math import cos, pi, sin, sqrt
+
+import pytest
+
+from picomotodash_mpu9250 import CALIB_FILE, CALIB_VERSION, MPU
+
+AG_KEYS = ("aXerr", "aYerr", "aZerr", "gXerr", "gYerr", "gZerr")
+
+
+def sphere(offset, radius, n=200):
+    # Fibonacci sphere, evenly spread orientations
+    fields = []
+    for i in range(n):
+        z = 1 - 2 * (i + 0.5) / n
+        r = sqrt(1 - z * z)
+        phi = i * pi * (3 - sqrt(5))
+        fields.append(
+            (
+                offset[0] + radius * r * cos(phi),
+                offset[1] + radius * r * sin(phi),
+                offset[2] + radius * z,
+            )
+        )
+    return fields
+
+
+def read_file():
+    with open(CALIB_FILE) as calib_file:
+        return json.load(calib_file)
+
+
+def write_file(calib):
+    with open(CALIB_FILE, "w") as calib_file:
+        json.dump(calib, calib_file)
+
+
+def test_nothing_written_without_calibration(sensor, tmp_path):
+    MPU(calib_ag=False, calib_m=False)
+    assert not (tmp_path / CALIB_FILE).exists()
+
+
+def test_uncalibrated_magnetometer_is_not_written(sensor):
+    fake, _ = sensor
+    fake.gyro = (1.0, -2.0, 0.5)
+    MPU(calib_ag=True, calib_m=False, bias_tracking=False)
+
+    calib = read_file()
+    assert calib["version"] == CALIB_VERSION
+    assert calib["gXerr"] == pytest.approx(1.0, abs=0.01)
+    assert "mag_offset" not in calib
+    assert "mag_scale" not in calib
+
+
+def test_uncalibrated_accel_gyro_is_not_written(sensor):
+    _, ak8963 = sensor
+    ak8963.fields = itertools.cycle(sphere((10, -20, 5), 45))
+    MPU(calib_ag=False, calib_m=True)
+
+    calib = read_file()
+    assert calib["mag_offset"] == pytest.approx([10, -20, 5], abs=1)
+    for key in AG_KEYS:
+        assert key not in calib
+
+
+def test_existing_sections_are_kept(sensor):
+    _, ak8963 = sensor
+    mag = {
+        "version": CALIB_VERSION,
+        "mag_offset": [1.0, 2.0, 3.0],
+        "mag_scale": [1.0, 1.0, 1.0],
+        "mag_matrix": [1, 0, 0, 0, 1, 0, 0, 0, 1],
+    }
+    write_file(mag)
+
+    # Magnetometer loaded, accel/gyro calibrated and added
+    mpu = MPU(calib_ag=True, calib_m=True, bias_tracking=False)
+    calib = read_file()
+    for key in mag:
+        assert calib[key] == mag[key]
+    for key in AG_KEYS:
+        assert key in calib
+
+    # Recalibrating the magnetometer keeps the accel/gyro errors
+    ak8963.fields = itertools.cycle(sphere((-5, 5, 30), 40))
+    mpu.recalibrate(ag=False, m=True)
+    updated = read_file()
+    assert updated["mag_offset"] == pytest.approx([-5, 5, 30], abs=1)
+    for key in AG_KEYS:
+        assert updated[key] == calib[key]
+
+
+def test_version_1_file_gains_a_magnetometer_section(sensor):
+    _, ak8963 = sensor
+    write_file({key: 0.0 for key in AG_KEYS})
+    ak8963.fields = itertools.cycle(sphere((0, 0, 0), 50))
+
+    MPU(calib_ag=True, calib_m=True)
+    calib = read_file()
+    assert calib["version"] == CALIB_VERSION
+    assert "mag_offset" in calib
+    for key in AG_KEYS:
+        assert calib[key] == 0.0
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""FIFO batched sampling against a register-level MPU-9250."""
+
+import struct
+
+import pytest
+
+import fake_mpu9250
+from picomotodash_mpu9250 import FIFO_MAX_FRAMES, MPU
+
+
+def make_mpu():
+    mpu = MPU(calib_ag=False, calib_m=False, bias_tracking=False, lean=False)
+
+    # Record every decoded sample, in order
+    mpu.decoded = []
+
+    def record():
+        mpu.decoded.append(tuple(mpu.imu[0:6]))
+
+    mpu.track_bias = record
+    mpu.bias_tracking = True
+    return mpu
+
+
+def ramp(n, start=0):
+    # Distinct accel and gyro in every frame
+    return [
+        ((0.01 * i, -0.01 * i, 1.0), (i, -2 * i, 0.5 * i))
+        for i in range(start, start + n)
+    ]
+
+
+def assert_decoded(decoded, samples):
+    assert len(decoded) == len(samples)
+    for got, (accel, gyro) in zip(decoded, samples):
+        assert got[0:3] == pytest.approx(accel, abs=1e-4)
+        assert got[3:6] == pytest.approx(gyro, abs=0.01)
+
+
+def test_fifo_rate_sets_the_sample_period(sensor):
+    mpu = make_mpu()
+    mpu.start_fifo(rate=200)
+    assert mpu.fifo_dt == pytest.approx(1 / 200)
+
+    mpu.start_fifo(rate=100)
+    assert mpu.fifo_dt == pytest.approx(1 / 100)
+
+
+def test_fifo_frames_are_decoded_in_order(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+    mpu.start_fifo()
+
+    samples = ramp(10)
+    fake.run(samples)
+    mpu.update_mpu()
+
+    assert mpu.fifo_frames == 10
+    assert_decoded(mpu.decoded, samples)
+    assert len(fake.fifo) == 0
+
+
+def test_fifo_drains_at_most_max_frames_per_update(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+    mpu.start_fifo()
+
+    samples = ramp(FIFO_MAX_FRAMES + 8)
+    fake.run(samples)
+
+    mpu.update_mpu()
+    assert mpu.fifo_frames == FIFO_MAX_FRAMES
+    mpu.update_mpu()
+    assert mpu.fifo_frames == 8
+    mpu.update_mpu()
+    assert mpu.fifo_frames == 0
+
+    assert_decoded(mpu.decoded, samples)
+
+
+def test_fifo_overflow_resets_and_stays_aligned(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+    mpu.start_fifo()
+
+    # 512 bytes hold 42 frames and a partial one
+    fake.run(ramp(50))
+    mpu.update_mpu()
+    assert mpu.fifo_overflows == 1
+    assert mpu.fifo_frames == 0
+    assert mpu.decoded == []
+    assert len(fake.fifo) == 0
+
+    samples = ramp(5, start=100)
+    fake.run(samples)
+    mpu.update_mpu()
+    assert mpu.fifo_overflows == 1
+    assert_decoded(mpu.decoded, samples)
+
+
+def test_fifo_stop_mode_drops_new_samples(sensor):
+    fake, _ = sensor
+    mpu = make_mpu()
+    mpu.start_fifo()
+
+    fake.run(ramp(50))
+    frames = fake_mpu9250.FIFO_SIZE // fake_mpu9250.FRAME_LEN
+    assert len(fake.fifo) == frames * fake_mpu9250.FRAME_LEN
+    assert mpu.mpu.mpu6500.fifo_overflow
+
+    # The newest frame kept is the last one that fitted
+    gx = struct.unpack_from(">h", fake.fifo, len(fake.fifo) - 6)[0]
+    assert gx == round((frames - 1) * fake.gyro_so)
+
+
+def test_burst_read_decodes_nine_axes(sensor):
+    fake, ak8963 = sensor
+    mpu = make_mpu()
+
+    ak8963.field = (30.0, -15.0, 45.0)
+    fake.sample(accel=(0.5, 0.0, 0.5), gyro=(10.0, 0.0, -5.0))
+    mpu.read_imu()
+    assert tuple(mpu.accel) == pytest.approx((0.5, 0.0, 0.5), abs=1e-4)
+    assert tuple(mpu.gyro) == pytest.approx((10.0, 0.0, -5.0), abs=0.01)
+    assert tuple(mpu.mag) == pytest.approx((30.0, -15.0, 45.0), abs=0.15)
+
+    # A magnetic overflow keeps the previous reading
+    ak8963.field = (300.0, 300.0, 300.0)
+    ak8963.overflow = True
+    mpu.read_imu()
+    assert tuple(mpu.mag) == pytest.approx((30.0, -15.0, 45.0), abs=0.15)
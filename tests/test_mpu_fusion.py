@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Fusion filters run through MPU.update_mpu(fusion=True).
+
+The benchmark prints its figures, run pytest with -s to see them.
+"""
+
+import random
+from time import perf_counter
+
+import pytest
+
+import picomotodash_mpu9250
+import utime
+from picomotodash_mpu9250 import AHRS_MADGWICK, AHRS_MAHONY, MPU
+
+
+@pytest.mark.parametrize("ahrs", [AHRS_MADGWICK, AHRS_MAHONY])
+def test_level_sensor_settles_level(sensor, ahrs):
+    # The board is mounted upside down, see FUSION_INVERT
+    fake, ak8963 = sensor
+    ak8963.field = (20.0, 0.0, 40.0)
+    mpu = MPU(calib_ag=False, calib_m=False, lean=False, ahrs=ahrs)
+
+    rnd = random.Random(1)
+    for _ in range(2000):
+        fake.accel = (rnd.gauss(0, 0.005), rnd.gauss(0, 0.005), -1.0)
+        fake.gyro = (rnd.gauss(0, 0.1), rnd.gauss(0, 0.1), rnd.gauss(0, 0.1))
+        utime.advance_ms(10)
+        mpu.update_mpu(fusion=True)
+
+    assert mpu.roll == pytest.approx(0.0, abs=1.0)
+    assert mpu.pitch == pytest.approx(0.0, abs=1.0)
+    assert mpu.heading == pytest.approx(mpu.declination, abs=1.0)
+    assert mpu.filter_us_avg >= 0
+
+
+def test_unknown_filter_is_rejected(sensor):
+    with pytest.raises(ValueError):
+        MPU(calib_ag=False, calib_m=False, ahrs="kalman")
+
+
+def test_filter_time_benchmark(sensor, monkeypatch):
+    fake, ak8963 = sensor
+    ak8963.field = (20.0, 0.0, 40.0)
+    # filter_us on the host clock, the filters keep the utime one
+    monkeypatch.setattr(
+        picomotodash_mpu9250, "ticks_us", lambda: int(perf_counter() * 1000000)
+    )
+
+    print()
+    for ahrs in (AHRS_MADGWICK, AHRS_MAHONY):
+        mpu = MPU(calib_ag=False, calib_m=False, lean=False, ahrs=ahrs)
+        rnd = random.Random(1)
+        total_us = 0
+        for _ in range(2000):
+            fake.accel = (rnd.gauss(0, 0.05), rnd.gauss(0, 0.05), -1.0)
+            fake.gyro = (rnd.gauss(0, 5), rnd.gauss(0, 5), rnd.gauss(30, 5))
+            utime.advance_ms(10)
+            mpu.update_mpu(fusion=True)
+            total_us += mpu.filter_us
+        print(
+            "%s: filter_us mean %.1f, filter_us_avg %.1f"
+            % (ahrs, total_us / 2000, mpu.filter_us_avg)
+        )
+        assert mpu.filter_us_avg > 0
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""NMEAParser conformance against recorded sentences and MicropyGPS.
+
+The speed test prints its figures, run pytest with -s to see them.
+"""
+
+from time import perf_counter
+
+import pytest
+
+from fake_l76x import GSA, GSV, gga, nmea, ride, rmc, vtg
+from L76.micropyGPS.micropyGPS import MicropyGPS
+from picomotodash_gps import FIELDS_MAX, SENTENCE_MAX_LEN, NMEAParser
+
+# NMEA 0183 reference sentences
+RECORDED = (
+    b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n",
+    b"$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A\r\n",
+    b"$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*48\r\n",
+    b"$GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1*39\r\n",
+    b"$GPGSV,2,1,08,01,40,083,46,02,17,308,41,12,07,344,39,14,22,228,45*75\r\n",
+)
+
+
+def feed(parser, data):
+    # Feed everything, returns the number of sentences parsed
+    parsed = 0
+    pos = 0
+    while pos < len(data):
+        pos = parser.feed(data, pos, len(data))
+        parsed += parser.updated
+    return parsed
+
+
+def fields(parser):
+    return (
+        parser.latitude[0],
+        parser.latitude[1],
+        parser.longitude[0],
+        parser.longitude[1],
+        parser.speed[2],
+        parser.course,
+        parser.altitude,
+        parser.geoid_height,
+        parser.hdop,
+        parser.satellites_in_use,
+        tuple(parser.timestamp),
+        parser.fix_stat,
+        parser.valid,
+    )
+
+
+def test_recorded_sentences():
+    parser = NMEAParser()
+
+    assert feed(parser, b"".join(RECORDED[:2])) == 2
+    assert parser.latitude == [pytest.approx(48 + 7.038 / 60), "N"]
+    assert parser.longitude == [pytest.approx(11 + 31.0 / 60), "E"]
+    assert parser.timestamp == [12, 35, 19]
+    assert parser.fix_stat == 1
+    assert parser.satellites_in_use == 8
+    assert parser.hdop == pytest.approx(0.9)
+    assert parser.altitude == pytest.approx(545.4)
+    assert parser.geoid_height == pytest.approx(46.9)
+    assert parser.valid
+    assert parser.speed[0] == pytest.approx(22.4)
+    assert parser.course == pytest.approx(84.4)
+
+    # VTG carries course and speed only
+    assert feed(parser, RECORDED[2]) == 1
+    assert parser.course == pytest.approx(54.7)
+    assert parser.speed[0] == pytest.approx(5.5)
+    assert parser.speed[2] == pytest.approx(5.5 * 1.852)
+    assert parser.timestamp == [12, 35, 19]
+
+    assert feed(parser, b"".join(RECORDED[3:])) == 0
+    assert parser.parsed_sentences == 3
+    assert parser.skipped_sentences == 2
+    assert parser.crc_fails == 0
+
+
+def test_local_offset_wraps_the_hour():
+    parser = NMEAParser(local_offset=9)
+    feed(parser, RECORDED[0])
+    assert parser.timestamp == [21, 35, 19]
+
+    feed(parser, gga("183000.50"))
+    assert parser.timestamp == [3, 30, pytest.approx(0.5)]
+
+
+def test_checksum_mismatch_is_rejected():
+    parser = NMEAParser()
+    feed(parser, RECORDED[0])
+    before = fields(parser)
+
+    corrupted = RECORDED[0].replace(b"545.4", b"545.5")
+    assert feed(parser, corrupted) == 0
+    assert parser.crc_fails == 1
+    assert fields(parser) == before
+
+    # Missing or truncated checksum
+    assert feed(parser, RECORDED[0].replace(b"*47", b"")) == 0
+    assert feed(parser, RECORDED[0].replace(b"*47", b"*4")) == 0
+    assert parser.crc_fails == 3
+    assert fields(parser) == before
+
+
+def test_lowercase_checksum_is_accepted():
+    parser = NMEAParser()
+    lower = RECORDED[1].replace(b"*6A", b"*6a")
+
+    assert feed(parser, lower) == 1
+    assert parser.crc_fails == 0
+    assert parser.speed[0] == pytest.approx(22.4)
+
+
+def test_unwanted_sentences_are_skipped_after_the_header():
+    parser = NMEAParser()
+
+    for line in (GSA, *GSV):
+        assert feed(parser, line) == 0
+        # Discarded without recording a single field
+        assert parser.n_commas == 0
+        assert parser.line_len == 6
+    assert parser.skipped_sentences == 4
+    assert parser.parsed_sentences == 0
+    assert parser.crc_fails == 0
+
+
+def test_sentence_split_across_feed_calls():
+    reference = NMEAParser()
+    feed(reference, RECORDED[1])
+
+    # Complete at the "\r"
+    line = bytearray(RECORDED[1])
+    for split in range(1, len(line) - 2):
+        parser = NMEAParser()
+        assert parser.feed(line, 0, split) == split
+        assert not parser.updated
+        parser.feed(line, split, len(line))
+        assert parser.updated
+        assert fields(parser) == fields(reference)
+
+
+def test_overlong_lines_are_dropped():
+    parser = NMEAParser()
+
+    # Too long, then too many fields
+    long_line = nmea("GPGGA," + "1" * SENTENCE_MAX_LEN)
+    many_fields = nmea("GPGGA" + ",1" * (FIELDS_MAX + 1))
+    assert len(many_fields) < SENTENCE_MAX_LEN
+    assert feed(parser, long_line + many_fields) == 0
+    assert parser.parsed_sentences == 0
+
+    # The receiver recovers at the next "$"
+    assert feed(parser, long_line[:40] + RECORDED[0]) == 1
+    assert parser.altitude == pytest.approx(545.4)
+
+
+def test_negative_altitude_and_geoid():
+    parser = NMEAParser()
+    feed(parser, gga("120000.00", altitude="-12.5"))
+    assert parser.altitude == pytest.approx(-12.5)
+    assert parser.geoid_height == pytest.approx(-34.0)
+
+
+def test_no_fix_keeps_the_last_position():
+    parser = NMEAParser()
+    feed(parser, RECORDED[0] + RECORDED[1])
+    position = (parser.latitude[0], parser.longitude[0])
+
+    feed(parser, gga("123520", fix_stat=0, latitude=10.0, longitude=10.0))
+    feed(parser, rmc("123520", status="V", latitude=10.0, longitude=10.0))
+    assert parser.fix_stat == 0
+    assert not parser.valid
+    assert (parser.latitude[0], parser.longitude[0]) == position
+    assert parser.timestamp == [12, 35, 20]
+
+
+def test_same_fields_as_micropygps():
+    lean = NMEAParser(local_offset=9)
+    reference = MicropyGPS(local_offset=9, location_formatting="dd")
+
+    lines = list(RECORDED)
+    lines += [vtg(course="", knots="000.0", kph="000.0")]
+    lines += [gga("235959.99", altitude="-3.2", latitude=-0.5, longitude=-179.99)]
+    for _, sentences in ride(5, interval_s=0.2):
+        lines += sentences
+
+    for line in lines:
+        feed(lean, line)
+        for char in line.decode():
+            reference.update(char)
+
+        assert lean.latitude[0] == pytest.approx(reference.latitude[0])
+        assert lean.longitude[0] == pytest.approx(reference.longitude[0])
+        assert lean.latitude[1] == reference.latitude[1]
+        assert lean.longitude[1] == reference.longitude[1]
+        assert lean.speed == pytest.approx(reference.speed)
+        assert lean.course == pytest.approx(reference.course)
+        assert lean.altitude == pytest.approx(reference.altitude)
+        assert lean.geoid_height == pytest.approx(reference.geoid_height)
+        assert lean.hdop == pytest.approx(reference.hdop)
+        assert lean.satellites_in_use == reference.satellites_in_use
+        assert lean.timestamp == pytest.approx(reference.timestamp)
+        assert lean.fix_stat == reference.fix_stat
+        assert lean.valid == reference.valid
+
+    assert lean.crc_fails == reference.crc_fails == 0
+
+
+def test_parse_speed():
+    data = bytearray(b"".join(b"".join(sentences) for _, sentences in ride(200)))
+    sentences = data.count(b"\n")
+
+    lean = NMEAParser()
+    start = perf_counter()
+    feed(lean, data)
+    lean_s = perf_counter() - start
+
+    reference = MicropyGPS(location_formatting="dd")
+    text = data.decode()
+    start = perf_counter()
+    for char in text:
+        reference.update(char)
+    reference_s = perf_counter() - start
+
+    print()
+    print(
+        "%d sentences: lean %d/s, MicropyGPS stand-in %d/s"
+        % (sentences, sentences / lean_s, sentences / reference_s)
+    )
+    assert lean.parsed_sentences + lean.skipped_sentences == sentences
+    assert lean.parsed_sentences == reference.parsed_sentences - 200 * 5
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""RPM capture driven by a simulated ignition pulse train.
+
+The replay benchmarks print their figures, run pytest with -s to see them.
+"""
+
+import random
+from time import perf_counter
+
+import micropython
+import utime
+
+from picomotodash_rpm import EDGE_BUFFER_SIZE, PWM2RPM_FACTOR, RPM, TIMEOUT_MAX
+
+
+class PulseTrain:
+    """Simulated RPM pin: falling edges at freq Hz, each period drawn
+    uniformly within +-jitter_us. The scheduler runs every `batch` edges.
+
+    The periods of every batch are kept, so jitter statistics can be
+    compared with what RPM measured.
+    """
+
+    def __init__(self, rpm, seed=1):
+        self.pin = rpm.pwm
+        self.random = random.Random(seed)
+        self.periods = []
+        self.batch_periods = []
+
+    def run(self, freq, edges, jitter_us=0, batch=1):
+        period = 1000000 // freq
+        for i in range(edges):
+            cycle = period + self.random.randint(-jitter_us, jitter_us)
+            utime.advance_us(cycle)
+            self.periods.append(cycle)
+            self.batch_periods.append(cycle)
+            self.pin.handler(self.pin)
+            if (i + 1) % batch == 0:
+                self.drain()
+        self.drain()
+
+    def replay(self, timestamps, rpm, schedule_us=0):
+        """Falling edges at the recorded ticks_us() `timestamps`, scheduled
+        callbacks run once `schedule_us` have passed since their last run.
+        Returns the estimate after every edge and the host time spent in the
+        IRQ handler and the scheduled callbacks [s]."""
+        estimates = []
+        cpu = 0.0
+        last_run = utime.ticks_us()
+        for t in timestamps:
+            utime.advance_us(t - utime.ticks_us())
+            start = perf_counter()
+            self.pin.handler(self.pin)
+            if t - last_run >= schedule_us:
+                micropython.run_scheduled()
+                last_run = t
+            cpu += perf_counter() - start
+            estimates.append(rpm.RPM_ESTIMATE)
+        return estimates, cpu
+
+    def drain(self):
+        if self.batch_periods:
+            self.last_batch = self.batch_periods
+            self.batch_periods = []
+        micropython.run_scheduled()
+
+    def spread(self, periods):
+        return max(periods) - min(periods)
+
+    def mean(self, periods):
+        return sum(periods) / len(periods)
+
+
+def test_hard_capture_tracks_frequency():
+    for freq in (100, 802, 1200):
+        rpm = RPM(hard=True, autostart=True)
+        train = PulseTrain(rpm)
+        train.run(freq, 300, jitter_us=20, batch=4)
+
+        expected = 1000000 * rpm.factor / train.mean(train.periods[-rpm.count :])
+        assert abs(rpm.RPM_ESTIMATE - expected) <= 1
+        assert abs(rpm.RPM_ESTIMATE - freq * rpm.factor) <= 0.02 * freq * rpm.factor
+        assert rpm.overruns == 0
+
+
+def test_jitter_is_the_spread_of_the_last_batch():
+    rpm = RPM(hard=True, autostart=True)
+    train = PulseTrain(rpm, seed=7)
+    for jitter_us in (0, 5, 50, 200):
+        train.run(802, 64, jitter_us=jitter_us, batch=8)
+        assert rpm.jitter == train.spread(train.last_batch)
+        assert rpm.jitter <= 2 * jitter_us
+
+
+def test_soft_and_hard_capture_agree():
+    estimates = []
+    for hard in (False, True):
+        rpm = RPM(hard=hard, autostart=True)
+        PulseTrain(rpm, seed=3).run(500, 200, jitter_us=30, batch=5)
+        estimates.append(rpm.RPM_ESTIMATE)
+
+    assert abs(estimates[0] - estimates[1]) <= 0.01 * estimates[0]
+
+
+def test_overruns_when_the_scheduler_stalls():
+    rpm = RPM(hard=True, autostart=True)
+    PulseTrain(rpm).run(1000, EDGE_BUFFER_SIZE + 8, batch=EDGE_BUFFER_SIZE + 8)
+
+    assert rpm.overruns == 8
+    assert rpm.edge_tail == rpm.edge_head
+    assert rpm.count > 0
+
+
+def test_timeout_decays_then_stops():
+    rpm = RPM(hard=True, autostart=True)
+    train = PulseTrain(rpm)
+    train.run(802, 100)
+    running = rpm.RPM_ESTIMATE
+
+    # A few missed periods do not change the estimate
+    utime.advance_us(3000)
+    rpm.timer.callback(rpm.timer)
+    assert rpm.RPM_ESTIMATE == running
+
+    # Bounded by the time since the last edge
+    utime.advance_us(100000)
+    rpm.timer.callback(rpm.timer)
+    elapsed = utime.ticks_diff(utime.ticks_us(), rpm.curr_interrupt)
+    assert rpm.RPM_ESTIMATE == rpm.rpm_num // elapsed < running
+
+    utime.advance_us(TIMEOUT_MAX)
+    rpm.timer.callback(rpm.timer)
+    assert rpm.RPM_ESTIMATE == 0
+    assert rpm.timeout
+
+    # The first edge after the stall has no valid period
+    train.run(802, 1)
+    assert rpm.RPM_ESTIMATE == 0
+    train.run(802, 50)
+    assert abs(rpm.RPM_ESTIMATE - 8020) <= 0.01 * 8020
+
+
+class ListEstimator:
+    """The list-based estimator RPM.estimate replaced, for comparison."""
+
+    def __init__(self, factor):
+        self.factor = factor
+        self.durations = []
+        self.n_repeats = 1
+        self.prev = 0
+        self.RPM_ESTIMATE = 0
+
+    def estimate(self, now):
+        cycle_duration = now - self.prev
+        self.prev = now
+
+        if len(self.durations) > self.n_repeats:
+            self.durations.pop(0)
+        self.durations.append(cycle_duration)
+        duration_avg = sum(self.durations) / len(self.durations)
+
+        freq = 1000000 / duration_avg
+        repeat_factor = ((50 - 20) / (1500 - 150)) * freq + (
+            50 - ((50 - 20) / (1500 - 150) * 1500)
+        )
+        self.n_repeats = int(freq / repeat_factor) or 1
+        self.RPM_ESTIMATE = freq * self.factor
+
+    def replay(self, timestamps):
+        estimates = []
+        self.prev = timestamps[0]
+        start = perf_counter()
+        for t in timestamps[1:]:
+            self.estimate(t)
+            estimates.append(self.RPM_ESTIMATE)
+        return estimates, perf_counter() - start
+
+
+def ride_edges(seed=5):
+    """Edge timestamps of a ride: idle, a pull to the redline, a few
+    seconds there and engine braking back to idle. Every period has 0.3 %
+    ignition jitter. Returns the timestamps [us] and the true frequency
+    [Hz] at each edge."""
+    profile = (
+        (1.0, 120, 120),  # s, Hz at start, Hz at end
+        (3.0, 120, 1200),
+        (1.0, 1200, 1200),
+        (2.0, 1200, 150),
+    )
+    rnd = random.Random(seed)
+    t = 1000000
+    timestamps = [t]
+    freqs = [profile[0][1]]
+    for duration, f0, f1 in profile:
+        end = t + duration * 1000000
+        start = t
+        while t < end:
+            freq = f0 + (f1 - f0) * (t - start) / (end - start)
+            t += round(1000000 / freq * (1 + rnd.gauss(0, 0.003)))
+            timestamps.append(t)
+            freqs.append(freq)
+    return timestamps, freqs
+
+
+def relative_errors(estimates, freqs, factor, skip=50):
+    return sorted(
+        abs(e - f * factor) / (f * factor)
+        for e, f in zip(estimates[skip:], freqs[skip:])
+    )
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def test_replay_of_recorded_edges():
+    timestamps, freqs = ride_edges()
+    edges = len(timestamps)
+
+    print()
+    print("%d edges replayed" % edges)
+    results = {}
+    # The main loop runs the scheduled callbacks every 5 ms
+    for name, hard in (("soft IRQ", False), ("hard IRQ", True)):
+        utime.reset(timestamps[0])
+        rpm = RPM(hard=hard, autostart=True)
+        estimates, cpu = PulseTrain(rpm).replay(timestamps, rpm, schedule_us=5000)
+        results[name] = relative_errors(estimates, freqs, rpm.factor), cpu
+
+    reference = ListEstimator(PWM2RPM_FACTOR)
+    estimates, cpu = reference.replay(timestamps)
+    results["list (old)"] = (
+        relative_errors(estimates, freqs[1:], PWM2RPM_FACTOR),
+        cpu,
+    )
+
+    # Host timings, they do not show the heap allocations saved on the Pico
+    for name, (errors, cpu) in results.items():
+        print(
+            "%-10s %5.2f us/edge, error median %.2f %%, p95 %.2f %%, max %.2f %%"
+            % (
+                name,
+                cpu / edges * 1e6,
+                100 * percentile(errors, 0.5),
+                100 * percentile(errors, 0.95),
+                100 * errors[-1],
+            )
+        )
+
+    old_p95 = percentile(results["list (old)"][0], 0.95)
+    for name in ("soft IRQ", "hard IRQ"):
+        errors = results[name][0]
+        # Averaging lags the sweep by half a window at most
+        assert percentile(errors, 0.5) < 0.01
+        assert percentile(errors, 0.95) < 0.03
+        # Integer maths loses nothing against the float estimator
+        assert percentile(errors, 0.95) <= old_p95
+
+
+POLL_OVERHEAD_US = 15  # Pin read and loop iteration of thread1 on the RP2040
+
+
+class SquareWave:
+    """RPM pin level on the utime clock, `freq` Hz with a 50 % duty cycle.
+    Counts the reads, so polling can be compared with edge capture."""
+
+    def __init__(self, freq):
+        self.period = 1000000 / freq
+        self.reads = 0
+
+    def value(self):
+        self.reads += 1
+        return 1 if utime.ticks_us() % self.period < self.period / 2 else 0
+
+    def falling_edges(self, duration_us):
+        t = self.period / 2
+        while t < duration_us:
+            yield round(t)
+            t += self.period
+
+
+def thread1(pwm22, factor, duration_us):
+    """The polling loop of the LCD dashboards before edge capture, stopped
+    after `duration_us`. Every pin read costs POLL_OVERHEAD_US on top of the
+    100 us sleep. Returns the estimate after every measurement."""
+    estimates = []
+    n_repeats = 1
+    while utime.ticks_us() < duration_us:
+        utime.sleep_us(POLL_OVERHEAD_US)
+        if pwm22.value() == 1:
+            cycle_start = utime.ticks_us()
+            for _ in range(n_repeats):
+                while pwm22.value() == 1:
+                    utime.sleep_us(100 + POLL_OVERHEAD_US)
+                while pwm22.value() == 0:
+                    utime.sleep_us(100 + POLL_OVERHEAD_US)
+            cycle_stop = utime.ticks_us()
+            cycle_duration = cycle_stop - cycle_start
+            cycle = 1000000 / (cycle_duration / n_repeats)
+            repeat_factor = ((50 - 20) / (1500 - 150)) * cycle + (
+                50 - ((50 - 20) / (1500 - 150) * 1500)
+            )
+            n_repeats = int(cycle / repeat_factor) or 1
+            estimates.append(cycle * factor)
+    return estimates
+
+
+def test_edge_capture_against_thread1_polling():
+    duration_us = 2000000
+    print()
+    print("  Hz  polling: error, reads/s   capture: error, wakeups/s")
+    for freq in (100, 400, 802, 1200, 1500):
+        expected = freq * PWM2RPM_FACTOR
+
+        utime.reset()
+        wave = SquareWave(freq)
+        estimates = thread1(wave, PWM2RPM_FACTOR, duration_us)
+        polled = estimates[len(estimates) // 2 :]
+        poll_error = max(abs(e - expected) for e in polled) / expected
+        poll_rate = wave.reads * 1000000 / duration_us
+
+        utime.reset()
+        rpm = RPM(hard=True, autostart=True)
+        wave = SquareWave(freq)
+        timestamps = list(wave.falling_edges(duration_us))
+        micropython.run_scheduled()
+        captured, _ = PulseTrain(rpm).replay(timestamps, rpm, schedule_us=5000)
+        captured = captured[len(captured) // 2 :]
+        capture_error = max(abs(e - expected) for e in captured) / expected
+        # One hard IRQ per edge and one scheduled batch every 5 ms at most
+        wakeups = len(timestamps) + min(len(timestamps), duration_us // 5000)
+        capture_rate = wakeups * 1000000 / duration_us
+
+        print(
+            "%4d  %6.2f %%  %7d       %6.2f %%  %7d"
+            % (freq, 100 * poll_error, poll_rate, 100 * capture_error, capture_rate)
+        )
+        assert capture_error < 0.002
+        assert capture_error < poll_error
+        assert capture_rate < poll_rate / 4
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Temperature rings and their history keyed by sensor."""
+
+import random
+from array import array
+from math import isnan
+
+import pytest
+
+import fake_ds18x20
+from fake_ds18x20 import FakeDS18B20
+from picomotodash_ds18x20 import DS18X20, TemperatureHistory, TemperatureRing
+
+
+def float32(value):
+    return array("f", [value])[0]
+
+
+def test_ring_matches_a_float32_window():
+    rnd = random.Random(1)
+    ring = TemperatureRing(16)
+    window = []
+    for _ in range(500):
+        value = rnd.uniform(-20.0, 120.0)
+        ring.add(value)
+        window = (window + [float32(value)])[-16:]
+
+        assert list(ring) == window
+        # Exact, the extremes are the stored values
+        assert ring.min == min(window)
+        assert ring.max == max(window)
+        assert ring.avg == pytest.approx(sum(window) / len(window))
+
+
+def test_ring_skips_missing_readings():
+    ring = TemperatureRing(4)
+    assert isnan(ring.avg)
+
+    ring.add(float("nan"))
+    ring.add(21.5)
+    assert list(ring) == [21.5]
+
+    ring.clear()
+    assert len(ring) == 0
+    assert isnan(ring.min)
+
+
+def test_history_follows_sensors_removed_from_the_middle():
+    first, middle, last = fake_ds18x20.attach(
+        FakeDS18B20(1, 21.0), FakeDS18B20(2, 35.5), FakeDS18B20(3, 90.25)
+    )
+    ds = DS18X20(pin=None)
+    history = TemperatureHistory(8)
+    history.add_all(ds.keys, ds.temperatures)
+
+    fake_ds18x20.attach(first, last)
+    ds.update_roms(force=True)
+    history.add_all(ds.keys, ds.temperatures)
+
+    assert list(history.get(first.rom)) == [21.0, 21.0]
+    assert list(history.get(middle.rom)) == [35.5]
+    assert list(history.get(last.rom)) == [90.25, 90.25]